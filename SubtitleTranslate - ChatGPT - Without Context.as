@@ -59,6 +59,10 @@ string pre_apiUrl = "https://api.openai.com/v1/chat/completions"; // will be rep
 string pre_delay_ms = "0"; // will be replaced during installation
 string pre_retry_mode = "0"; // will be replaced during installation
 string pre_model_token_limits_json = "{}"; // serialized token limit rules (injected by installer)
+string pre_config_generation = "0"; // install stamp, part of the configuration snapshot key (injected by installer)
+string pre_request_profiles_json = "{}"; // per-model reasoning effort, verbosity, temperature and output cap (injected by installer)
+string pre_login_cache = ""; // installer-verified login, "<sha256> pending <endpoint>" (see LookupLoginCache)
+string pre_langid_json = "{}"; // stop words and Han variant markers for target-language detection (injected by installer)
 
 string api_key = pre_api_key;
 string selected_model = pre_selected_model; // Default model
@@ -66,11 +70,39 @@ string apiUrl = pre_apiUrl; // Default API URL
 string delay_ms = pre_delay_ms; // Request delay in ms
 string retry_mode = pre_retry_mode; // Auto retry mode
 string UserAgent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)";
+string config_snapshot_generation = "";  // generation|install stamp the settings above were loaded at
+int config_delay_ms = 0;                 // parsed once per snapshot instead of once per cue
+int config_retry_mode = 0;
+array<string> cue_markup_tags;  // styling markup lifted out of the current cue, consecutive tags grouped
+array<int> cue_markup_positions;  // byte offset of each group in the plain cue text
+string cue_markup_plain = "";     // the cue text that was sent to the model
 bool token_rules_initialized = false;
 int default_model_token_limit = 4096;
 array<string> token_rule_types;
 array<string> token_rule_values;
 array<int> token_rule_limits;
+bool request_profiles_initialized = false;
+array<string> profile_rule_types;
+array<string> profile_rule_values;
+array<string> profile_rule_efforts;
+array<string> profile_rule_verbosities;
+array<int> profile_rule_temperatures;      // hundredths, -1 = not sent
+array<string> profile_rule_output_fields;
+array<int> profile_rule_output_bases;
+array<int> profile_rule_output_per_tokens;
+array<int> profile_rule_output_caps;
+string request_profile_rejected_key = "";  // model|url that refused the profile fields this session
+const uint LOGIN_CACHE_TTL_MS = 86400000; // verified logins are reused for a day
+const uint LOGIN_CACHE_LIMIT = 8;
+bool langid_initialized = false;
+int langid_min_words = 3;
+int langid_min_share = 34;      // % of the cue's words that must be stop words of the guessed language
+array<string> langid_codes;     // stop-word languages, each word list as " w1 w2 ... "
+array<string> langid_words;
+array<string> langid_han_codes; // Chinese variants and the characters only that variant writes
+array<string> langid_han_markers;
+int prefilter_cue_count = 0;
+int prefilter_skip_count = 0;
 
 // Helper functions to load configuration while respecting installer defaults
 string BuildConfigSentinel(const string &in key) {
@@ -105,13 +137,25 @@ void EnsureInstallerDefaultsPersisted() {
     EnsureConfigDefault("wc_retry_mode", pre_retry_mode);
 }
 
+// Login and logout in either plugin variant bump this shared counter; every instance reloads
+// its settings on the next cue instead of reading each key from the host for every line
+void BumpConfigGeneration() {
+    HostSaveString("gpt_config_generation", "" + (ParseInt(HostLoadString("gpt_config_generation", "0")) + 1));
+}
+
 void RefreshConfiguration() {
+    string generation = HostLoadString("gpt_config_generation", "0") + "|" + pre_config_generation;
+    if (generation == config_snapshot_generation)
+        return;
+    config_snapshot_generation = generation;
     EnsureInstallerDefaultsPersisted();
     api_key = LoadInstallerConfig("wc_api_key", pre_api_key, "gpt_api_key");
     selected_model = LoadInstallerConfig("wc_selected_model", pre_selected_model, "gpt_selected_model");
     apiUrl = LoadInstallerConfig("wc_apiUrl", pre_apiUrl, "gpt_apiUrl");
     delay_ms = LoadInstallerConfig("wc_delay_ms", pre_delay_ms, "gpt_delay_ms");
     retry_mode = LoadInstallerConfig("wc_retry_mode", pre_retry_mode, "gpt_retry_mode");
+    config_delay_ms = ParseInt(delay_ms);
+    config_retry_mode = ParseInt(retry_mode);
 }
 
 // Supported Language List
@@ -258,6 +302,8 @@ int ParseInt(const string &in s) {
 
 // API Key and API Base verification process
 string ServerLogin(string User, string Pass) {
+    // Login parsing overwrites the settings in place; reload them from the host on the next cue
+    config_snapshot_generation = "";
     string errorAccum = "";
     User = User.Trim();
     Pass = Pass.Trim();
@@ -309,6 +355,13 @@ string ServerLogin(string User, string Pass) {
         errorAccum += "API Key not configured. Please enter a valid API Key.\n";
         return errorAccum;
     }
+    string loginHash = LoginCacheHash(apiUrlLocal, userModel, Pass);
+    string cachedEndpoint = LookupLoginCache(loginHash);
+    if (cachedEndpoint != "") {
+        CommitLogin(userModel, Pass, cachedEndpoint);
+        HostPrintUTF8("Login settings unchanged; reused cached verification.\n");
+        return "200 ok";
+    }
     bool isOfficial = (apiUrlLocal.find("api.openai.com") != -1);
     string verifyHeaders = "Authorization: Bearer " + Pass + "\nContent-Type: application/json";
     string testSystemMsg = "You are a test assistant.";
@@ -324,13 +377,8 @@ string ServerLogin(string User, string Pass) {
         JsonValue testRoot;
         if (testReader.parse(testResponse, testRoot)) {
             if (testRoot.isObject() && testRoot["choices"].isArray() && testRoot["choices"].size() > 0) {
-                selected_model = userModel;
-                api_key = Pass;
-                HostSaveString("wc_api_key", api_key);
-                HostSaveString("wc_selected_model", selected_model);
-                HostSaveString("wc_apiUrl", apiUrlLocal);
-                HostSaveString("wc_delay_ms", delay_ms);
-                HostSaveString("wc_retry_mode", retry_mode);
+                CommitLogin(userModel, Pass, apiUrlLocal);
+                StoreLoginCache(loginHash, apiUrlLocal);
                 return "200 ok";
             } else {
                 if (testRoot.isObject() && testRoot["error"].isObject() && testRoot["error"]["message"].isString())
@@ -352,15 +400,9 @@ string ServerLogin(string User, string Pass) {
             JsonValue correctedRoot;
             if (correctedReader.parse(correctedTestResponse, correctedRoot)) {
                 if (correctedRoot.isObject() && correctedRoot["choices"].isArray() && correctedRoot["choices"].size() > 0) {
-                    apiUrlLocal = correctedApiUrl;
-                    selected_model = userModel;
-                    api_key = Pass;
-                    HostSaveString("wc_api_key", api_key);
-                    HostSaveString("wc_selected_model", selected_model);
-                    HostSaveString("wc_apiUrl", apiUrlLocal);
-                    HostSaveString("wc_delay_ms", delay_ms);
-                HostSaveString("wc_retry_mode", retry_mode);
-                    return "Warning: Your API base was auto-corrected to: " + apiUrlLocal + "\n200 ok";
+                    CommitLogin(userModel, Pass, correctedApiUrl);
+                    StoreLoginCache(loginHash, correctedApiUrl);
+                    return "Warning: Your API base was auto-corrected to: " + correctedApiUrl + "\n200 ok";
                 } else {
                     if (correctedRoot.isObject() && correctedRoot["error"].isObject() && correctedRoot["error"]["message"].isString())
                         errorAccum += "Auto-correction test error: " + correctedRoot["error"]["message"].asString() + "\n";
@@ -420,6 +462,103 @@ string ServerLogin(string User, string Pass) {
     return "Unknown error during API verification. Please check your network, API Key, and API Base settings.\n";
 }
 
+// Saves a verified login
+void CommitLogin(const string &in userModel, const string &in key, const string &in endpoint) {
+    selected_model = userModel;
+    api_key = key;
+    apiUrl = endpoint;
+    HostSaveString("wc_api_key", api_key);
+    HostSaveString("wc_selected_model", selected_model);
+    HostSaveString("wc_apiUrl", endpoint);
+    HostSaveString("wc_delay_ms", delay_ms);
+    HostSaveString("wc_retry_mode", retry_mode);
+    BumpConfigGeneration();
+}
+
+// Login cache: one line per verified (API base, model, key) as "<sha256> <tick> <endpoint>".
+// The installer writes the same line with the stamp "pending" into pre_login_cache.
+string NormalizeLoginBase(const string &in url) {
+    string base = url.Trim();
+    while (base.length() > 0 && base.substr(base.length() - 1, 1) == "/")
+        base = base.substr(0, base.length() - 1);
+    int tail = base.find("/chat/completions");
+    if (tail == -1)
+        tail = base.find("/responses");
+    if (tail != -1)
+        base = base.substr(0, tail);
+    return base;
+}
+
+string LoginCacheHash(const string &in url, const string &in model, const string &in key) {
+    return HostHashSHA256(NormalizeLoginBase(url) + "\n" + model + "\n" + key).MakeLower();
+}
+
+array<string> SplitLoginCacheEntry(const string &in entry) {
+    array<string> fields;
+    int start = 0;
+    for (int i = 0; i <= int(entry.length()); i++) {
+        if (i == int(entry.length()) || entry.substr(i, 1) == " ") {
+            fields.insertLast(entry.substr(start, i - start));
+            start = i + 1;
+        }
+    }
+    return fields;
+}
+
+array<string> LoadLoginCacheEntries() {
+    array<string> entries;
+    string stored = HostLoadString("wc_login_cache", "");
+    int start = 0;
+    for (int i = 0; i <= int(stored.length()); i++) {
+        if (i == int(stored.length()) || stored.substr(i, 1) == "\n") {
+            string entry = stored.substr(start, i - start).Trim();
+            if (entry != "")
+                entries.insertLast(entry);
+            start = i + 1;
+        }
+    }
+    return entries;
+}
+
+string LookupLoginCache(const string &in hash) {
+    array<string> entries = LoadLoginCacheEntries();
+    for (uint i = 0; i < entries.length(); i++) {
+        array<string> fields = SplitLoginCacheEntry(entries[i]);
+        if (fields.length() != 3 || fields[0] != hash)
+            continue;
+        // Tick stamps expire after the TTL and on reboot (the tick count restarts below the stamp)
+        uint stamp = 0;
+        for (uint j = 0; j < fields[1].length(); j++) {
+            uint8 c = fields[1][j];
+            if (c >= 48 && c <= 57)
+                stamp = stamp * 10 + (c - 48);
+        }
+        uint age = HostGetTickCount() - stamp;
+        return age < LOGIN_CACHE_TTL_MS ? fields[2] : "";
+    }
+    // An installer-verified entry is trusted once, then re-stamped like any other
+    array<string> seed = SplitLoginCacheEntry(pre_login_cache.Trim());
+    if (seed.length() == 3 && seed[0] == hash && seed[1] == "pending" && HostLoadString("wc_login_cache_seed", "") != hash) {
+        HostSaveString("wc_login_cache_seed", hash);
+        StoreLoginCache(hash, seed[2]);
+        return seed[2];
+    }
+    return "";
+}
+
+void StoreLoginCache(const string &in hash, const string &in endpoint) {
+    array<string> entries = LoadLoginCacheEntries();
+    string result = hash + " " + HostGetTickCount() + " " + endpoint;
+    uint kept = 1;
+    for (uint i = entries.length(); i > 0 && kept < LOGIN_CACHE_LIMIT; i--) {
+        if (entries[i - 1].find(hash + " ") == 0)
+            continue;
+        result = entries[i - 1] + "\n" + result;
+        kept++;
+    }
+    HostSaveString("wc_login_cache", result);
+}
+
 // Logout Interface to clear model name and API Key
 void ServerLogout() {
     api_key = "";
@@ -431,19 +570,43 @@ void ServerLogout() {
     HostSaveString("wc_selected_model", selected_model);
     HostSaveString("wc_apiUrl", apiUrl);
     HostSaveString("wc_delay_ms", delay_ms);
-                HostSaveString("wc_retry_mode", retry_mode);
+    HostSaveString("wc_retry_mode", retry_mode);
+    HostSaveString("wc_login_cache", "");
+    BumpConfigGeneration();
     HostPrintUTF8("Successfully logged out.\n");
 }
 
-// JSON String Escape Function
+// JSON String Escape Function (single pass; copies unchanged runs in one piece)
 string JsonEscape(const string &in input) {
-    string output = input;
-    output.replace("\\", "\\\\");
-    output.replace("\"", "\\\"");
-    output.replace("\n", "\\n");
-    output.replace("\r", "\\r");
-    output.replace("\t", "\\t");
-    output.replace("/", "\\/");
+    uint len = input.length();
+    uint runStart = 0;
+    string output = "";
+    for (uint i = 0; i < len; i++) {
+        uint8 c = input[i];
+        string replacement;
+        if (c == 92)
+            replacement = "\\\\";
+        else if (c == 34)
+            replacement = "\\\"";
+        else if (c == 10)
+            replacement = "\\n";
+        else if (c == 13)
+            replacement = "\\r";
+        else if (c == 9)
+            replacement = "\\t";
+        else if (c == 47)
+            replacement = "\\/";
+        else
+            continue;
+        if (i > runStart)
+            output += input.substr(runStart, i - runStart);
+        output += replacement;
+        runStart = i + 1;
+    }
+    if (runStart == 0)
+        return input;
+    if (runStart < len)
+        output += input.substr(runStart, len - runStart);
     return output;
 }
 
@@ -512,25 +675,647 @@ int GetModelMaxTokens(const string &in modelName) {
         return default_model_token_limit;
 
     for (uint i = 0; i < token_rule_types.length(); i++) {
-        string matchType = token_rule_types[i];
-        string matchValue = token_rule_values[i];
-        int limit = token_rule_limits[i];
-        if (matchType == "prefix") {
-            if (trimmedModel.length() >= matchValue.length() &&
-                trimmedModel.substr(0, matchValue.length()) == matchValue)
-                return limit;
-        } else if (matchType == "contains") {
-            if (trimmedModel.find(matchValue) != -1)
-                return limit;
-        } else if (matchType == "equals") {
-            if (trimmedModel == matchValue)
-                return limit;
-        }
+        if (ModelRuleMatches(token_rule_types[i], token_rule_values[i], trimmedModel))
+            return token_rule_limits[i];
     }
 
     return default_model_token_limit;
 }
 
+// Shared by the token limit and request profile tables
+bool ModelRuleMatches(const string &in matchType, const string &in matchValue, const string &in model) {
+    if (matchType == "prefix")
+        return model.length() >= matchValue.length() && model.substr(0, matchValue.length()) == matchValue;
+    if (matchType == "contains")
+        return model.find(matchValue) != -1;
+    if (matchType == "equals")
+        return model == matchValue;
+    return false;
+}
+
+void EnsureRequestProfilesLoaded() {
+    if (request_profiles_initialized)
+        return;
+    request_profiles_initialized = true;
+    profile_rule_types.resize(0);
+    profile_rule_values.resize(0);
+    profile_rule_efforts.resize(0);
+    profile_rule_verbosities.resize(0);
+    profile_rule_temperatures.resize(0);
+    profile_rule_output_fields.resize(0);
+    profile_rule_output_bases.resize(0);
+    profile_rule_output_per_tokens.resize(0);
+    profile_rule_output_caps.resize(0);
+
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(pre_request_profiles_json, root))
+        return;
+    if (!root.isObject())
+        return;
+
+    JsonValue rulesNode = root["rules"];
+    if (rulesNode.isArray()) {
+        int count = rulesNode.size();
+        for (int i = 0; i < count; i++) {
+            JsonValue entry = rulesNode[i];
+            if (!entry.isObject() || !entry["type"].isString() || !entry["value"].isString())
+                continue;
+            if (entry["type"].asString() != "" && entry["value"].asString() != "")
+                AddRequestProfile(entry["type"].asString(), entry["value"].asString(), entry);
+        }
+    }
+    // The default profile goes last and applies to every model no rule matched
+    if (root["default"].isObject())
+        AddRequestProfile("default", "", root["default"]);
+}
+
+void AddRequestProfile(const string &in matchType, const string &in matchValue, JsonValue &in entry) {
+    profile_rule_types.insertLast(matchType);
+    profile_rule_values.insertLast(matchValue);
+    profile_rule_efforts.insertLast(entry["reasoning_effort"].isString() ? entry["reasoning_effort"].asString() : "");
+    profile_rule_verbosities.insertLast(entry["verbosity"].isString() ? entry["verbosity"].asString() : "");
+    int temperature = -1;
+    if (entry["temperature"].isInt())
+        temperature = entry["temperature"].asInt() * 100;
+    else if (entry["temperature"].isFloat())
+        temperature = int(entry["temperature"].asFloat() * 100.0f + 0.5f);
+    profile_rule_temperatures.insertLast(temperature);
+    profile_rule_output_fields.insertLast(entry["output_field"].isString() ? entry["output_field"].asString() : "");
+    profile_rule_output_bases.insertLast(entry["output_base"].isInt() ? entry["output_base"].asInt() : 0);
+    profile_rule_output_per_tokens.insertLast(entry["output_per_token"].isInt() ? entry["output_per_token"].asInt() : 0);
+    profile_rule_output_caps.insertLast(entry["output_cap"].isInt() ? entry["output_cap"].asInt() : 0);
+}
+
+// Extra chat/completions fields for the model's request profile, as ",\"field\":value" text that goes
+// right after the model field. The output cap is base + per_token x the cue's tokens, up to output_cap.
+string RequestProfileFields(const string &in model, const string &in url, int cueTokens) {
+    string trimmedModel = model.Trim();
+    if (trimmedModel == "" || request_profile_rejected_key == trimmedModel + "|" + url)
+        return "";
+    EnsureRequestProfilesLoaded();
+    for (uint i = 0; i < profile_rule_types.length(); i++) {
+        if (profile_rule_types[i] != "default" && !ModelRuleMatches(profile_rule_types[i], profile_rule_values[i], trimmedModel))
+            continue;
+        string fields = "";
+        if (profile_rule_efforts[i] != "")
+            fields += ",\"reasoning_effort\":\"" + JsonEscape(profile_rule_efforts[i]) + "\"";
+        if (profile_rule_verbosities[i] != "")
+            fields += ",\"verbosity\":\"" + JsonEscape(profile_rule_verbosities[i]) + "\"";
+        int temperature = profile_rule_temperatures[i];
+        if (temperature >= 0)
+            fields += ",\"temperature\":" + (temperature / 100) + "." + (temperature % 100 < 10 ? "0" : "") + (temperature % 100);
+        int cap = profile_rule_output_caps[i];
+        if (profile_rule_output_fields[i] != "" && cap > 0) {
+            int scaled = profile_rule_output_bases[i] + profile_rule_output_per_tokens[i] * cueTokens;
+            fields += ",\"" + profile_rule_output_fields[i] + "\":" + (scaled < cap ? scaled : cap);
+        }
+        return fields;
+    }
+    return "";
+}
+
+// 0 = usable, 1 = the endpoint refused a profile field, 2 = the output cap ended the reply before any text
+int ProfileFailureKind(const string &in response) {
+    JsonReader reader;
+    JsonValue root;
+    if (response == "" || !reader.parse(response, root) || !root.isObject())
+        return 0;
+    JsonValue error = root["error"];
+    if (error.isObject()) {
+        string detail = ((error["message"].isString() ? error["message"].asString() : "") + " "
+                         + (error["param"].isString() ? error["param"].asString() : "") + " "
+                         + (error["code"].isString() ? error["code"].asString() : "")).MakeLower();
+        array<string> hints = {"reasoning", "verbosity", "temperature", "max_tokens", "max_completion_tokens",
+                               "unsupported", "unrecognized", "unknown parameter", "not supported"};
+        for (uint i = 0; i < hints.length(); i++) {
+            if (detail.find(hints[i]) != -1)
+                return 1;
+        }
+        return 0;
+    }
+    JsonValue choices = root["choices"];
+    if (choices.isArray() && choices.size() > 0 && choices[0].isObject() &&
+        choices[0]["finish_reason"].isString() && choices[0]["finish_reason"].asString() == "length") {
+        JsonValue message = choices[0]["message"];
+        if (!message.isObject() || !message["content"].isString() || message["content"].asString().Trim() == "")
+            return 2;
+    }
+    return 0;
+}
+
+string SendWithRetry(const string &in headers, const string &in requestData, int delayInt, int retryModeInt) {
+    string response = "";
+    int attempts = 0;
+    while (true) {
+        if (attempts == 0 || (retryModeInt == 3 && attempts > 0)) {
+            if (delayInt > 0)
+                HostSleep(delayInt);
+        }
+        response = HostUrlGetString(apiUrl, UserAgent, headers, requestData);
+        if (response != "" || retryModeInt == 0 || (retryModeInt == 1 && attempts >= 1))
+            break;
+        attempts++;
+    }
+    return response;
+}
+
+// Length of the styling tag starting at pos: an ASS override block such as {\an8} or {\i1},
+// or an HTML-ish tag such as <i>, </b> or <font color="#ffff00">. 0 when pos starts no tag.
+int CueMarkupTagLength(const string &in text, uint pos) {
+    uint8 c = text[pos];
+    if (c == 123) {
+        for (uint i = pos + 1; i < text.length(); i++) {
+            uint8 d = text[i];
+            if (d == 125)
+                return int(i - pos + 1);
+            if (d == 10)
+                return 0;
+        }
+        return 0;
+    }
+    if (c != 60 || pos + 2 >= text.length())
+        return 0;
+    uint8 n = text[pos + 1];
+    if (!((n >= 97 && n <= 122) || (n >= 65 && n <= 90) || n == 47))
+        return 0;
+    for (uint i = pos + 1; i < text.length() && i < pos + 64; i++) {
+        uint8 d = text[i];
+        if (d == 62)
+            return int(i - pos + 1);
+        if (d == 60 || d == 10)
+            return 0;
+    }
+    return 0;
+}
+
+// Returns the cue without styling markup and records each run of tags with its byte offset
+// in the returned text, so RestoreCueMarkup() can reinsert it into the translation.
+string StripCueMarkup(const string &in text) {
+    cue_markup_tags.resize(0);
+    cue_markup_positions.resize(0);
+    string plain = "";
+    uint runStart = 0;
+    uint i = 0;
+    while (i < text.length()) {
+        int tagLength = CueMarkupTagLength(text, i);
+        if (tagLength <= 0) {
+            i++;
+            continue;
+        }
+        plain += text.substr(runStart, i - runStart);
+        uint last = cue_markup_tags.length();
+        if (last > 0 && cue_markup_positions[last - 1] == int(plain.length())) {
+            cue_markup_tags[last - 1] += text.substr(i, tagLength);
+        } else {
+            cue_markup_tags.insertLast(text.substr(i, tagLength));
+            cue_markup_positions.insertLast(int(plain.length()));
+        }
+        i += uint(tagLength);
+        runStart = i;
+    }
+    if (cue_markup_tags.length() == 0) {
+        cue_markup_plain = text;
+        return text;
+    }
+    plain += text.substr(runStart);
+
+    // "{\an8} Hello" -> "Hello": drop the spaces the tags left at either end
+    int lead = 0;
+    while (lead < int(plain.length()) && (plain[lead] == 32 || plain[lead] == 9))
+        lead++;
+    int tail = int(plain.length());
+    while (tail > lead && (plain[tail - 1] == 32 || plain[tail - 1] == 9))
+        tail--;
+    plain = plain.substr(lead, tail - lead);
+    for (uint k = 0; k < cue_markup_positions.length(); k++) {
+        int pos = cue_markup_positions[k] - lead;
+        if (pos < 0)
+            pos = 0;
+        if (pos > int(plain.length()))
+            pos = int(plain.length());
+        cue_markup_positions[k] = pos;
+        if (k > 0 && cue_markup_positions[k - 1] == pos) {
+            cue_markup_tags[k - 1] += cue_markup_tags[k];
+            cue_markup_tags.removeAt(k);
+            cue_markup_positions.removeAt(k);
+            k--;
+        }
+    }
+    cue_markup_plain = plain;
+    return plain;
+}
+
+// Maps a byte offset inside the plain cue onto the translation. Tags at the start or end of a
+// line stay there when both texts have the same number of lines; anything else keeps its
+// relative position, moved to a nearby space and never into the middle of a UTF-8 sequence.
+int MapCueMarkupPosition(int pos, const string &in translation, bool closing) {
+    int plainLength = int(cue_markup_plain.length());
+    int srcStart = 0;
+    int srcEnd = plainLength;
+    int srcLine = 0;
+    int srcLines = 1;
+    for (int i = 0; i < plainLength; i++) {
+        if (cue_markup_plain[i] != 10)
+            continue;
+        srcLines++;
+        if (i < pos) {
+            srcLine++;
+            srcStart = i + 1;
+        } else if (srcEnd == plainLength) {
+            srcEnd = i;
+        }
+    }
+
+    int dstLength = int(translation.length());
+    int dstLines = 1;
+    for (int i = 0; i < dstLength; i++) {
+        if (translation[i] == 10)
+            dstLines++;
+    }
+    int dstStart = 0;
+    int dstEnd = dstLength;
+    if (dstLines == srcLines) {
+        int line = 0;
+        for (int i = 0; i < dstLength; i++) {
+            if (translation[i] != 10)
+                continue;
+            if (line == srcLine) {
+                dstEnd = i;
+                break;
+            }
+            line++;
+            dstStart = i + 1;
+        }
+        if (pos == srcStart)
+            return dstStart;
+        if (pos == srcEnd)
+            return dstEnd;
+    } else {
+        srcStart = 0;
+        srcEnd = plainLength;
+    }
+
+    int at = dstStart + (pos - srcStart) * (dstEnd - dstStart) / (srcEnd - srcStart);
+    for (int d = 0; d <= 6; d++) {
+        int right = at + d;
+        int left = at - d;
+        int space = -1;
+        if (right < dstEnd && translation[right] == 32)
+            space = right;
+        else if (left > dstStart && left < dstEnd && translation[left] == 32)
+            space = left;
+        if (space >= 0)
+            return closing ? space : space + 1; // "<i>word" and "word</i>" hug the word, not the space
+    }
+    while (at < dstEnd && (translation[at] & 0xC0) == 0x80)
+        at++;
+    return at;
+}
+
+// Puts the markup removed by StripCueMarkup() back into a translation of the plain cue
+string RestoreCueMarkup(const string &in translation) {
+    if (cue_markup_tags.length() == 0)
+        return translation;
+    int plainLength = int(cue_markup_plain.length());
+    string prefix = "";
+    string suffix = "";
+    string result = "";
+    int copied = 0;
+    for (uint k = 0; k < cue_markup_tags.length(); k++) {
+        int pos = cue_markup_positions[k];
+        string tag = cue_markup_tags[k];
+        if (pos <= 0) {
+            prefix += tag;
+        } else if (pos >= plainLength) {
+            suffix += tag;
+        } else {
+            int at = MapCueMarkupPosition(pos, translation, tag.substr(0, 2) == "</");
+            if (at < copied)
+                at = copied;
+            result += translation.substr(copied, at - copied) + tag;
+            copied = at;
+        }
+    }
+    return prefix + result + translation.substr(copied) + suffix;
+}
+
+// ========= No-translation pre-filter (mirrors tools/cue_prefilter.py) =========
+
+// Decodes the UTF-8 code point at `at` and moves `at` past it; stray bytes decode as themselves
+uint NextCodePoint(const string &in text, uint &inout at) {
+    uint8 b = text[at];
+    uint cp = b;
+    uint extra = 0;
+    if (b >= 0xF0) {
+        cp = b & 0x07;
+        extra = 3;
+    } else if (b >= 0xE0) {
+        cp = b & 0x0F;
+        extra = 2;
+    } else if (b >= 0xC0) {
+        cp = b & 0x1F;
+        extra = 1;
+    }
+    at++;
+    for (uint k = 0; k < extra && at < text.length(); k++) {
+        uint8 next = text[at];
+        if ((next & 0xC0) != 0x80)
+            break;
+        cp = (cp << 6) | (next & 0x3F);
+        at++;
+    }
+    return cp;
+}
+
+// Script of a letter: 0 Latin, 1 Greek, 2 Cyrillic, 3 Hebrew, 4 Arabic, 5 Devanagari, 6 Thai,
+// 7 Hangul, 8 Kana, 9 Han, 10 any other letter; -1 for digits, punctuation, symbols and marks
+int CueLetterScript(uint cp) {
+    if (cp < 0x80)
+        return ((cp >= 65 && cp <= 90) || (cp >= 97 && cp <= 122)) ? 0 : -1;
+    if (cp < 0xC0 || cp == 0xD7 || cp == 0xF7)
+        return -1;
+    if (cp < 0x250 || (cp >= 0x1E00 && cp < 0x1F00) || (cp >= 0xFF21 && cp <= 0xFF3A) || (cp >= 0xFF41 && cp <= 0xFF5A))
+        return 0;
+    if (cp < 0x370)
+        return -1; // IPA, modifier letters and combining marks
+    if (cp < 0x400)
+        return 1;
+    if (cp < 0x530)
+        return 2;
+    if (cp >= 0x5D0 && cp < 0x5F0)
+        return 3;
+    if ((cp >= 0x620 && cp <= 0x64A) || (cp >= 0x66E && cp <= 0x6D3) || (cp >= 0x6FA && cp < 0x700)
+        || (cp >= 0x750 && cp < 0x780) || (cp >= 0xFB50 && cp < 0xFE00) || (cp >= 0xFE70 && cp < 0xFF00))
+        return 4;
+    if (cp >= 0x900 && cp < 0x964)
+        return 5;
+    if (cp >= 0xE01 && cp < 0xE4F)
+        return 6;
+    if ((cp >= 0x1100 && cp < 0x1200) || (cp >= 0x3130 && cp < 0x3190) || (cp >= 0xAC00 && cp < 0xD7A4))
+        return 7;
+    if ((cp >= 0x3040 && cp < 0x3100 && cp != 0x30FB) || (cp >= 0x31F0 && cp < 0x3200) || (cp >= 0xFF66 && cp < 0xFFA0))
+        return 8;
+    if ((cp >= 0x3400 && cp < 0x4DC0) || (cp >= 0x4E00 && cp < 0xA000) || (cp >= 0xF900 && cp < 0xFB00) || (cp >= 0x20000 && cp < 0x40000))
+        return 9;
+    if ((cp >= 0x2000 && cp < 0x2C00) || (cp >= 0x3000 && cp < 0x3040) || (cp >= 0xE000 && cp < 0xF900) || cp >= 0xFE00)
+        return -1; // punctuation, ♪ and other symbols, CJK punctuation, private use, emoji
+    if ((cp >= 0x591 && cp < 0x5D0) || (cp >= 0x600 && cp < 0x700))
+        return -1;
+    return 10;
+}
+
+bool IsOpeningBracket(uint cp) {
+    return cp == 0x28 || cp == 0x5B || cp == 0x7B || cp == 0xFF08 || cp == 0xFF3B || cp == 0x3010 || cp == 0x3014;
+}
+
+bool IsClosingBracket(uint cp) {
+    return cp == 0x29 || cp == 0x5D || cp == 0x7D || cp == 0xFF09 || cp == 0xFF3D || cp == 0x3011 || cp == 0x3015;
+}
+
+// Why a cue needs no request, or "" to translate it: "symbols" (only digits, punctuation, ♪ and the like),
+// "sound" (every letter sits in [..], (..), 【..】 or *..* effect tags), "speaker" (a lone "NAME:" tag)
+// or, when the source language is auto-detected, "target" (the cue is already in dstLang)
+string ClassifyNoTranslationCue(const string &in text, const string &in srcLang, const string &in dstLang) {
+    array<int> scripts(11, 0);
+    int letters = 0;
+    int outsideLetters = 0;
+    int upperLetters = 0;
+    int lowerLetters = 0;
+    int depth = 0;
+    bool starred = false;
+    uint at = 0;
+    while (at < text.length()) {
+        uint cp = NextCodePoint(text, at);
+        if (IsOpeningBracket(cp))
+            depth++;
+        else if (IsClosingBracket(cp) && depth > 0)
+            depth--;
+        else if (cp == 0x2A)
+            starred = !starred;
+        int script = CueLetterScript(cp);
+        if (script < 0)
+            continue;
+        scripts[script]++;
+        letters++;
+        if (depth == 0 && !starred)
+            outsideLetters++;
+        int letterCase = CueLetterCase(cp);
+        if (letterCase == 1)
+            upperLetters++;
+        else if (letterCase == 2)
+            lowerLetters++;
+    }
+    if (letters == 0)
+        return "symbols";
+    // An unclosed bracket or asterisk is part of a sentence, not an effect tag
+    if (outsideLetters == 0 && depth == 0 && !starred)
+        return "sound";
+    if (IsSpeakerTagCue(text.Trim(), letters, upperLetters, lowerLetters, scripts))
+        return "speaker";
+    if (srcLang == "" && IsTargetLanguageCue(text, dstLang, scripts, letters))
+        return "target";
+    return "";
+}
+
+// Case of a letter: 1 upper, 2 lower, 0 for scripts without case (Han, Kana, Hangul, Arabic, ...)
+int CueLetterCase(uint cp) {
+    if (cp >= 65 && cp <= 90)
+        return 1;
+    if (cp >= 97 && cp <= 122)
+        return 2;
+    if (cp >= 0xC0 && cp <= 0xDE)
+        return 1;
+    if (cp >= 0xDF && cp <= 0xFF)
+        return 2;
+    if ((cp >= 0x100 && cp < 0x250) || (cp >= 0x1E00 && cp < 0x1F00)) {
+        // Upper/lower pairs; these two runs put the capital on the odd code point
+        bool oddUpper = (cp >= 0x139 && cp <= 0x148) || (cp >= 0x179 && cp <= 0x17E);
+        return ((cp % 2 == 1) == oddUpper) ? 1 : 2;
+    }
+    if (cp >= 0x391 && cp <= 0x3AB)
+        return 1;
+    if (cp >= 0x3AC && cp <= 0x3CE)
+        return 2;
+    if (cp >= 0x400 && cp <= 0x42F)
+        return 1;
+    if (cp >= 0x430 && cp <= 0x45F)
+        return 2;
+    if (cp >= 0x460 && cp < 0x530)
+        return cp % 2 == 0 ? 1 : 2;
+    if (cp >= 0xFF21 && cp <= 0xFF3A)
+        return 1;
+    if (cp >= 0xFF41 && cp <= 0xFF5A)
+        return 2;
+    return 0;
+}
+
+// "NARRATOR:" or "MAN #2:" on its own: one line of at most two words ending in a colon, with a capital
+// and no lowercase letter in any script. Han, Kana and Hangul have no case, so a name in those scripts
+// only counts in brackets ("【旁白】："), which ClassifyNoTranslationCue already treats as a tag.
+bool IsSpeakerTagCue(const string &in trimmed, int letters, int upperLetters, int lowerLetters, const array<int> &in scripts) {
+    if (letters > 24 || upperLetters == 0 || lowerLetters > 0 || trimmed.find("\n") >= 0)
+        return false;
+    if (scripts[7] + scripts[8] + scripts[9] > 0)
+        return false;
+    uint n = trimmed.length();
+    bool colon = (n >= 1 && trimmed.substr(n - 1) == ":") || (n >= 3 && trimmed.substr(n - 3) == "：");
+    if (!colon)
+        return false;
+    int words = 1;
+    for (uint i = 0; i < n; i++) {
+        if (trimmed.substr(i, 1) == " ")
+            words++;
+    }
+    return words <= 2;
+}
+
+// Kana, Hangul, Greek, Hebrew and Thai give their language away; Chinese needs a character only its
+// variant writes, and every other target a clear stop-word majority from the installer's table
+bool IsTargetLanguageCue(const string &in text, const string &in dstLang, const array<int> &in scripts, int letters) {
+    string lang = dstLang.Trim().MakeLower();
+    string base = lang;
+    int dash = lang.find("-");
+    if (dash > 0)
+        base = lang.substr(0, dash);
+    if (base == "ja")
+        return scripts[8] > 0 && (scripts[8] + scripts[9]) * 10 >= letters * 9;
+    if (base == "ko")
+        return scripts[7] * 10 >= letters * 9;
+    if (base == "el")
+        return scripts[1] * 10 >= letters * 9;
+    if (base == "he")
+        return scripts[3] * 10 >= letters * 9;
+    if (base == "th")
+        return scripts[6] * 10 >= letters * 9;
+    if (base == "zh")
+        return scripts[9] * 10 >= letters * 9 && scripts[7] == 0 && scripts[8] == 0 && MatchesHanVariant(text, lang);
+    if (scripts[7] + scripts[8] + scripts[9] > 0)
+        return false;
+    return GuessLanguageByStopWords(text) == base;
+}
+
+void EnsureLanguageIdLoaded() {
+    if (langid_initialized)
+        return;
+    langid_initialized = true;
+    langid_codes.resize(0);
+    langid_words.resize(0);
+    langid_han_codes.resize(0);
+    langid_han_markers.resize(0);
+
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(pre_langid_json, root) || !root.isObject())
+        return;
+    if (root["min_words"].isInt())
+        langid_min_words = root["min_words"].asInt();
+    if (root["min_share"].isInt())
+        langid_min_share = root["min_share"].asInt();
+    JsonValue stopWords = root["stop_words"];
+    if (stopWords.isArray()) {
+        int count = stopWords.size();
+        for (int i = 0; i < count; i++) {
+            JsonValue entry = stopWords[i];
+            if (entry.isObject() && entry["lang"].isString() && entry["words"].isString() && entry["words"].asString() != "") {
+                langid_codes.insertLast(entry["lang"].asString().MakeLower());
+                langid_words.insertLast(" " + entry["words"].asString() + " ");
+            }
+        }
+    }
+    JsonValue variants = root["han_variants"];
+    if (variants.isArray()) {
+        int count = variants.size();
+        for (int i = 0; i < count; i++) {
+            JsonValue entry = variants[i];
+            if (entry.isObject() && entry["lang"].isString() && entry["chars"].isString() && entry["chars"].asString() != "") {
+                langid_han_codes.insertLast(entry["lang"].asString().MakeLower());
+                langid_han_markers.insertLast(entry["chars"].asString());
+            }
+        }
+    }
+}
+
+// Language whose stop words make up most of the cue, or "" when the cue is short or the call is close
+string GuessLanguageByStopWords(const string &in text) {
+    EnsureLanguageIdLoaded();
+    if (langid_codes.length() == 0)
+        return "";
+    array<int> hits(langid_codes.length(), 0);
+    int words = 0;
+    uint at = 0;
+    uint wordStart = 0;
+    bool inWord = false;
+    while (at <= text.length()) {
+        uint start = at;
+        int script = -1;
+        uint cp = 0;
+        if (at < text.length()) {
+            cp = NextCodePoint(text, at);
+            script = CueLetterScript(cp);
+        } else {
+            at++;
+        }
+        // Apostrophes stay inside a word ("don't", "c'est")
+        bool wordChar = (script >= 0 && script <= 5) || script == 10 || (inWord && (cp == 0x27 || cp == 0x2019));
+        if (wordChar) {
+            if (!inWord)
+                wordStart = start;
+            inWord = true;
+            continue;
+        }
+        if (!inWord)
+            continue;
+        inWord = false;
+        words++;
+        string word = " " + text.substr(wordStart, start - wordStart).MakeLower() + " ";
+        for (uint i = 0; i < langid_codes.length(); i++) {
+            if (langid_words[i].find(word) >= 0)
+                hits[i]++;
+        }
+    }
+    if (words < langid_min_words)
+        return "";
+    int best = -1;
+    int second = 0;
+    for (uint i = 0; i < hits.length(); i++) {
+        if (best < 0 || hits[i] > hits[best]) {
+            if (best >= 0)
+                second = hits[best];
+            best = int(i);
+        } else if (hits[i] > second) {
+            second = hits[i];
+        }
+    }
+    if (hits[best] < 2 || hits[best] * 100 < words * langid_min_share || hits[best] <= second * 2)
+        return "";
+    return langid_codes[best];
+}
+
+// Han text counts as the target variant only with a character that variant alone writes and none of the others'
+bool MatchesHanVariant(const string &in text, const string &in lang) {
+    EnsureLanguageIdLoaded();
+    int own = langid_han_codes.find(lang);
+    if (own < 0)
+        return false;
+    bool ownSeen = false;
+    uint at = 0;
+    while (at < text.length()) {
+        uint start = at;
+        if (CueLetterScript(NextCodePoint(text, at)) != 9)
+            continue;
+        string ch = text.substr(start, at - start);
+        for (uint i = 0; i < langid_han_codes.length(); i++) {
+            if (langid_han_markers[i].find(ch) < 0)
+                continue;
+            if (int(i) != own)
+                return false;
+            ownSeen = true;
+        }
+    }
+    return ownSeen;
+}
+
 // Translation Function (Without Context Support)
 string Translate(string Text, string &in SrcLang, string &in DstLang) {
     RefreshConfiguration();
@@ -549,30 +1334,51 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
         SrcLang = "";
     }
 
+    // Styling markup never reaches the model; RestoreCueMarkup() puts it back into the translation
+    string styledText = Text;
+    Text = StripCueMarkup(Text);
+    if (Text == "") {
+        SrcLang = "UTF8";
+        DstLang = "UTF8";
+        return styledText;
+    }
+
+    // Music notes, sound-effect tags, speaker tags and lines already in DstLang are shown without a request
+    prefilter_cue_count++;
+    string skipReason = ClassifyNoTranslationCue(Text, SrcLang, DstLang);
+    if (skipReason != "") {
+        prefilter_skip_count++;
+        HostPrintUTF8("Pre-filter: " + skipReason + " cue shown without a request. skipped=" + prefilter_skip_count + "/"
+                      + prefilter_cue_count + " (" + (prefilter_skip_count * 100 / prefilter_cue_count) + "%)\n");
+        SrcLang = "UTF8";
+        DstLang = "UTF8";
+        return styledText;
+    }
+
     string systemMsg = "You translate subtitles. Output only the translation.";
     string userMsg = "Translate from " + (SrcLang == "" ? "Auto Detect" : SrcLang) + " to " + DstLang + ":\n" + Text;
 
     string escapedSystemMsg = JsonEscape(systemMsg);
     string escapedUserMsg = JsonEscape(userMsg);
 
-    string requestData = "{\"model\":\"" + selected_model + "\"," 
+    string profileFields = RequestProfileFields(selected_model, apiUrl, EstimateTokenCount(Text));
+    string requestData = "{\"model\":\"" + selected_model + "\"" + profileFields + "," 
                          "\"messages\":[{\"role\":\"system\",\"content\":\"" + escapedSystemMsg + "\"}," 
                          "{\"role\":\"user\",\"content\":\"" + escapedUserMsg + "\"}]}";
 
     string headers = "Authorization: Bearer " + api_key + "\nContent-Type: application/json";
-    int delayInt = ParseInt(delay_ms);
-    int retryModeInt = ParseInt(retry_mode);
-    string response = "";
-    int attempts = 0;
-    while (true) {
-        if (attempts == 0 || (retryModeInt == 3 && attempts > 0)) {
-            if (delayInt > 0)
-                HostSleep(delayInt);
+    int delayInt = config_delay_ms;
+    int retryModeInt = config_retry_mode;
+    string response = SendWithRetry(headers, requestData, delayInt, retryModeInt);
+    // A refused profile is dropped for this model and endpoint; a reply cut off by the cap is resent once plain
+    int profileFailure = profileFields == "" ? 0 : ProfileFailureKind(response);
+    if (profileFailure != 0) {
+        if (profileFailure == 1) {
+            request_profile_rejected_key = selected_model.Trim() + "|" + apiUrl;
+            HostPrintUTF8("Request profile for " + selected_model + " was rejected; sending plain requests for this session.\n");
         }
-        response = HostUrlGetString(apiUrl, UserAgent, headers, requestData);
-        if (response != "" || retryModeInt == 0 || (retryModeInt == 1 && attempts >= 1))
-            break;
-        attempts++;
+        int pos = requestData.find(profileFields);
+        response = SendWithRetry(headers, requestData.substr(0, pos) + requestData.substr(pos + profileFields.length()), delayInt, retryModeInt);
     }
     if (response == "") {
         HostPrintUTF8("Translation request failed. Please check network connection or API Key.\n");
@@ -603,7 +1409,7 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
         }
         SrcLang = "UTF8";
         DstLang = "UTF8";
-        return translatedText.Trim();
+        return RestoreCueMarkup(translatedText.Trim());
     }
 
     if (Root.isObject() &&
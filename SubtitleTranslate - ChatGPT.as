@@ -28,16 +28,48 @@ string GetLoginTitle() {
 string GetLoginDesc() {
     return "{$CP949=모델 이름, API 주소, 선택적 nullkey, 지연(ms) 및 재시도 모드(0-3)를 입력하십시오 (예: gpt-5-nano|https://api.openai.com/v1/chat/completions|nullkey|500|retry1).$}"
          + "{$CP949=\n\n설치 프로그램에서 미리 구성한 값이 있다면 PotPlayer 패널에서 다시 설정하기 전까지 해당 값을 사용하며, 패널에서 설정하면 해당 설정이 항상 우선 적용됩니다.$}"
-         + "{$CP949=\n\n선택적으로 cache=auto 또는 cache=off 를 추가하여 문맥 캐시 모드를 제어할 수 있으며, auto 는 지원되지 않을 경우 chat 방식으로 자동 전환됩니다.$}"
+         + "{$CP949=\n\n선택적으로 cache=auto, cache=chain 또는 cache=off 를 추가하여 문맥 캐시 모드를 제어할 수 있으며, auto 는 지원되지 않을 경우 chat 방식으로 자동 전환됩니다. chain 은 previous_response_id 로 대화를 이어 문맥을 다시 보내지 않습니다.$}"
+         + "{$CP949=\n\n선택적으로 deadline=1500 처럼 자막별 응답 기한(ms)을 지정할 수 있으며, API URL 이 tools/latefill_proxy.py 도우미를 가리킬 때만 기한을 넘긴 자막의 원문을 먼저 표시하며, 그렇지 않으면 재시도만 멈춥니다 (0 = 끄기).$}"
+         + "{$CP949=\n\n로드·로그인 시에는 요청을 보내지 않고, 요청 없이 처리되는 첫 자막(사전 필터·번역 메모리) 때 /models 요청으로 연결을 미리 엽니다. warmup=probe 는 대신 출력 16토큰으로 제한된 Responses 요청으로 엔드포인트 지원 여부를 미리 확인하며, warmup=off 로 끌 수 있습니다.$}"
+         + "{$CP949=\n\n선택적으로 targets=ja,ko 처럼 추가 대상 언어를 지정하면 한 번의 요청으로 모든 언어를 번역하고, 두 번째 자막은 메모리에서 제공합니다 (targets=off = 끄기).$}"
+         + "{$CP949=\n\n선택적으로 local=http://192.168.1.10:8080/v1 과 localmodel=이름 을 지정하면 자막을 먼저 LAN 서버로 보내고, 대기 시간이 spill=2000(ms)을 넘거나 오류가 나면 위의 클라우드 모델로 넘깁니다 (local=off = 끄기).$}"
+         + "{$CP949=\n\n선택적으로 budget=adaptive 를 추가하면 응답 시간과 자막 표시 시간에 맞춰 보내는 문맥 양을 자동으로 줄이거나 늘립니다 (budget=fixed = 고정).$}"
+         + "{$CP949=\n\n큰 요청 본문(기본 16384바이트 이상)은 엔드포인트가 지원하면 gzip 으로 압축해 보냅니다. gzip=32768 로 기준을 바꾸거나 gzip=off 로 끌 수 있습니다.$}"
+         + "{$CP949=\n\n선택적으로 tm=C:\\path\\translation_memory.ptm 을 지정하면 tools/translation_memory.py 로 만든 번역 메모리를 사용합니다. 유사도 tmserve=90(%) 이상은 요청 없이 표시하고, tmhint=60(%) 이상은 이전 번역을 힌트로 보냅니다 (tm=off = 끄기).$}"
+         + "{$CP949=\n\n기호, 숫자, 효과음 [문 닫히는 소리], 화자 표시(NARRATOR:)만 있는 자막과, 원본 언어가 자동 감지일 때 이미 대상 언어로 된 자막은 요청 없이 그대로 표시합니다. prefilter=off 로 끌 수 있습니다.$}"
          + "{$CP950=請輸入模型名稱、API 地址、可選的 nullkey、延遲毫秒與重試模式(0-3)（例如: gpt-5-nano|https://api.openai.com/v1/chat/completions|nullkey|500|retry1）。$}"
          + "{$CP950=\n\n如果安裝包已寫入預設配置，在 PotPlayer 面板中未重新設定之前會沿用這些配置；一旦在面板中調整，將始終以面板設定為準。$}"
-         + "{$CP950=\n\n可選加上 cache=auto 或 cache=off 以控制上下文快取模式，auto 會在不支援時自動回退至 chat。$}"
+         + "{$CP950=\n\n可選加上 cache=auto、cache=chain 或 cache=off 以控制上下文快取模式，auto 會在不支援時自動回退至 chat；chain 以 previous_response_id 串接對話，不再重複傳送上下文。$}"
+         + "{$CP950=\n\n可選加上 deadline=1500 設定每句字幕的回應期限（毫秒），僅在 API URL 指向 tools/latefill_proxy.py 助手時逾時會先顯示原文，否則只停止重試（0 = 關閉）。$}"
+         + "{$CP950=\n\n載入及登入時不發送請求，而是在第一句無需請求即可處理的字幕（預先過濾、翻譯記憶）時以 /models 請求預先建立連線；warmup=probe 改為傳送輸出上限 16 個 token 的 Responses 請求，提前確認端點是否支援，可加上 warmup=off 關閉。$}"
+         + "{$CP950=\n\n可選加上 targets=ja,ko 指定額外目標語言，一次請求即可取得所有語言的翻譯，第二字幕直接由記憶體提供（targets=off = 關閉）。$}"
+         + "{$CP950=\n\n可選加上 local=http://192.168.1.10:8080/v1 與 localmodel=名稱，字幕會先送到區域網路伺服器，排隊延遲超過 spill=2000（毫秒）或出錯時改用上面的雲端模型（local=off = 關閉）。$}"
+         + "{$CP950=\n\n可選加上 budget=adaptive，依回應時間與字幕顯示時間自動增減送出的上下文量（budget=fixed = 固定）。$}"
+         + "{$CP950=\n\n較大的請求內容（預設 16384 位元組以上）在端點支援時以 gzip 壓縮上傳，可用 gzip=32768 調整門檻或 gzip=off 關閉。$}"
+         + "{$CP950=\n\n可選加上 tm=C:\\path\\translation_memory.ptm 使用 tools/translation_memory.py 建立的翻譯記憶。相似度達 tmserve=90(%) 直接顯示而不發送請求，達 tmhint=60(%) 則把先前的譯文作為提示一併送出（tm=off = 關閉）。$}"
+         + "{$CP950=\n\n只有符號、數字、音效 [關門聲] 或說話者標記（NARRATOR:）的字幕，以及來源語言為自動偵測時已是目標語言的字幕，會直接顯示而不發送請求，可加上 prefilter=off 關閉。$}"
          + "{$CP936=请输入模型名称、API 地址、可选的 nullkey、延迟毫秒和重试模式(0-3)（例如: gpt-5-nano|https://api.openai.com/v1/chat/completions|nullkey|500|retry1）。$}"
          + "{$CP936=\n\n如果安装包已经写入默认配置，在 PotPlayer 面板中没有重新设置之前会继续使用这些配置；一旦在面板中修改，将始终以面板设置为准。$}"
-         + "{$CP936=\n\n可选追加 cache=auto 或 cache=off 用于控制上下文缓存模式，auto 在不支持时会自动回退到 chat。$}"
+         + "{$CP936=\n\n可选追加 cache=auto、cache=chain 或 cache=off 用于控制上下文缓存模式，auto 在不支持时会自动回退到 chat；chain 通过 previous_response_id 串联对话，不再重复发送上下文。$}"
+         + "{$CP936=\n\n可选追加 deadline=1500 设置每句字幕的响应期限（毫秒），仅在 API URL 指向 tools/latefill_proxy.py 助手时超时会先显示原文，否则只停止重试（0 = 关闭）。$}"
+         + "{$CP936=\n\n加载及登录时不发送请求，而是在第一句无需请求即可处理的字幕（预过滤、翻译记忆）时用 /models 请求预先建立连接；warmup=probe 改为发送输出上限 16 个 token 的 Responses 请求，提前确认端点是否支持，可追加 warmup=off 关闭。$}"
+         + "{$CP936=\n\n可选追加 targets=ja,ko 指定额外目标语言，一次请求即可得到所有语言的翻译，第二字幕直接由内存提供（targets=off = 关闭）。$}"
+         + "{$CP936=\n\n可选追加 local=http://192.168.1.10:8080/v1 与 localmodel=名称，字幕会先发送到局域网服务器，排队延迟超过 spill=2000（毫秒）或出错时改用上面的云端模型（local=off = 关闭）。$}"
+         + "{$CP936=\n\n可选追加 budget=adaptive，根据响应时间与字幕显示时间自动增减发送的上下文量（budget=fixed = 固定）。$}"
+         + "{$CP936=\n\n较大的请求内容（默认 16384 字节以上）在端点支持时以 gzip 压缩上传，可用 gzip=32768 调整阈值或 gzip=off 关闭。$}"
+         + "{$CP936=\n\n可选追加 tm=C:\\path\\translation_memory.ptm 使用 tools/translation_memory.py 生成的翻译记忆。相似度达到 tmserve=90(%) 时直接显示而不发送请求，达到 tmhint=60(%) 时把之前的译文作为提示一起发送（tm=off = 关闭）。$}"
+         + "{$CP936=\n\n只有符号、数字、音效 [关门声] 或说话人标记（NARRATOR:）的字幕，以及源语言为自动检测时已是目标语言的字幕，会直接显示而不发送请求，可追加 prefilter=off 关闭。$}"
          + "{$CP0=Please enter the model name, API URL, optional 'nullkey', optional delay in ms, and retry mode 0-3 (e.g., gpt-5-nano|https://api.openai.com/v1/chat/completions|nullkey|500|retry1).$}"
          + "{$CP0=\n\nInstaller defaults will remain in effect until you update the settings in PotPlayer's panel, and any panel changes will always take priority.$}"
-         + "{$CP0=\n\nOptionally append cache=auto or cache=off to control context caching. Auto falls back to chat when caching is unsupported.$}";
+         + "{$CP0=\n\nOptionally append cache=auto, cache=chain or cache=off to control context caching. Auto falls back to chat when caching is unsupported; chain links cues with previous_response_id so context is not resent.$}"
+         + "{$CP0=\n\nOptionally append deadline=1500 to set a per-cue response deadline in ms; late cues show the source text first only when the API URL points at the tools/latefill_proxy.py helper, otherwise it only stops retries (0 = off).$}"
+         + "{$CP0=\n\nLoading and login send no request; the first cue answered without one (pre-filtered or from translation memory) opens the connection with a /models request; append warmup=probe to send a Responses request capped at 16 output tokens instead, which checks early whether the endpoint supports it, or warmup=off to disable.$}"
+         + "{$CP0=\n\nOptionally append targets=ja,ko to translate into extra languages in the same request; the second subtitle is then served from memory (targets=off to disable).$}"
+         + "{$CP0=\n\nOptionally append local=http://192.168.1.10:8080/v1 and localmodel=NAME to send cues to a LAN server first; when its queue latency exceeds spill=2000 (ms) or it errors, cues spill over to the cloud model above (local=off to disable).$}"
+         + "{$CP0=\n\nOptionally append budget=adaptive to shrink or grow the context sent with each cue so replies arrive while the line is still on screen (budget=fixed to disable).$}"
+         + "{$CP0=\n\nRequest bodies of 16384 bytes or more are gzip-compressed when the endpoint accepts it; append gzip=32768 to change the threshold or gzip=off to disable.$}"
+         + "{$CP0=\n\nOptionally append tm=C:\\path\\translation_memory.ptm to use a translation memory built with tools/translation_memory.py. Lines at least tmserve=90 (%) similar are shown without a request; at least tmhint=60 (%) similar, the earlier translation is sent as a hint (tm=off to disable).$}"
+         + "{$CP0=\n\nCues with only symbols, numbers, sound effects such as [door slams] or a speaker tag (NARRATOR:), and cues already in the target language when the source language is Auto Detect, are shown as-is without a request; append prefilter=off to disable.$}";
 }
 
 string GetUserText() {
@@ -63,8 +95,28 @@ string pre_delay_ms = "0"; // will be replaced during installation
 string pre_retry_mode = "0"; // will be replaced during installation
 string pre_context_token_budget = "6000"; // approx. tokens reserved for context (0 = auto)
 string pre_context_truncation_mode = "drop_oldest"; // drop_oldest | smart_trim
-string pre_context_cache_mode = "auto"; // auto | off
+string pre_context_cache_mode = "auto"; // auto | chain | off
+string pre_context_budget_mode = "fixed"; // fixed | adaptive (context shrinks/grows with observed latency)
 string pre_model_token_limits_json = "{}"; // serialized token limit rules (injected by installer)
+string pre_config_generation = "0"; // install stamp, part of the configuration snapshot key (injected by installer)
+string pre_request_profiles_json = "{}"; // per-model reasoning effort, verbosity, temperature and output cap (injected by installer)
+string pre_route_mode = "off"; // off | auto (per-cue fast/strong model routing)
+string pre_route_fast_model = ""; // model for short, simple cues when routing is on
+string pre_route_strong_model = ""; // model for dense cues and low-confidence retries
+string pre_route_threshold = "12"; // difficulty score at or below which the fast model is used
+string pre_deadline_ms = "0"; // per-cue response deadline in ms (0 = off)
+string pre_extra_target_langs = ""; // comma-separated extra target languages answered in the same request
+string pre_warmup = "on"; // on | probe | off: open the connection (probe: also check the Responses endpoint) at the first cue that needs no request
+string pre_login_cache = ""; // installer-verified login, "<sha256> pending <endpoint>" (see LookupLoginCache)
+string pre_local_api_url = ""; // OpenAI-compatible LAN server tried before the cloud endpoint ("" = off)
+string pre_local_model = ""; // model name on the LAN server
+string pre_spill_threshold_ms = "2000"; // queue latency above which cues spill over to the cloud
+string pre_gzip_min_bytes = "16384"; // request bodies at least this large are gzip-compressed where accepted (0 = off)
+string pre_tm_path = ""; // translation memory index built by tools/translation_memory.py ("" = off)
+string pre_tm_serve = "90"; // similarity (%) at or above which a remembered translation is shown without a request
+string pre_tm_hint = "60"; // similarity (%) at or above which the remembered translation is sent as a hint
+string pre_prefilter = "on"; // on | off: show cues that need no translation (symbols, sound tags, target language) without a request
+string pre_langid_json = "{}"; // stop words and Han variant markers for target-language detection (injected by installer)
 
 string api_key = pre_api_key;
 string selected_model = pre_selected_model; // Default model
@@ -73,16 +125,131 @@ string delay_ms = pre_delay_ms; // Request delay in ms
 string retry_mode = pre_retry_mode; // Auto retry mode
 string context_token_budget = pre_context_token_budget; // Approximate token budget for context
 string context_truncation_mode = pre_context_truncation_mode; // Truncation mode when context exceeds budget
-string context_cache_mode = pre_context_cache_mode; // auto | off
+string context_cache_mode = pre_context_cache_mode; // auto | chain | off
+string context_budget_mode = pre_context_budget_mode; // fixed | adaptive
+string route_mode = pre_route_mode; // off | auto
+string route_fast_model = pre_route_fast_model;
+string route_strong_model = pre_route_strong_model;
+string route_threshold = pre_route_threshold;
+string deadline_ms = pre_deadline_ms;
+string extra_target_langs = pre_extra_target_langs;
+string warmup_mode = pre_warmup;
+string local_api_url = pre_local_api_url;
+string local_model = pre_local_model;
+string spill_threshold_ms = pre_spill_threshold_ms;
+string gzip_min_bytes = pre_gzip_min_bytes;
+string tm_path = pre_tm_path;
+string tm_serve = pre_tm_serve;
+string tm_hint = pre_tm_hint;
+string prefilter_mode = pre_prefilter;
 string UserAgent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)";
 array<string> subtitleHistory;  // Global subtitle history
+array<string> subtitleHistoryEscaped;  // JSON-escaped mirror of subtitleHistory (escaped once per line)
+string prompt_prefix_cache_key = "";
+string prompt_prefix_cache_escaped = "";
 bool context_cache_disabled_for_session = false;
+uint cue_start_tick = 0;
+int cue_deadline_ms = 0; // 0 = no deadline for the cue being translated
+bool cue_deadline_missed = false;
+int deadline_met_count = 0;
+int deadline_missed_count = 0;
+bool deadline_helper_warned = false; // "no late-fill helper" note printed for this session
+int deadline_repeat_count = 0;   // missed cues answered with the earlier translation of the same line
+const uint RECENT_TRANSLATION_LIMIT = 256;
+int adaptive_context_budget = -1;  // context tokens sent in adaptive mode (-1 = start at the configured budget)
+int adaptive_on_time_count = 0;
+int adaptive_late_count = 0;
+const int ADAPTIVE_MIN_CONTEXT = 128;
+float token_bytes_ratio = 4.0;     // UTF-8 bytes per token, corrected from the usage the API reports
+int last_prompt_tokens = 0;        // prompt/input tokens reported for the last request (0 = not reported)
+array<string> recent_translation_keys;  // normalized source|target of recently translated cues
+array<string> recent_translation_values;
+array<string> cue_markup_tags;  // styling markup lifted out of the current cue, consecutive tags grouped
+array<int> cue_markup_positions;  // byte offset of each group in the plain cue text
+string cue_markup_plain = "";     // the cue text that was sent to the model
+const uint FANOUT_SLOT_LIMIT = 64;
+array<string> fanout_slot_keys;  // normalized source|language of secondary translations not yet requested
+array<string> fanout_slot_values;
 string context_cache_disable_key = "";
+string response_chain_id = "";          // id of the last stored response in the chain ("" = next cue anchors)
+string response_chain_key = "";         // endpoint + prompt prefix the chain was anchored with
+string response_chain_model = "";
+string response_chain_config_key = "";  // apiUrl|model|mode seen by RefreshConfiguration
+string config_snapshot_generation = "";  // generation|install stamp the settings below were loaded at
+int config_delay_ms = 0;                 // parsed once per snapshot instead of once per cue
+int config_retry_mode = 0;
+int config_context_budget = 0;
+int config_deadline_ms = 0;
+array<string> model_limit_cache_models;  // GetModelMaxTokens results for this snapshot
+array<int> model_limit_cache_values;
+bool response_chain_disabled_for_session = false;
+int response_chain_anchor_tokens = 0;
+int response_chain_tokens = 0;          // input + output tokens of the last response in the chain
+int response_chain_turns = 0;
+uint response_chain_last_tick = 0;
+const uint RESPONSE_CHAIN_IDLE_MS = 120000;
+int responses_upload_cues = 0;           // upload totals of the current window of RESPONSES_UPLOAD_REPORT_EVERY cues
+int responses_upload_bytes = 0;
+int responses_upload_tokens = 0;
+const int RESPONSES_UPLOAD_REPORT_EVERY = 50;
+const uint LOGIN_CACHE_TTL_MS = 86400000; // verified logins are reused for a day
+array<string> gzip_endpoint_urls;  // endpoints whose gzip support has been probed
+array<bool> gzip_endpoint_accepts;
+bool gzip_endpoints_loaded = false;
+const uint TM_PERMS = 16;
+const uint TM_BANDS = 8;
+const uint TM_RECHECK_MS = 60000;
+array<string> tm_langs;         // translation memory entries, in index-file order
+array<string> tm_sources;
+array<string> tm_translations;
+array<uint64> tm_bands;         // (band hash << 32) | entry, sorted by the index builder
+string tm_loaded_path = "";     // path the arrays were loaded from ("" = load on next lookup)
+int64 tm_loaded_length = -1;
+uint tm_checked_tick = 0;
+int tm_served_count = 0;
+int tm_hinted_count = 0;
+bool langid_initialized = false;
+int langid_min_words = 3;
+int langid_min_share = 34;      // % of the cue's words that must be stop words of the guessed language
+array<string> langid_codes;     // stop-word languages, each word list as " w1 w2 ... "
+array<string> langid_words;
+array<string> langid_han_codes; // Chinese variants and the characters only that variant writes
+array<string> langid_han_markers;
+int prefilter_cue_count = 0;
+int prefilter_skip_count = 0;
+bool local_spilled = false;        // true while cues go to the cloud because the LAN server is slow or failing
+int local_latency_ewma = -1;       // smoothed queue latency of the LAN server in ms (-1 = no sample yet)
+int local_roundtrip_ewma = -1;     // smoothed full round trip of the LAN server in ms, including compute
+uint local_spill_tick = 0;
+uint local_probe_after_ms = 0;     // spilled: time before the next cue is tried locally again
+const uint LOCAL_PROBE_MIN_MS = 15000;
+const uint LOCAL_PROBE_MAX_MS = 240000;
+int local_cue_count = 0;
+int spilled_cue_count = 0;
+int local_error_count = 0;
+int local_spill_events = 0;
+const uint LOGIN_CACHE_LIMIT = 8;
+bool warmup_pending = false;        // armed on load/login; sent by the first cue that needs no request of its own
+string warmup_reason = "";
+bool first_cue_pending = true;
+bool first_cue_warmed = false;
 bool token_rules_initialized = false;
 int default_model_token_limit = 4096;
 array<string> token_rule_types;
 array<string> token_rule_values;
 array<int> token_rule_limits;
+bool request_profiles_initialized = false;
+array<string> profile_rule_types;
+array<string> profile_rule_values;
+array<string> profile_rule_efforts;
+array<string> profile_rule_verbosities;
+array<int> profile_rule_temperatures;      // hundredths, -1 = not sent
+array<string> profile_rule_output_fields;
+array<int> profile_rule_output_bases;
+array<int> profile_rule_output_per_tokens;
+array<int> profile_rule_output_caps;
+string request_profile_rejected_key = "";  // model|url that refused the profile fields this session
+int request_profile_cue_tokens = 0;        // expected reply size of the current cue, for the output cap
 
 // Helper functions to load configuration while respecting installer defaults
 string BuildConfigSentinel(const string &in key) {
@@ -118,9 +285,39 @@ void EnsureInstallerDefaultsPersisted() {
     EnsureConfigDefault("gpt_context_token_budget", pre_context_token_budget);
     EnsureConfigDefault("gpt_context_truncation_mode", pre_context_truncation_mode);
     EnsureConfigDefault("gpt_context_cache_mode", pre_context_cache_mode);
+    EnsureConfigDefault("gpt_context_budget_mode", pre_context_budget_mode);
+    EnsureConfigDefault("gpt_route_mode", pre_route_mode);
+    EnsureConfigDefault("gpt_route_fast_model", pre_route_fast_model);
+    EnsureConfigDefault("gpt_route_strong_model", pre_route_strong_model);
+    EnsureConfigDefault("gpt_route_threshold", pre_route_threshold);
+    EnsureConfigDefault("gpt_deadline_ms", pre_deadline_ms);
+    EnsureConfigDefault("gpt_extra_target_langs", pre_extra_target_langs);
+    EnsureConfigDefault("gpt_warmup", pre_warmup);
+    EnsureConfigDefault("gpt_local_api_url", pre_local_api_url);
+    EnsureConfigDefault("gpt_local_model", pre_local_model);
+    EnsureConfigDefault("gpt_spill_threshold_ms", pre_spill_threshold_ms);
+    EnsureConfigDefault("gpt_gzip_min_bytes", pre_gzip_min_bytes);
+    EnsureConfigDefault("gpt_tm_path", pre_tm_path);
+    EnsureConfigDefault("gpt_tm_serve", pre_tm_serve);
+    EnsureConfigDefault("gpt_tm_hint", pre_tm_hint);
+    EnsureConfigDefault("gpt_prefilter", pre_prefilter);
+}
+
+// Login and logout in either plugin variant bump this shared counter; every instance reloads
+// its settings on the next cue instead of reading each key from the host for every line
+void BumpConfigGeneration() {
+    HostSaveString("gpt_config_generation", "" + (ParseInt(HostLoadString("gpt_config_generation", "0")) + 1));
 }
 
 void RefreshConfiguration() {
+    string generation = HostLoadString("gpt_config_generation", "0") + "|" + pre_config_generation;
+    if (generation == config_snapshot_generation)
+        return;
+    config_snapshot_generation = generation;
+    ReloadConfiguration();
+}
+
+void ReloadConfiguration() {
     EnsureInstallerDefaultsPersisted();
     api_key = LoadInstallerConfig("gpt_api_key", pre_api_key, "wc_api_key");
     selected_model = LoadInstallerConfig("gpt_selected_model", pre_selected_model, "wc_selected_model");
@@ -130,6 +327,39 @@ void RefreshConfiguration() {
     context_token_budget = LoadInstallerConfig("gpt_context_token_budget", pre_context_token_budget);
     context_truncation_mode = LoadInstallerConfig("gpt_context_truncation_mode", pre_context_truncation_mode);
     context_cache_mode = NormalizeCacheMode(LoadInstallerConfig("gpt_context_cache_mode", pre_context_cache_mode));
+    string previousBudgetMode = context_budget_mode;
+    context_budget_mode = ToLower(LoadInstallerConfig("gpt_context_budget_mode", pre_context_budget_mode).Trim()) == "adaptive" ? "adaptive" : "fixed";
+    if (context_budget_mode != previousBudgetMode)
+        ResetAdaptiveBudget();
+    route_mode = NormalizeRouteMode(LoadInstallerConfig("gpt_route_mode", pre_route_mode));
+    route_fast_model = LoadInstallerConfig("gpt_route_fast_model", pre_route_fast_model).Trim();
+    route_strong_model = LoadInstallerConfig("gpt_route_strong_model", pre_route_strong_model).Trim();
+    route_threshold = LoadInstallerConfig("gpt_route_threshold", pre_route_threshold);
+    deadline_ms = LoadInstallerConfig("gpt_deadline_ms", pre_deadline_ms);
+    extra_target_langs = NormalizeTargetList(LoadInstallerConfig("gpt_extra_target_langs", pre_extra_target_langs));
+    warmup_mode = NormalizeWarmupMode(LoadInstallerConfig("gpt_warmup", pre_warmup));
+    local_api_url = NormalizeLocalApiUrl(LoadInstallerConfig("gpt_local_api_url", pre_local_api_url));
+    local_model = LoadInstallerConfig("gpt_local_model", pre_local_model).Trim();
+    spill_threshold_ms = LoadInstallerConfig("gpt_spill_threshold_ms", pre_spill_threshold_ms);
+    gzip_min_bytes = LoadInstallerConfig("gpt_gzip_min_bytes", pre_gzip_min_bytes);
+    tm_path = LoadInstallerConfig("gpt_tm_path", pre_tm_path).Trim();
+    tm_serve = LoadInstallerConfig("gpt_tm_serve", pre_tm_serve);
+    tm_hint = LoadInstallerConfig("gpt_tm_hint", pre_tm_hint);
+    prefilter_mode = ToLower(LoadInstallerConfig("gpt_prefilter", pre_prefilter).Trim()) == "off" ? "off" : "on";
+    config_delay_ms = ParseInt(delay_ms);
+    config_retry_mode = ParseInt(retry_mode);
+    config_context_budget = ParseInt(context_token_budget);
+    config_deadline_ms = ParseInt(deadline_ms);
+    model_limit_cache_models.resize(0);
+    model_limit_cache_values.resize(0);
+
+    string chainConfigKey = apiUrl + "|" + selected_model + "|" + context_cache_mode;
+    if (chainConfigKey != response_chain_config_key) {
+        if (response_chain_id != "")
+            ResetResponseChain("configuration changed");
+        response_chain_config_key = chainConfigKey;
+        response_chain_disabled_for_session = false;
+    }
 }
 
 // Supported Language List
@@ -293,6 +523,8 @@ bool EqualsIgnoreCase(const string &in a, const string &in b) {
 // API Key and API Base verification process
 string ServerLogin(string User, string Pass) {
     RefreshConfiguration();
+    // Login parsing overwrites the settings in place; reload them from the host on the next cue
+    config_snapshot_generation = "";
     string errorAccum = "";
     User = User.Trim();
     Pass = Pass.Trim();
@@ -311,6 +543,21 @@ string ServerLogin(string User, string Pass) {
     string delayToken = "";
     string retryToken = "";
     string cacheToken = "";
+    string deadlineToken = "";
+    string targetsToken = "";
+    bool targetsGiven = false;
+    string warmupToken = "";
+    string localToken = "";
+    bool localGiven = false;
+    string localModelToken = "";
+    string spillToken = "";
+    string budgetToken = "";
+    string gzipToken = "";
+    string tmToken = "";
+    bool tmGiven = false;
+    string tmServeToken = "";
+    string tmHintToken = "";
+    string prefilterToken = "";
     string normalizedCacheMode = context_cache_mode;
     if (tokens.length() >= 1) {
         userModel = tokens[0];
@@ -324,12 +571,52 @@ string ServerLogin(string User, string Pass) {
             retryToken = t.substr(5);
         else if (IsDigits(t))
             delayToken = t;
+        else if (lowered.length() >= 9 && lowered.substr(0,9) == "deadline=" && IsDigits(t.substr(9)))
+            deadlineToken = t.substr(9);
+        else if (lowered.length() >= 8 && lowered.substr(0,8) == "targets=") {
+            targetsToken = t.substr(8);
+            targetsGiven = true;
+        }
+        else if (lowered.length() >= 6 && lowered.substr(0,6) == "local=") {
+            localToken = t.substr(6);
+            localGiven = true;
+        }
+        else if (lowered.length() >= 11 && lowered.substr(0,11) == "localmodel=")
+            localModelToken = t.substr(11).Trim();
+        else if (lowered.length() >= 6 && lowered.substr(0,6) == "spill=" && IsDigits(t.substr(6)))
+            spillToken = t.substr(6);
+        else if (lowered.length() >= 5 && lowered.substr(0,5) == "gzip=" && IsDigits(t.substr(5)))
+            gzipToken = t.substr(5);
+        else if (lowered == "gzip=off" || lowered == "nogzip")
+            gzipToken = "0";
+        else if (lowered.length() >= 8 && lowered.substr(0,8) == "tmserve=" && IsDigits(t.substr(8)))
+            tmServeToken = t.substr(8);
+        else if (lowered.length() >= 7 && lowered.substr(0,7) == "tmhint=" && IsDigits(t.substr(7)))
+            tmHintToken = t.substr(7);
+        else if (lowered.length() >= 3 && lowered.substr(0,3) == "tm=") {
+            tmToken = t.substr(3).Trim();
+            tmGiven = true;
+        }
+        else if (lowered == "budget=adaptive" || lowered == "budget=fixed")
+            budgetToken = lowered.substr(7);
         else if (lowered.length() >= 6 && lowered.substr(0,6) == "cache=")
             cacheToken = lowered.substr(6);
         else if (lowered == "cacheauto" || lowered == "cacheon" || lowered == "cache")
             cacheToken = "auto";
         else if (lowered == "cacheoff" || lowered == "nocache")
             cacheToken = "off";
+        else if (lowered == "cachechain")
+            cacheToken = "chain";
+        else if (lowered == "warmup=off" || lowered == "nowarmup")
+            warmupToken = "off";
+        else if (lowered == "warmup=on" || lowered == "warmup")
+            warmupToken = "on";
+        else if (lowered == "warmup=probe")
+            warmupToken = "probe";
+        else if (lowered == "prefilter=off" || lowered == "noprefilter")
+            prefilterToken = "off";
+        else if (lowered == "prefilter=on" || lowered == "prefilter")
+            prefilterToken = "on";
         else if (customApiUrl == "")
             customApiUrl = t;
     }
@@ -337,6 +624,30 @@ string ServerLogin(string User, string Pass) {
         retry_mode = retryToken;
     if (delayToken != "")
         delay_ms = delayToken;
+    if (deadlineToken != "")
+        deadline_ms = deadlineToken;
+    if (targetsGiven)
+        extra_target_langs = NormalizeTargetList(targetsToken);
+    if (warmupToken != "")
+        warmup_mode = warmupToken;
+    if (localGiven)
+        local_api_url = NormalizeLocalApiUrl(localToken);
+    if (localModelToken != "")
+        local_model = localModelToken;
+    if (spillToken != "")
+        spill_threshold_ms = spillToken;
+    if (budgetToken != "")
+        context_budget_mode = budgetToken;
+    if (gzipToken != "")
+        gzip_min_bytes = gzipToken;
+    if (tmGiven)
+        tm_path = ToLower(tmToken) == "off" ? "" : tmToken;
+    if (tmServeToken != "")
+        tm_serve = tmServeToken;
+    if (tmHintToken != "")
+        tm_hint = tmHintToken;
+    if (prefilterToken != "")
+        prefilter_mode = prefilterToken;
     if (cacheToken != "")
         normalizedCacheMode = NormalizeCacheMode(cacheToken);
     else
@@ -357,6 +668,14 @@ string ServerLogin(string User, string Pass) {
         errorAccum += "API Key not configured. Please enter a valid API Key.\n";
         return errorAccum;
     }
+    string loginHash = LoginCacheHash(apiUrlLocal, userModel, Pass);
+    string cachedEndpoint = LookupLoginCache(loginHash);
+    if (cachedEndpoint != "") {
+        CommitLogin(userModel, Pass, cachedEndpoint, normalizedCacheMode);
+        HostPrintUTF8("Login settings unchanged; reused cached verification.\n");
+        return "200 ok";
+    }
+
     bool isOfficial = (apiUrlLocal.find("api.openai.com") != -1);
     string verifyHeaders = "Authorization: Bearer " + Pass + "\nContent-Type: application/json";
     string testSystemMsg = "You are a test assistant.";
@@ -366,28 +685,23 @@ string ServerLogin(string User, string Pass) {
     string testRequestData = "{\"model\":\"" + userModel + "\"," 
                              "\"messages\":[{\"role\":\"system\",\"content\":\"" + escapedTestSystemMsg + "\"}," 
                              "{\"role\":\"user\",\"content\":\"" + escapedTestUserMsg + "\"}]}";
+    string correctedApiUrl = apiUrlLocal.find("chat/completions") == -1 ? apiUrlLocal + "/chat/completions" : "";
+
+    // HostUrlGetString blocks for each round trip, so the probes run one after another and the
+    // corrected URL and the model list are only asked for once the test message has failed
     string testResponse = HostUrlGetString(apiUrlLocal, UserAgent, verifyHeaders, testRequestData);
     if (testResponse != "") {
         JsonReader testReader;
         JsonValue testRoot;
-            if (testReader.parse(testResponse, testRoot)) {
-                if (testRoot.isObject() && testRoot["choices"].isArray() && testRoot["choices"].size() > 0) {
-                    selected_model = userModel;
-                    api_key = Pass;
-                    HostSaveString("gpt_api_key", api_key);
-                    HostSaveString("gpt_selected_model", selected_model);
-                    HostSaveString("gpt_apiUrl", apiUrlLocal);
-                    HostSaveString("gpt_delay_ms", delay_ms);
-                    HostSaveString("gpt_retry_mode", retry_mode);
-                    context_cache_mode = normalizedCacheMode;
-                    HostSaveString("gpt_context_cache_mode", context_cache_mode);
-                    context_cache_disabled_for_session = false;
-                    context_cache_disable_key = "";
-                    return "200 ok";
-                } else {
-                    if (testRoot.isObject() && testRoot["error"].isObject() && testRoot["error"]["message"].isString())
-                        errorAccum += "Test message error: " + testRoot["error"]["message"].asString() + "\n";
-                    else
+        if (testReader.parse(testResponse, testRoot)) {
+            if (testRoot.isObject() && testRoot["choices"].isArray() && testRoot["choices"].size() > 0) {
+                CommitLogin(userModel, Pass, apiUrlLocal, normalizedCacheMode);
+                StoreLoginCache(loginHash, apiUrlLocal);
+                return "200 ok";
+            } else {
+                if (testRoot.isObject() && testRoot["error"].isObject() && testRoot["error"]["message"].isString())
+                    errorAccum += "Test message error: " + testRoot["error"]["message"].asString() + "\n";
+                else
                     errorAccum += "Test message response invalid.\n";
             }
         } else {
@@ -396,27 +710,16 @@ string ServerLogin(string User, string Pass) {
     } else {
         errorAccum += "No response from server when sending test message.\n";
     }
-    if (apiUrlLocal.find("chat/completions") == -1) {
-        string correctedApiUrl = apiUrlLocal + "/chat/completions";
+    if (correctedApiUrl != "") {
         string correctedTestResponse = HostUrlGetString(correctedApiUrl, UserAgent, verifyHeaders, testRequestData);
         if (correctedTestResponse != "") {
             JsonReader correctedReader;
             JsonValue correctedRoot;
             if (correctedReader.parse(correctedTestResponse, correctedRoot)) {
                 if (correctedRoot.isObject() && correctedRoot["choices"].isArray() && correctedRoot["choices"].size() > 0) {
-                    apiUrlLocal = correctedApiUrl;
-                    selected_model = userModel;
-                    api_key = Pass;
-                    HostSaveString("gpt_api_key", api_key);
-                    HostSaveString("gpt_selected_model", selected_model);
-                    HostSaveString("gpt_apiUrl", apiUrlLocal);
-                    HostSaveString("gpt_delay_ms", delay_ms);
-                    HostSaveString("gpt_retry_mode", retry_mode);
-                    context_cache_mode = normalizedCacheMode;
-                    HostSaveString("gpt_context_cache_mode", context_cache_mode);
-                    context_cache_disabled_for_session = false;
-                    context_cache_disable_key = "";
-                    return "Warning: Your API base was auto-corrected to: " + apiUrlLocal + "\n200 ok";
+                    CommitLogin(userModel, Pass, correctedApiUrl, normalizedCacheMode);
+                    StoreLoginCache(loginHash, correctedApiUrl);
+                    return "Warning: Your API base was auto-corrected to: " + correctedApiUrl + "\n200 ok";
                 } else {
                     if (correctedRoot.isObject() && correctedRoot["error"].isObject() && correctedRoot["error"]["message"].isString())
                         errorAccum += "Auto-correction test error: " + correctedRoot["error"]["message"].asString() + "\n";
@@ -476,8 +779,127 @@ string ServerLogin(string User, string Pass) {
     return "Unknown error during API verification. Please check your network, API Key, and API Base settings.\n";
 }
 
+// Saves a verified login and resets per-session state
+void CommitLogin(const string &in userModel, const string &in key, const string &in endpoint, const string &in normalizedCacheMode) {
+    selected_model = userModel;
+    api_key = key;
+    apiUrl = endpoint;
+    HostSaveString("gpt_api_key", api_key);
+    HostSaveString("gpt_selected_model", selected_model);
+    HostSaveString("gpt_apiUrl", endpoint);
+    HostSaveString("gpt_delay_ms", delay_ms);
+    HostSaveString("gpt_retry_mode", retry_mode);
+    context_cache_mode = normalizedCacheMode;
+    HostSaveString("gpt_context_cache_mode", context_cache_mode);
+    HostSaveString("gpt_deadline_ms", deadline_ms);
+    HostSaveString("gpt_extra_target_langs", extra_target_langs);
+    HostSaveString("gpt_warmup", warmup_mode);
+    HostSaveString("gpt_local_api_url", local_api_url);
+    HostSaveString("gpt_local_model", local_model);
+    HostSaveString("gpt_spill_threshold_ms", spill_threshold_ms);
+    HostSaveString("gpt_context_budget_mode", context_budget_mode);
+    HostSaveString("gpt_gzip_min_bytes", gzip_min_bytes);
+    HostSaveString("gpt_tm_path", tm_path);
+    HostSaveString("gpt_tm_serve", tm_serve);
+    HostSaveString("gpt_tm_hint", tm_hint);
+    HostSaveString("gpt_prefilter", prefilter_mode);
+    BumpConfigGeneration();
+    tm_loaded_path = "";
+    context_cache_disabled_for_session = false;
+    context_cache_disable_key = "";
+    ResetLocalProvider();
+    ResetAdaptiveBudget();
+    deadline_helper_warned = false;
+    ArmWarmup("login");
+}
+
+// Login cache: one line per verified (API base, model, key) as "<sha256> <tick> <endpoint>".
+// The installer writes the same line with the stamp "pending" into pre_login_cache.
+string NormalizeLoginBase(const string &in url) {
+    string base = url.Trim();
+    while (base.length() > 0 && base.substr(base.length() - 1, 1) == "/")
+        base = base.substr(0, base.length() - 1);
+    int tail = base.find("/chat/completions");
+    if (tail == -1)
+        tail = base.find("/responses");
+    if (tail != -1)
+        base = base.substr(0, tail);
+    return base;
+}
+
+string LoginCacheHash(const string &in url, const string &in model, const string &in key) {
+    return ToLower(HostHashSHA256(NormalizeLoginBase(url) + "\n" + model + "\n" + key));
+}
+
+array<string> SplitLoginCacheEntry(const string &in entry) {
+    array<string> fields;
+    int start = 0;
+    for (int i = 0; i <= int(entry.length()); i++) {
+        if (i == int(entry.length()) || entry.substr(i, 1) == " ") {
+            fields.insertLast(entry.substr(start, i - start));
+            start = i + 1;
+        }
+    }
+    return fields;
+}
+
+array<string> LoadLoginCacheEntries() {
+    array<string> entries;
+    string stored = HostLoadString("gpt_login_cache", "");
+    int start = 0;
+    for (int i = 0; i <= int(stored.length()); i++) {
+        if (i == int(stored.length()) || stored.substr(i, 1) == "\n") {
+            string entry = stored.substr(start, i - start).Trim();
+            if (entry != "")
+                entries.insertLast(entry);
+            start = i + 1;
+        }
+    }
+    return entries;
+}
+
+string LookupLoginCache(const string &in hash) {
+    array<string> entries = LoadLoginCacheEntries();
+    for (uint i = 0; i < entries.length(); i++) {
+        array<string> fields = SplitLoginCacheEntry(entries[i]);
+        if (fields.length() != 3 || fields[0] != hash)
+            continue;
+        // Tick stamps expire after the TTL and on reboot (the tick count restarts below the stamp)
+        uint stamp = 0;
+        for (uint j = 0; j < fields[1].length(); j++) {
+            uint8 c = fields[1][j];
+            if (c >= 48 && c <= 57)
+                stamp = stamp * 10 + (c - 48);
+        }
+        uint age = HostGetTickCount() - stamp;
+        return age < LOGIN_CACHE_TTL_MS ? fields[2] : "";
+    }
+    // An installer-verified entry is trusted once, then re-stamped like any other
+    array<string> seed = SplitLoginCacheEntry(pre_login_cache.Trim());
+    if (seed.length() == 3 && seed[0] == hash && seed[1] == "pending" && HostLoadString("gpt_login_cache_seed", "") != hash) {
+        HostSaveString("gpt_login_cache_seed", hash);
+        StoreLoginCache(hash, seed[2]);
+        return seed[2];
+    }
+    return "";
+}
+
+void StoreLoginCache(const string &in hash, const string &in endpoint) {
+    array<string> entries = LoadLoginCacheEntries();
+    string result = hash + " " + HostGetTickCount() + " " + endpoint;
+    uint kept = 1;
+    for (uint i = entries.length(); i > 0 && kept < LOGIN_CACHE_LIMIT; i--) {
+        if (entries[i - 1].find(hash + " ") == 0)
+            continue;
+        result = entries[i - 1] + "\n" + result;
+        kept++;
+    }
+    HostSaveString("gpt_login_cache", result);
+}
+
 // Logout Interface to clear model name and API Key
 void ServerLogout() {
+    warmup_pending = false;
     api_key = "";
     selected_model = pre_selected_model;
     apiUrl = pre_apiUrl;
@@ -486,8 +908,29 @@ void ServerLogout() {
     context_token_budget = pre_context_token_budget;
     context_truncation_mode = pre_context_truncation_mode;
     context_cache_mode = pre_context_cache_mode;
+    context_budget_mode = pre_context_budget_mode;
+    ResetAdaptiveBudget();
+    route_mode = pre_route_mode;
+    route_fast_model = pre_route_fast_model;
+    route_strong_model = pre_route_strong_model;
+    route_threshold = pre_route_threshold;
+    deadline_ms = pre_deadline_ms;
+    extra_target_langs = pre_extra_target_langs;
+    warmup_mode = pre_warmup;
+    local_api_url = pre_local_api_url;
+    local_model = pre_local_model;
+    spill_threshold_ms = pre_spill_threshold_ms;
+    gzip_min_bytes = pre_gzip_min_bytes;
+    tm_path = pre_tm_path;
+    tm_serve = pre_tm_serve;
+    tm_hint = pre_tm_hint;
+    tm_loaded_path = "";
+    prefilter_mode = pre_prefilter;
+    ResetLocalProvider();
+    ResetGzipEndpoints();
     context_cache_disabled_for_session = false;
     context_cache_disable_key = "";
+    ResetResponseChain("");
     HostSaveString("gpt_api_key", "");
     HostSaveString("gpt_selected_model", selected_model);
     HostSaveString("gpt_apiUrl", apiUrl);
@@ -496,55 +939,145 @@ void ServerLogout() {
     HostSaveString("gpt_context_token_budget", context_token_budget);
     HostSaveString("gpt_context_truncation_mode", context_truncation_mode);
     HostSaveString("gpt_context_cache_mode", context_cache_mode);
+    HostSaveString("gpt_context_budget_mode", context_budget_mode);
+    HostSaveString("gpt_route_mode", route_mode);
+    HostSaveString("gpt_route_fast_model", route_fast_model);
+    HostSaveString("gpt_route_strong_model", route_strong_model);
+    HostSaveString("gpt_route_threshold", route_threshold);
+    HostSaveString("gpt_deadline_ms", deadline_ms);
+    HostSaveString("gpt_extra_target_langs", extra_target_langs);
+    HostSaveString("gpt_warmup", warmup_mode);
+    HostSaveString("gpt_local_api_url", local_api_url);
+    HostSaveString("gpt_local_model", local_model);
+    HostSaveString("gpt_spill_threshold_ms", spill_threshold_ms);
+    HostSaveString("gpt_gzip_min_bytes", gzip_min_bytes);
+    HostSaveString("gpt_tm_path", tm_path);
+    HostSaveString("gpt_tm_serve", tm_serve);
+    HostSaveString("gpt_tm_hint", tm_hint);
+    HostSaveString("gpt_prefilter", prefilter_mode);
+    HostSaveString("gpt_login_cache", "");
+    BumpConfigGeneration();
+    fanout_slot_keys.resize(0);
+    fanout_slot_values.resize(0);
     HostPrintUTF8("Successfully logged out.\n");
 }
 
-// JSON String Escape Function
+// JSON String Escape Function (single pass; copies unchanged runs in one piece)
 string JsonEscape(const string &in input) {
-    string output = input;
-    output.replace("\\", "\\\\");
-    output.replace("\"", "\\\"");
-    output.replace("\n", "\\n");
-    output.replace("\r", "\\r");
-    output.replace("\t", "\\t");
-    output.replace("/", "\\/");
+    uint len = input.length();
+    uint runStart = 0;
+    string output = "";
+    for (uint i = 0; i < len; i++) {
+        uint8 c = input[i];
+        string replacement;
+        if (c == 92)
+            replacement = "\\\\";
+        else if (c == 34)
+            replacement = "\\\"";
+        else if (c == 10)
+            replacement = "\\n";
+        else if (c == 13)
+            replacement = "\\r";
+        else if (c == 9)
+            replacement = "\\t";
+        else if (c == 47)
+            replacement = "\\/";
+        else
+            continue;
+        if (i > runStart)
+            output += input.substr(runStart, i - runStart);
+        output += replacement;
+        runStart = i + 1;
+    }
+    if (runStart == 0)
+        return input;
+    if (runStart < len)
+        output += input.substr(runStart, len - runStart);
     return output;
 }
 
 // Function to estimate token count based on character length
 int EstimateTokenCount(const string &in text) {
-    return int(float(text.length()) / 4);
+    return int(float(text.length()) / token_bytes_ratio);
 }
 
 // Function to get the model's maximum context length
 int GetModelMaxTokens(const string &in modelName) {
+    int cached = model_limit_cache_models.find(modelName);
+    if (cached >= 0)
+        return model_limit_cache_values[cached];
+    int limit = ResolveModelMaxTokens(modelName);
+    model_limit_cache_models.insertLast(modelName);
+    model_limit_cache_values.insertLast(limit);
+    return limit;
+}
+
+int ResolveModelMaxTokens(const string &in modelName) {
     EnsureTokenRulesLoaded();
     string trimmedModel = modelName.Trim();
     if (trimmedModel == "")
         return default_model_token_limit;
 
     for (uint i = 0; i < token_rule_types.length(); i++) {
-        string matchType = token_rule_types[i];
-        string matchValue = token_rule_values[i];
-        int limit = token_rule_limits[i];
-        if (matchType == "prefix") {
-            if (trimmedModel.length() >= matchValue.length() &&
-                trimmedModel.substr(0, matchValue.length()) == matchValue)
-                return limit;
-        } else if (matchType == "contains") {
-            if (trimmedModel.find(matchValue) != -1)
-                return limit;
-        } else if (matchType == "equals") {
-            if (trimmedModel == matchValue)
-                return limit;
-        }
+        if (ModelRuleMatches(token_rule_types[i], token_rule_values[i], trimmedModel))
+            return token_rule_limits[i];
     }
 
     return default_model_token_limit;
 }
 
+// Shared by the token limit and request profile tables
+bool ModelRuleMatches(const string &in matchType, const string &in matchValue, const string &in model) {
+    if (matchType == "prefix")
+        return model.length() >= matchValue.length() && model.substr(0, matchValue.length()) == matchValue;
+    if (matchType == "contains")
+        return model.find(matchValue) != -1;
+    if (matchType == "equals")
+        return model == matchValue;
+    return false;
+}
+
+// Static instruction block of the system prompt (everything before the context section).
+// With fan-out targets the model answers every language at once as a JSON object.
+string BuildSystemPromptPrefix(const string &in sourceLabel, const string &in targetLabel, const string &in fanoutTargets = "") {
+    if (fanoutTargets != "") {
+        return "You are an expert subtitle translate tool with a deep understanding of both language and culture. "
+            "Based on contextual clues, you provide translations that capture not only the literal meaning but also the nuanced metaphors, euphemisms, and cultural symbols embedded in the dialogue. "
+            "Your translations reflect the intended tone and cultural context, ensuring that every subtle reference and idiomatic expression is accurately conveyed. "
+            "I will provide you with relevant context when available; never echo that context in the output.\n\n"
+            "Rules:\n"
+            "1. Translate the subtitle into every target language.\n"
+            "2. Output only a JSON object whose keys are the target language codes exactly as listed and whose values are the translations.\n"
+            "3. Do NOT output extra comments, explanations or code fences.\n\n"
+            "Source language: " + sourceLabel + "\n"
+            "Target language: " + targetLabel + "\n"
+            "Target languages: " + fanoutTargets + "\n";
+    }
+    return "You are an expert subtitle translate tool with a deep understanding of both language and culture. "
+        "Based on contextual clues, you provide translations that capture not only the literal meaning but also the nuanced metaphors, euphemisms, and cultural symbols embedded in the dialogue. "
+        "Your translations reflect the intended tone and cultural context, ensuring that every subtle reference and idiomatic expression is accurately conveyed. "
+        "I will provide you with relevant context when available; never echo that context in the output.\n\n"
+        "Rules:\n"
+        "1. Output the translation only.\n"
+        "2. Do NOT output extra comments or explanations.\n"
+        "3. Do NOT use any special characters or formatting in the translation.\n\n"
+        "Source language: " + sourceLabel + "\n"
+        "Target language: " + targetLabel + "\n";
+}
+
+// Escaped prompt prefix, rebuilt only when the language pair or model changes
+string GetEscapedPromptPrefix(const string &in model, const string &in sourceLabel, const string &in targetLabel, const string &in fanoutTargets = "") {
+    string cacheKey = sourceLabel + "|" + targetLabel + "|" + fanoutTargets + "|" + model;
+    if (cacheKey != prompt_prefix_cache_key) {
+        prompt_prefix_cache_escaped = JsonEscape(BuildSystemPromptPrefix(sourceLabel, targetLabel, fanoutTargets));
+        prompt_prefix_cache_key = cacheKey;
+    }
+    return prompt_prefix_cache_escaped;
+}
+
 // Translation Function
 string Translate(string Text, string &in SrcLang, string &in DstLang) {
+    uint translateStartTick = HostGetTickCount();
     RefreshConfiguration();
 
     if (api_key == "") {
@@ -561,18 +1094,82 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
         SrcLang = "";
     }
 
+    // Styling markup never reaches the model; RestoreCueMarkup() puts it back into the translation
+    string styledText = Text;
+    Text = StripCueMarkup(Text);
+    if (Text == "") {
+        SrcLang = "UTF8";
+        DstLang = "UTF8";
+        return styledText;
+    }
+
+    // Music notes, sound-effect tags, speaker tags and lines already in DstLang are shown without a request
+    if (prefilter_mode != "off") {
+        prefilter_cue_count++;
+        string skipReason = ClassifyNoTranslationCue(Text, SrcLang, DstLang);
+        if (skipReason != "") {
+            prefilter_skip_count++;
+            HostPrintUTF8("Pre-filter: " + skipReason + " cue shown without a request. skipped=" + prefilter_skip_count + "/"
+                          + prefilter_cue_count + " (" + (prefilter_skip_count * 100 / prefilter_cue_count) + "%)\n");
+            SrcLang = "UTF8";
+            DstLang = "UTF8";
+            RunPendingWarmup();
+            return styledText;
+        }
+    }
+
+    // A fan-out request for another track already translated this cue into DstLang
+    string slotTranslation = TakeFanoutSlot(Text, DstLang);
+    if (slotTranslation != "") {
+        slotTranslation = RestoreCueMarkup(FinishTranslation(slotTranslation, DstLang, ""));
+        SrcLang = "UTF8";
+        DstLang = "UTF8";
+        RunPendingWarmup();
+        return slotTranslation;
+    }
+
+    string escapedText = JsonEscape(Text);
     subtitleHistory.insertLast(Text);
+    subtitleHistoryEscaped.insertLast(escapedText);
+    if (context_cache_mode == "chain")
+        DetectChainDiscontinuity(Text);
+
+    // Near-duplicate lines (recaps, catchphrases, a changed name) come from the translation memory:
+    // close enough is shown as-is, otherwise the earlier translation rides along as a hint
+    string memorySource = "";
+    int memorySimilarity = 0;
+    string memoryTranslation = LookupTranslationMemory(Text, DstLang, memorySource, memorySimilarity);
+    int memoryServe = ParseInt(tm_serve);
+    if (memoryTranslation != "" && memoryServe > 0 && memorySimilarity >= memoryServe) {
+        tm_served_count++;
+        HostPrintUTF8("Translation memory: served a " + memorySimilarity + "% match. served=" + tm_served_count + " hinted=" + tm_hinted_count + "\n");
+        memoryTranslation = RestoreCueMarkup(FinishTranslation(memoryTranslation, DstLang, ""));
+        SrcLang = "UTF8";
+        DstLang = "UTF8";
+        RunPendingWarmup();
+        return memoryTranslation;
+    }
+    int memoryHint = ParseInt(tm_hint);
+    if (memoryHint <= 0 || memorySimilarity < memoryHint)
+        memoryTranslation = "";
 
-    int maxTokens = GetModelMaxTokens(selected_model);
+    string cueModel = SelectModelForCue(Text);
+    int maxTokens = GetModelMaxTokens(cueModel);
     int safeBudget = maxTokens - 1000;
     if (safeBudget < 0)
         safeBudget = maxTokens;
     if (safeBudget < 0)
         safeBudget = 0;
 
-    int configuredBudget = ParseInt(context_token_budget);
+    int configuredBudget = config_context_budget;
     if (configuredBudget <= 0 || configuredBudget > safeBudget)
         configuredBudget = safeBudget;
+    int sendBudget = configuredBudget;
+    if (context_budget_mode == "adaptive") {
+        if (adaptive_context_budget < 0 || adaptive_context_budget > configuredBudget)
+            adaptive_context_budget = configuredBudget;
+        sendBudget = adaptive_context_budget;
+    }
 
     string truncMode = context_truncation_mode;
     bool useSmartTrim = EqualsIgnoreCase(truncMode, "smart_trim");
@@ -583,12 +1180,15 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
     int availableForContext = safeBudget - currentTokens;
     if (availableForContext < 0)
         availableForContext = 0;
-    if (availableForContext > configuredBudget)
-        availableForContext = configuredBudget;
+    if (availableForContext > sendBudget)
+        availableForContext = sendBudget;
 
-    array<string> contextSegments;
+    // Walk backwards to find the oldest line that still fits, then join the
+    // already-escaped history forwards so no line is escaped twice.
     int usedContextTokens = 0;
     int idx = int(subtitleHistory.length()) - 2;
+    int firstContextIdx = idx + 1;
+    string trimmedHead = "";
     while (idx >= 0 && usedContextTokens < availableForContext) {
         string subtitle = subtitleHistory[idx];
         int subtitleTokens = EstimateTokenCount(subtitle);
@@ -597,16 +1197,16 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
             continue;
         }
         if (usedContextTokens + subtitleTokens <= availableForContext) {
-            contextSegments.insertAt(0, subtitle);
+            firstContextIdx = idx;
             usedContextTokens += subtitleTokens;
         } else if (useSmartTrim) {
             int remainingTokens = availableForContext - usedContextTokens;
             if (remainingTokens > 0) {
-                int charBudget = remainingTokens * 4;
+                int charBudget = int(remainingTokens * token_bytes_ratio);
                 int subtitleLength = int(subtitle.length());
                 if (charBudget < subtitleLength)
                     subtitle = subtitle.substr(subtitleLength - charBudget, charBudget);
-                contextSegments.insertAt(0, subtitle);
+                trimmedHead = JsonEscape(subtitle);
             }
             usedContextTokens = availableForContext;
             break;
@@ -616,11 +1216,14 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
         idx--;
     }
 
-    string context = "";
-    for (uint ctxIndex = 0; ctxIndex < contextSegments.length(); ctxIndex++) {
-        if (ctxIndex > 0)
-            context += "\n";
-        context += contextSegments[ctxIndex];
+    string escapedContext = trimmedHead;
+    int lastContextIdx = int(subtitleHistory.length()) - 2;
+    for (int ctxIndex = firstContextIdx; ctxIndex <= lastContextIdx; ctxIndex++) {
+        if (EstimateTokenCount(subtitleHistory[ctxIndex]) <= 0)
+            continue;
+        if (escapedContext != "")
+            escapedContext += "\\n";
+        escapedContext += subtitleHistoryEscaped[ctxIndex];
     }
 
     int historyBudget = configuredBudget;
@@ -643,6 +1246,7 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
     if (subtitleHistory.length() > historyTargetCount) {
         while (subtitleHistory.length() > shrinkTargetCount) {
             subtitleHistory.removeAt(0);
+            subtitleHistoryEscaped.removeAt(0);
         }
     }
 
@@ -650,158 +1254,1492 @@ string Translate(string Text, string &in SrcLang, string &in DstLang) {
     string targetLangCode = DstLang;
     string targetLabel = targetLangCode;
 
-    string systemMsg =
-        "You are an expert subtitle translate tool with a deep understanding of both language and culture. "
-        "Based on contextual clues, you provide translations that capture not only the literal meaning but also the nuanced metaphors, euphemisms, and cultural symbols embedded in the dialogue. "
-        "Your translations reflect the intended tone and cultural context, ensuring that every subtle reference and idiomatic expression is accurately conveyed. "
-        "I will provide you with relevant context when available; never echo that context in the output.\n\n"
-        "Rules:\n"
-        "1. Output the translation only.\n"
-        "2. Do NOT output extra comments or explanations.\n"
-        "3. Do NOT use any special characters or formatting in the translation.\n\n"
-        "Source language: " + sourceLabel + "\n"
-        "Target language: " + targetLabel + "\n";
-
-    if (context != "") {
-        systemMsg += "\nSubtitle context (older to newer):\n" + context + "\n\nDo not translate or repeat any context entries.";
+    string fanoutTargets = BuildFanoutTargets(targetLangCode);
+    string escapedSystemMsg = GetEscapedPromptPrefix(cueModel, sourceLabel, targetLabel, fanoutTargets);
+    // A fan-out reply carries one translation per language, so the output cap grows with it
+    int replyLanguages = 1;
+    for (uint i = 0; i < fanoutTargets.length(); i++) {
+        if (fanoutTargets.substr(i, 1) == ",")
+            replyLanguages++;
+    }
+    request_profile_cue_tokens = currentTokens * replyLanguages;
+    if (escapedContext != "") {
+        escapedSystemMsg += "\\nSubtitle context (older to newer):\\n" + escapedContext + "\\n\\nDo not translate or repeat any context entries.";
+    }
+    if (memoryTranslation != "") {
+        tm_hinted_count++;
+        escapedSystemMsg += "\\n\\nA similar line was translated before:\\n" + JsonEscape(memorySource) + "\\n=> " + JsonEscape(memoryTranslation)
+                          + "\\nReuse its wording where the meaning is the same.";
     }
 
-    string userMsg = Text;
+    string headers = "Authorization: Bearer " + api_key + "\nContent-Type: application/json";
+    int delayInt = config_delay_ms;
+    int retryModeInt = config_retry_mode;
+
+    // This cue's own request opens the connection, so a warm-up still pending is no longer useful
+    warmup_pending = false;
+    BeginCueDeadline(Text);
+    if (cue_deadline_ms > 0 && IsLateFillHelperUrl(apiUrl)) {
+        headers += "\nX-Translate-Deadline-Ms: " + cue_deadline_ms;
+    } else if (cue_deadline_ms > 0 && !deadline_helper_warned) {
+        // Without the helper nothing cuts a request off: the deadline only stops retries and escalation
+        deadline_helper_warned = true;
+        HostPrintUTF8("Cue deadline is set, but the API URL is not the late-fill helper (tools/latefill_proxy.py); "
+                      "requests are not cut off at the deadline and playback waits for each reply.\n");
+    }
 
-    string escapedSystemMsg = JsonEscape(systemMsg);
-    string escapedUserMsg = JsonEscape(userMsg);
+    string failureText = "";
+    string translation = "";
+    uint requestStartTick = HostGetTickCount();
+    last_prompt_tokens = 0;
+    if (LocalProviderSelected()) {
+        translation = RequestLocalTranslation(escapedSystemMsg, escapedText);
+        if (translation != "")
+            cueModel = local_model;
+    }
+    if (translation == "")
+        translation = RequestTranslation(cueModel, escapedSystemMsg, escapedText, headers, delayInt, retryModeInt, failureText);
+    if (translation != "")
+        UpdateAdaptiveBudget(int(HostGetTickCount() - requestStartTick), EstimateCueDisplayMs(Text),
+                             int(escapedSystemMsg.length() + escapedText.length()), configuredBudget);
+    if (fanoutTargets != "")
+        translation = SplitFanoutReply(translation, Text, targetLangCode, fanoutTargets);
+    if (!cue_deadline_missed && !CueDeadlinePassed() && route_mode == "auto" && route_strong_model != "" && cueModel != route_strong_model &&
+        (translation == "" ? failureText != "" : IsLowConfidenceTranslation(Text, translation))) {
+        string strongFailure = "";
+        string strongTranslation = RequestTranslation(route_strong_model, escapedSystemMsg, escapedText, headers, delayInt, retryModeInt, strongFailure);
+        if (fanoutTargets != "")
+            strongTranslation = SplitFanoutReply(strongTranslation, Text, targetLangCode, fanoutTargets);
+        if (strongTranslation != "") {
+            HostPrintUTF8("Routing: escalated cue from " + cueModel + " to " + route_strong_model + ".\n");
+            translation = strongTranslation;
+            cueModel = route_strong_model;
+        }
+    }
+    if (cue_deadline_ms > 0 && (cue_deadline_missed || CueDeadlinePassed()) && translation == "") {
+        deadline_missed_count++;
+        string repeated = FindRepeatedLineTranslation(Text, targetLangCode);
+        if (repeated != "")
+            deadline_repeat_count++;
+        HostPrintUTF8("Deadline of " + cue_deadline_ms + " ms missed; showing " + (repeated != "" ? "the earlier translation of this line" : "the source text")
+                      + ". met=" + deadline_met_count + " missed=" + deadline_missed_count + " repeated=" + deadline_repeat_count + "\n");
+        ReportFirstCueLatency(translateStartTick);
+        SrcLang = "UTF8";
+        DstLang = "UTF8";
+        return repeated != "" ? RestoreCueMarkup(repeated) : styledText;
+    }
+    if (translation == "")
+        return failureText;
+    if (cue_deadline_ms > 0 && CueDeadlinePassed()) {
+        // The reply is shown, but it came too late to count as met
+        deadline_missed_count++;
+        HostPrintUTF8("Deadline of " + cue_deadline_ms + " ms missed by a late reply (" + int(HostGetTickCount() - cue_start_tick) + " ms). met="
+                      + deadline_met_count + " missed=" + deadline_missed_count + " repeated=" + deadline_repeat_count + "\n");
+    } else if (cue_deadline_ms > 0) {
+        deadline_met_count++;
+    }
 
-    string requestData = "{\"model\":\"" + selected_model + "\"," 
-                         "\"messages\":[{\"role\":\"system\",\"content\":\"" + escapedSystemMsg + "\"}," 
-                         "{\"role\":\"user\",\"content\":\"" + escapedUserMsg + "\"}]}";
+    translation = FinishTranslation(translation, targetLangCode, cueModel);
+    RememberTranslation(Text, targetLangCode, translation);
+    translation = RestoreCueMarkup(translation);
+    ReportFirstCueLatency(translateStartTick);
+    SrcLang = "UTF8";
+    DstLang = "UTF8";
+    return translation;
+}
 
-    string headers = "Authorization: Bearer " + api_key + "\nContent-Type: application/json";
-    int delayInt = ParseInt(delay_ms);
-    int retryModeInt = ParseInt(retry_mode);
+// Model-specific cleanup and RTL marking applied to every returned translation
+string FinishTranslation(string translation, const string &in targetLangCode, const string &in model) {
+    if (model.find("gemini") != -1) {
+        while (translation.length() > 0 && translation.substr(translation.length() - 1, 1) == "\n") {
+            translation = translation.substr(0, translation.length() - 1);
+        }
+    }
+    if (targetLangCode == "fa" || targetLangCode == "ar" || targetLangCode == "he") {
+        string UNICODE_RLE = "\u202B";
+        translation = UNICODE_RLE + translation;
+    }
+    return translation.Trim();
+}
 
-    string cacheSessionKey = context_cache_mode + "|" + apiUrl + "|" + selected_model;
-    if (cacheSessionKey != context_cache_disable_key)
-        context_cache_disabled_for_session = false;
-    context_cache_disable_key = cacheSessionKey;
+// Length of the styling tag starting at pos: an ASS override block such as {\an8} or {\i1},
+// or an HTML-ish tag such as <i>, </b> or <font color="#ffff00">. 0 when pos starts no tag.
+int CueMarkupTagLength(const string &in text, uint pos) {
+    uint8 c = text[pos];
+    if (c == 123) {
+        for (uint i = pos + 1; i < text.length(); i++) {
+            uint8 d = text[i];
+            if (d == 125)
+                return int(i - pos + 1);
+            if (d == 10)
+                return 0;
+        }
+        return 0;
+    }
+    if (c != 60 || pos + 2 >= text.length())
+        return 0;
+    uint8 n = text[pos + 1];
+    if (!((n >= 97 && n <= 122) || (n >= 65 && n <= 90) || n == 47))
+        return 0;
+    for (uint i = pos + 1; i < text.length() && i < pos + 64; i++) {
+        uint8 d = text[i];
+        if (d == 62)
+            return int(i - pos + 1);
+        if (d == 60 || d == 10)
+            return 0;
+    }
+    return 0;
+}
 
-    string translation = "";
-    if (context_cache_mode != "off" && !context_cache_disabled_for_session) {
-        string responsesUrl = DeriveResponsesUrl(apiUrl);
-        string cacheFailure = "";
-        if (responsesUrl != "") {
-            translation = TranslateWithResponses(responsesUrl, headers, systemMsg, Text, delayInt, retryModeInt, cacheFailure);
+// Returns the cue without styling markup and records each run of tags with its byte offset
+// in the returned text, so RestoreCueMarkup() can reinsert it into the translation.
+string StripCueMarkup(const string &in text) {
+    cue_markup_tags.resize(0);
+    cue_markup_positions.resize(0);
+    string plain = "";
+    uint runStart = 0;
+    uint i = 0;
+    while (i < text.length()) {
+        int tagLength = CueMarkupTagLength(text, i);
+        if (tagLength <= 0) {
+            i++;
+            continue;
+        }
+        plain += text.substr(runStart, i - runStart);
+        uint last = cue_markup_tags.length();
+        if (last > 0 && cue_markup_positions[last - 1] == int(plain.length())) {
+            cue_markup_tags[last - 1] += text.substr(i, tagLength);
         } else {
-            cacheFailure = "Unable to resolve responses endpoint from current API URL.";
+            cue_markup_tags.insertLast(text.substr(i, tagLength));
+            cue_markup_positions.insertLast(int(plain.length()));
         }
-        if (translation == "") {
-            if (!context_cache_disabled_for_session) {
-                context_cache_disabled_for_session = true;
-                string fallbackMessage = cacheFailure == "" ? "Context caching failed." : "Context caching failed: " + cacheFailure;
-                HostPrintUTF8(fallbackMessage + "\nUsing chat completions for this session.\n");
-            }
+        i += uint(tagLength);
+        runStart = i;
+    }
+    if (cue_markup_tags.length() == 0) {
+        cue_markup_plain = text;
+        return text;
+    }
+    plain += text.substr(runStart);
+
+    // "{\an8} Hello" -> "Hello": drop the spaces the tags left at either end
+    int lead = 0;
+    while (lead < int(plain.length()) && (plain[lead] == 32 || plain[lead] == 9))
+        lead++;
+    int tail = int(plain.length());
+    while (tail > lead && (plain[tail - 1] == 32 || plain[tail - 1] == 9))
+        tail--;
+    plain = plain.substr(lead, tail - lead);
+    for (uint k = 0; k < cue_markup_positions.length(); k++) {
+        int pos = cue_markup_positions[k] - lead;
+        if (pos < 0)
+            pos = 0;
+        if (pos > int(plain.length()))
+            pos = int(plain.length());
+        cue_markup_positions[k] = pos;
+        if (k > 0 && cue_markup_positions[k - 1] == pos) {
+            cue_markup_tags[k - 1] += cue_markup_tags[k];
+            cue_markup_tags.removeAt(k);
+            cue_markup_positions.removeAt(k);
+            k--;
         }
     }
+    cue_markup_plain = plain;
+    return plain;
+}
 
-    if (translation == "") {
-        string response = ExecuteWithRetry(apiUrl, headers, requestData, delayInt, retryModeInt);
-        if (response == "") {
-            HostPrintUTF8("Translation request failed. Please check network connection or API Key.\n");
-            return "";
+// Maps a byte offset inside the plain cue onto the translation. Tags at the start or end of a
+// line stay there when both texts have the same number of lines; anything else keeps its
+// relative position, moved to a nearby space and never into the middle of a UTF-8 sequence.
+int MapCueMarkupPosition(int pos, const string &in translation, bool closing) {
+    int plainLength = int(cue_markup_plain.length());
+    int srcStart = 0;
+    int srcEnd = plainLength;
+    int srcLine = 0;
+    int srcLines = 1;
+    for (int i = 0; i < plainLength; i++) {
+        if (cue_markup_plain[i] != 10)
+            continue;
+        srcLines++;
+        if (i < pos) {
+            srcLine++;
+            srcStart = i + 1;
+        } else if (srcEnd == plainLength) {
+            srcEnd = i;
         }
+    }
 
-        JsonReader Reader;
-        JsonValue Root;
-        if (!Reader.parse(response, Root)) {
-            HostPrintUTF8("Failed to parse API response.\n");
-            return "";
+    int dstLength = int(translation.length());
+    int dstLines = 1;
+    for (int i = 0; i < dstLength; i++) {
+        if (translation[i] == 10)
+            dstLines++;
+    }
+    int dstStart = 0;
+    int dstEnd = dstLength;
+    if (dstLines == srcLines) {
+        int line = 0;
+        for (int i = 0; i < dstLength; i++) {
+            if (translation[i] != 10)
+                continue;
+            if (line == srcLine) {
+                dstEnd = i;
+                break;
+            }
+            line++;
+            dstStart = i + 1;
         }
+        if (pos == srcStart)
+            return dstStart;
+        if (pos == srcEnd)
+            return dstEnd;
+    } else {
+        srcStart = 0;
+        srcEnd = plainLength;
+    }
 
-        JsonValue choices = Root["choices"];
-        if (choices.isArray() && choices.size() > 0 &&
-            choices[0].isObject() &&
-            choices[0]["message"].isObject() &&
-            choices[0]["message"]["content"].isString()) {
-            translation = choices[0]["message"]["content"].asString();
-        } else if (Root.isObject() &&
-                   Root["error"].isObject() &&
-                   Root["error"]["message"].isString()) {
-            string errorMessage = Root["error"]["message"].asString();
-            HostPrintUTF8("API Error: " + errorMessage + "\n");
-            return "API Error: " + errorMessage;
+    int at = dstStart + (pos - srcStart) * (dstEnd - dstStart) / (srcEnd - srcStart);
+    for (int d = 0; d <= 6; d++) {
+        int right = at + d;
+        int left = at - d;
+        int space = -1;
+        if (right < dstEnd && translation[right] == 32)
+            space = right;
+        else if (left > dstStart && left < dstEnd && translation[left] == 32)
+            space = left;
+        if (space >= 0)
+            return closing ? space : space + 1; // "<i>word" and "word</i>" hug the word, not the space
+    }
+    while (at < dstEnd && (translation[at] & 0xC0) == 0x80)
+        at++;
+    return at;
+}
+
+// Puts the markup removed by StripCueMarkup() back into a translation of the plain cue
+string RestoreCueMarkup(const string &in translation) {
+    if (cue_markup_tags.length() == 0)
+        return translation;
+    int plainLength = int(cue_markup_plain.length());
+    string prefix = "";
+    string suffix = "";
+    string result = "";
+    int copied = 0;
+    for (uint k = 0; k < cue_markup_tags.length(); k++) {
+        int pos = cue_markup_positions[k];
+        string tag = cue_markup_tags[k];
+        if (pos <= 0) {
+            prefix += tag;
+        } else if (pos >= plainLength) {
+            suffix += tag;
         } else {
-            HostPrintUTF8("Translation failed. Please check input parameters or API Key configuration.\n");
-            return "Translation failed. Please check input parameters or API Key configuration.";
+            int at = MapCueMarkupPosition(pos, translation, tag.substr(0, 2) == "</");
+            if (at < copied)
+                at = copied;
+            result += translation.substr(copied, at - copied) + tag;
+            copied = at;
         }
     }
+    return prefix + result + translation.substr(copied) + suffix;
+}
 
-    if (selected_model.find("gemini") != -1) {
-        while (translation.length() > 0 && translation.substr(translation.length() - 1, 1) == "\n") {
-            translation = translation.substr(0, translation.length() - 1);
+// "ja, KO ,,ja" -> "ja,ko"; "off" clears the list
+string NormalizeTargetList(const string &in value) {
+    string trimmed = value.Trim();
+    if (ToLower(trimmed) == "off" || ToLower(trimmed) == "none")
+        return "";
+    array<string> langs;
+    int start = 0;
+    for (int i = 0; i <= int(trimmed.length()); i++) {
+        if (i == int(trimmed.length()) || trimmed.substr(i, 1) == ",") {
+            string lang = trimmed.substr(start, i - start).Trim();
+            start = i + 1;
+            if (lang == "")
+                continue;
+            bool seen = false;
+            for (uint j = 0; j < langs.length(); j++) {
+                if (EqualsIgnoreCase(langs[j], lang))
+                    seen = true;
+            }
+            if (!seen)
+                langs.insertLast(lang);
         }
     }
-    if (targetLangCode == "fa" || targetLangCode == "ar" || targetLangCode == "he") {
-        string UNICODE_RLE = "\u202B";
-        translation = UNICODE_RLE + translation;
+    string result = "";
+    for (uint j = 0; j < langs.length(); j++) {
+        if (j > 0)
+            result += ",";
+        result += langs[j];
     }
-    SrcLang = "UTF8";
-    DstLang = "UTF8";
-    return translation.Trim();
+    return result;
 }
 
-// Plugin Initialization
-void OnInitialize() {
-    HostPrintUTF8("ChatGPT translation plugin loaded.\n");
-    RefreshConfiguration();
-    context_cache_disabled_for_session = false;
-    context_cache_disable_key = "";
-    if (api_key != "") {
-        HostPrintUTF8("Saved API Key, model name, and API URL loaded.\n");
+// Primary target first, then the configured extras; "" when there is nothing to fan out to
+string BuildFanoutTargets(const string &in primary) {
+    if (extra_target_langs == "")
+        return "";
+    string result = primary;
+    int start = 0;
+    for (int i = 0; i <= int(extra_target_langs.length()); i++) {
+        if (i == int(extra_target_langs.length()) || extra_target_langs.substr(i, 1) == ",") {
+            string lang = extra_target_langs.substr(start, i - start);
+            start = i + 1;
+            if (lang != "" && !EqualsIgnoreCase(lang, primary))
+                result += ", " + lang;
+        }
     }
+    return result == primary ? "" : result;
 }
 
-// Plugin Finalization
-void OnFinalize() {
-    HostPrintUTF8("ChatGPT translation plugin unloaded.\n");
+// Returns the primary translation from a fan-out reply and parks the other languages in slots.
+// A reply that is not the expected JSON object is treated as the primary translation.
+string SplitFanoutReply(const string &in reply, const string &in source, const string &in primary, const string &in fanoutTargets) {
+    if (reply == "")
+        return "";
+    string body = reply.Trim();
+    if (body.length() > 3 && body.substr(0, 3) == "```") {
+        int firstBrace = body.find("{");
+        int lastBrace = int(body.length()) - 1;
+        while (lastBrace > firstBrace && body.substr(lastBrace, 1) != "}")
+            lastBrace--;
+        if (firstBrace >= 0 && lastBrace > firstBrace)
+            body = body.substr(firstBrace, lastBrace - firstBrace + 1);
+    }
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(body, root) || !root.isObject() || !root[primary].isString()) {
+        HostPrintUTF8("Fan-out reply was not a language object; using it as the " + primary + " translation.\n");
+        return reply;
+    }
+    int start = 0;
+    for (int i = 0; i <= int(fanoutTargets.length()); i++) {
+        if (i == int(fanoutTargets.length()) || fanoutTargets.substr(i, 1) == ",") {
+            string lang = fanoutTargets.substr(start, i - start).Trim();
+            start = i + 1;
+            if (lang != "" && lang != primary && root[lang].isString())
+                StoreFanoutSlot(source, lang, root[lang].asString());
+        }
+    }
+    return root[primary].asString();
 }
-string ToLower(const string &in s) {
-    return s.MakeLower();
+
+void StoreFanoutSlot(const string &in source, const string &in lang, const string &in translation) {
+    string key = NormalizeCueKey(source) + "|" + lang;
+    int existing = fanout_slot_keys.find(key);
+    if (existing >= 0) {
+        fanout_slot_keys.removeAt(existing);
+        fanout_slot_values.removeAt(existing);
+    }
+    fanout_slot_keys.insertLast(key);
+    fanout_slot_values.insertLast(translation);
+    while (fanout_slot_keys.length() > FANOUT_SLOT_LIMIT) {
+        fanout_slot_keys.removeAt(0);
+        fanout_slot_values.removeAt(0);
+    }
 }
 
-string NormalizeCacheMode(const string &in mode) {
-    string trimmed = mode.Trim();
-    if (trimmed == "")
-        return "auto";
-    string lower = ToLower(trimmed);
-    if (lower == "off" || lower == "disable" || lower == "disabled" || lower == "chat")
-        return "off";
-    return "auto";
+// Slots are consumed on read: each secondary track asks for a cue once
+string TakeFanoutSlot(const string &in source, const string &in lang) {
+    if (fanout_slot_keys.length() == 0)
+        return "";
+    int idx = fanout_slot_keys.find(NormalizeCueKey(source) + "|" + lang);
+    if (idx < 0)
+        return "";
+    string translation = fanout_slot_values[idx];
+    fanout_slot_keys.removeAt(idx);
+    fanout_slot_values.removeAt(idx);
+    return translation;
 }
 
-void EnsureTokenRulesLoaded() {
-    if (token_rules_initialized)
+// Per-cue deadline: the configured limit, shortened for short cues that leave the screen quickly
+void BeginCueDeadline(const string &in text) {
+    cue_start_tick = HostGetTickCount();
+    cue_deadline_missed = false;
+    cue_deadline_ms = config_deadline_ms;
+    if (cue_deadline_ms <= 0) {
+        cue_deadline_ms = 0;
         return;
-    token_rules_initialized = true;
-    default_model_token_limit = 4096;
-    token_rule_types.resize(0);
-    token_rule_values.resize(0);
-    token_rule_limits.resize(0);
+    }
+    int estimatedDisplayMs = EstimateCueDisplayMs(text);
+    if (estimatedDisplayMs < cue_deadline_ms)
+        cue_deadline_ms = estimatedDisplayMs;
+    // Keep PotPlayer from aborting the script before the deadline logic can answer
+    HostIncTimeOut(cue_deadline_ms + 1000);
+}
 
-    JsonReader reader;
-    JsonValue root;
-    if (!reader.parse(pre_model_token_limits_json, root))
+// PotPlayer does not pass cue timings; estimate how long the line stays up from its length
+int EstimateCueDisplayMs(const string &in text) {
+    int displayMs = 1200 + int(text.length()) * 50;
+    return displayMs < 1500 ? 1500 : displayMs;
+}
+
+void ResetAdaptiveBudget() {
+    adaptive_context_budget = -1;
+    adaptive_on_time_count = 0;
+    adaptive_late_count = 0;
+    token_bytes_ratio = 4.0;
+}
+
+// Feedback after each cue in adaptive mode: the reported prompt tokens correct the bytes-per-token
+// estimate, and the context sent with the next cue shrinks when a reply took more than 60% of the
+// time the line is shown and grows again while replies come back in under half of that. Fixed mode
+// keeps the plain 4 bytes-per-token estimate, so its configured budget selects the same context as before.
+void UpdateAdaptiveBudget(int elapsedMs, int displayMs, int promptBytes, int maxBudget) {
+    if (context_budget_mode != "adaptive")
         return;
-    if (!root.isObject())
+    // Stateful chains report server-side history as input, which says nothing about this prompt
+    if (last_prompt_tokens > 0 && promptBytes > 0 && context_cache_mode != "chain") {
+        float observed = float(promptBytes) / float(last_prompt_tokens);
+        if (observed >= 1.0f && observed <= 8.0f)
+            token_bytes_ratio = token_bytes_ratio * 0.8f + observed * 0.2f;
+    }
+    if (adaptive_context_budget < 0)
         return;
 
-    if (root["default"].isInt())
-        default_model_token_limit = root["default"].asInt();
-    else if (root["default"].isString()) {
-        int parsedDefault = ParseInt(root["default"].asString());
-        if (parsedDefault > 0)
-            default_model_token_limit = parsedDefault;
+    int targetMs = displayMs * 6 / 10;
+    int before = adaptive_context_budget;
+    if (elapsedMs > targetMs) {
+        adaptive_late_count++;
+        adaptive_context_budget = adaptive_context_budget * 2 / 3;
+    } else {
+        adaptive_on_time_count++;
+        if (elapsedMs * 2 < targetMs) {
+            int step = adaptive_context_budget / 8;
+            adaptive_context_budget += step < 64 ? 64 : step;
+        }
+    }
+    int floor = ADAPTIVE_MIN_CONTEXT < maxBudget ? ADAPTIVE_MIN_CONTEXT : maxBudget;
+    if (adaptive_context_budget < floor)
+        adaptive_context_budget = floor;
+    if (adaptive_context_budget > maxBudget)
+        adaptive_context_budget = maxBudget;
+    if (adaptive_context_budget < before) {
+        HostPrintUTF8("Adaptive context: " + elapsedMs + " ms for a ~" + displayMs + " ms line; context budget " + before + " -> "
+                      + adaptive_context_budget + " tokens. on time=" + adaptive_on_time_count + " late=" + adaptive_late_count
+                      + ", ~" + int(1000.0f / token_bytes_ratio) + " tokens/KB\n");
     }
+}
 
-    JsonValue rulesNode = root["rules"];
+bool CueDeadlinePassed() {
+    return cue_deadline_ms > 0 && int(HostGetTickCount() - cue_start_tick) >= cue_deadline_ms;
+}
+
+// The late-fill helper (tools/latefill_proxy.py) runs on this PC or the LAN; only such an API URL gets the
+// X-Translate-Deadline-Ms header, so public providers never see it
+bool IsLateFillHelperUrl(const string &in url) {
+    string host = ToLower(url);
+    int scheme = host.find("://");
+    if (scheme != -1)
+        host = host.substr(scheme + 3);
+    int slash = host.find("/");
+    if (slash != -1)
+        host = host.substr(0, slash);
+    if (host.length() > 0 && host.substr(0, 1) == "[")
+        return host.find("[::1]") == 0;
+    int colon = host.find(":");
+    if (colon != -1)
+        host = host.substr(0, colon);
+    if (host == "localhost" || host.find("127.") == 0 || host.find("10.") == 0 || host.find("192.168.") == 0)
+        return true;
+    if (host.find("172.") == 0) {
+        int second = ParseInt(host.substr(4, 2));
+        return second >= 16 && second <= 31 && host.substr(6, 1) == ".";
+    }
+    return false;
+}
+
+// The late-fill helper answers with this error code when it keeps translating in the background
+bool IsDeadlineExceededResponse(JsonValue &in root) {
+    if (root.isObject() && root["error"].isObject() && root["error"]["code"].isString() &&
+        root["error"]["code"].asString() == "deadline_exceeded") {
+        cue_deadline_missed = true;
+        return true;
+    }
+    return false;
+}
+
+// Case, whitespace and punctuation-insensitive key, so a line repeated with other casing or punctuation shares a translation
+string NormalizeCueKey(const string &in text) {
+    string lowered = text.MakeLower();
+    string key = "";
+    for (uint i = 0; i < lowered.length(); i++) {
+        uint8 c = lowered[i];
+        if ((c >= 97 && c <= 122) || (c >= 48 && c <= 57) || c >= 128)
+            key += lowered.substr(i, 1);
+    }
+    return key;
+}
+
+void RememberTranslation(const string &in source, const string &in targetLang, const string &in translation) {
+    if (deadline_ms == "" || deadline_ms == "0")
+        return;
+    string key = NormalizeCueKey(source);
+    if (key == "")
+        return;
+    key += "|" + targetLang;
+    int existing = recent_translation_keys.find(key);
+    if (existing >= 0) {
+        recent_translation_keys.removeAt(existing);
+        recent_translation_values.removeAt(existing);
+    }
+    recent_translation_keys.insertLast(key);
+    recent_translation_values.insertLast(translation);
+    while (recent_translation_keys.length() > RECENT_TRANSLATION_LIMIT) {
+        recent_translation_keys.removeAt(0);
+        recent_translation_values.removeAt(0);
+    }
+}
+
+// Exact lookup on the normalized key; lines that merely look alike are not matched
+string FindRepeatedLineTranslation(const string &in source, const string &in targetLang) {
+    string key = NormalizeCueKey(source);
+    if (key == "")
+        return "";
+    int idx = recent_translation_keys.find(key + "|" + targetLang);
+    return idx >= 0 ? recent_translation_values[idx] : "";
+}
+
+// ========= No-translation pre-filter (mirrors tools/cue_prefilter.py) =========
+
+// Decodes the UTF-8 code point at `at` and moves `at` past it; stray bytes decode as themselves
+uint NextCodePoint(const string &in text, uint &inout at) {
+    uint8 b = text[at];
+    uint cp = b;
+    uint extra = 0;
+    if (b >= 0xF0) {
+        cp = b & 0x07;
+        extra = 3;
+    } else if (b >= 0xE0) {
+        cp = b & 0x0F;
+        extra = 2;
+    } else if (b >= 0xC0) {
+        cp = b & 0x1F;
+        extra = 1;
+    }
+    at++;
+    for (uint k = 0; k < extra && at < text.length(); k++) {
+        uint8 next = text[at];
+        if ((next & 0xC0) != 0x80)
+            break;
+        cp = (cp << 6) | (next & 0x3F);
+        at++;
+    }
+    return cp;
+}
+
+// Script of a letter: 0 Latin, 1 Greek, 2 Cyrillic, 3 Hebrew, 4 Arabic, 5 Devanagari, 6 Thai,
+// 7 Hangul, 8 Kana, 9 Han, 10 any other letter; -1 for digits, punctuation, symbols and marks
+int CueLetterScript(uint cp) {
+    if (cp < 0x80)
+        return ((cp >= 65 && cp <= 90) || (cp >= 97 && cp <= 122)) ? 0 : -1;
+    if (cp < 0xC0 || cp == 0xD7 || cp == 0xF7)
+        return -1;
+    if (cp < 0x250 || (cp >= 0x1E00 && cp < 0x1F00) || (cp >= 0xFF21 && cp <= 0xFF3A) || (cp >= 0xFF41 && cp <= 0xFF5A))
+        return 0;
+    if (cp < 0x370)
+        return -1; // IPA, modifier letters and combining marks
+    if (cp < 0x400)
+        return 1;
+    if (cp < 0x530)
+        return 2;
+    if (cp >= 0x5D0 && cp < 0x5F0)
+        return 3;
+    if ((cp >= 0x620 && cp <= 0x64A) || (cp >= 0x66E && cp <= 0x6D3) || (cp >= 0x6FA && cp < 0x700)
+        || (cp >= 0x750 && cp < 0x780) || (cp >= 0xFB50 && cp < 0xFE00) || (cp >= 0xFE70 && cp < 0xFF00))
+        return 4;
+    if (cp >= 0x900 && cp < 0x964)
+        return 5;
+    if (cp >= 0xE01 && cp < 0xE4F)
+        return 6;
+    if ((cp >= 0x1100 && cp < 0x1200) || (cp >= 0x3130 && cp < 0x3190) || (cp >= 0xAC00 && cp < 0xD7A4))
+        return 7;
+    if ((cp >= 0x3040 && cp < 0x3100 && cp != 0x30FB) || (cp >= 0x31F0 && cp < 0x3200) || (cp >= 0xFF66 && cp < 0xFFA0))
+        return 8;
+    if ((cp >= 0x3400 && cp < 0x4DC0) || (cp >= 0x4E00 && cp < 0xA000) || (cp >= 0xF900 && cp < 0xFB00) || (cp >= 0x20000 && cp < 0x40000))
+        return 9;
+    if ((cp >= 0x2000 && cp < 0x2C00) || (cp >= 0x3000 && cp < 0x3040) || (cp >= 0xE000 && cp < 0xF900) || cp >= 0xFE00)
+        return -1; // punctuation, ♪ and other symbols, CJK punctuation, private use, emoji
+    if ((cp >= 0x591 && cp < 0x5D0) || (cp >= 0x600 && cp < 0x700))
+        return -1;
+    return 10;
+}
+
+bool IsOpeningBracket(uint cp) {
+    return cp == 0x28 || cp == 0x5B || cp == 0x7B || cp == 0xFF08 || cp == 0xFF3B || cp == 0x3010 || cp == 0x3014;
+}
+
+bool IsClosingBracket(uint cp) {
+    return cp == 0x29 || cp == 0x5D || cp == 0x7D || cp == 0xFF09 || cp == 0xFF3D || cp == 0x3011 || cp == 0x3015;
+}
+
+// Why a cue needs no request, or "" to translate it: "symbols" (only digits, punctuation, ♪ and the like),
+// "sound" (every letter sits in [..], (..), 【..】 or *..* effect tags), "speaker" (a lone "NAME:" tag)
+// or, when the source language is auto-detected, "target" (the cue is already in dstLang)
+string ClassifyNoTranslationCue(const string &in text, const string &in srcLang, const string &in dstLang) {
+    array<int> scripts(11, 0);
+    int letters = 0;
+    int outsideLetters = 0;
+    int upperLetters = 0;
+    int lowerLetters = 0;
+    int depth = 0;
+    bool starred = false;
+    uint at = 0;
+    while (at < text.length()) {
+        uint cp = NextCodePoint(text, at);
+        if (IsOpeningBracket(cp))
+            depth++;
+        else if (IsClosingBracket(cp) && depth > 0)
+            depth--;
+        else if (cp == 0x2A)
+            starred = !starred;
+        int script = CueLetterScript(cp);
+        if (script < 0)
+            continue;
+        scripts[script]++;
+        letters++;
+        if (depth == 0 && !starred)
+            outsideLetters++;
+        int letterCase = CueLetterCase(cp);
+        if (letterCase == 1)
+            upperLetters++;
+        else if (letterCase == 2)
+            lowerLetters++;
+    }
+    if (letters == 0)
+        return "symbols";
+    // An unclosed bracket or asterisk is part of a sentence, not an effect tag
+    if (outsideLetters == 0 && depth == 0 && !starred)
+        return "sound";
+    if (IsSpeakerTagCue(text.Trim(), letters, upperLetters, lowerLetters, scripts))
+        return "speaker";
+    if (srcLang == "" && IsTargetLanguageCue(text, dstLang, scripts, letters))
+        return "target";
+    return "";
+}
+
+// Case of a letter: 1 upper, 2 lower, 0 for scripts without case (Han, Kana, Hangul, Arabic, ...)
+int CueLetterCase(uint cp) {
+    if (cp >= 65 && cp <= 90)
+        return 1;
+    if (cp >= 97 && cp <= 122)
+        return 2;
+    if (cp >= 0xC0 && cp <= 0xDE)
+        return 1;
+    if (cp >= 0xDF && cp <= 0xFF)
+        return 2;
+    if ((cp >= 0x100 && cp < 0x250) || (cp >= 0x1E00 && cp < 0x1F00)) {
+        // Upper/lower pairs; these two runs put the capital on the odd code point
+        bool oddUpper = (cp >= 0x139 && cp <= 0x148) || (cp >= 0x179 && cp <= 0x17E);
+        return ((cp % 2 == 1) == oddUpper) ? 1 : 2;
+    }
+    if (cp >= 0x391 && cp <= 0x3AB)
+        return 1;
+    if (cp >= 0x3AC && cp <= 0x3CE)
+        return 2;
+    if (cp >= 0x400 && cp <= 0x42F)
+        return 1;
+    if (cp >= 0x430 && cp <= 0x45F)
+        return 2;
+    if (cp >= 0x460 && cp < 0x530)
+        return cp % 2 == 0 ? 1 : 2;
+    if (cp >= 0xFF21 && cp <= 0xFF3A)
+        return 1;
+    if (cp >= 0xFF41 && cp <= 0xFF5A)
+        return 2;
+    return 0;
+}
+
+// "NARRATOR:" or "MAN #2:" on its own: one line of at most two words ending in a colon, with a capital
+// and no lowercase letter in any script. Han, Kana and Hangul have no case, so a name in those scripts
+// only counts in brackets ("【旁白】："), which ClassifyNoTranslationCue already treats as a tag.
+bool IsSpeakerTagCue(const string &in trimmed, int letters, int upperLetters, int lowerLetters, const array<int> &in scripts) {
+    if (letters > 24 || upperLetters == 0 || lowerLetters > 0 || trimmed.find("\n") >= 0)
+        return false;
+    if (scripts[7] + scripts[8] + scripts[9] > 0)
+        return false;
+    uint n = trimmed.length();
+    bool colon = (n >= 1 && trimmed.substr(n - 1) == ":") || (n >= 3 && trimmed.substr(n - 3) == "：");
+    if (!colon)
+        return false;
+    int words = 1;
+    for (uint i = 0; i < n; i++) {
+        if (trimmed.substr(i, 1) == " ")
+            words++;
+    }
+    return words <= 2;
+}
+
+// Kana, Hangul, Greek, Hebrew and Thai give their language away; Chinese needs a character only its
+// variant writes, and every other target a clear stop-word majority from the installer's table
+bool IsTargetLanguageCue(const string &in text, const string &in dstLang, const array<int> &in scripts, int letters) {
+    string lang = ToLower(dstLang.Trim());
+    string base = lang;
+    int dash = lang.find("-");
+    if (dash > 0)
+        base = lang.substr(0, dash);
+    if (base == "ja")
+        return scripts[8] > 0 && (scripts[8] + scripts[9]) * 10 >= letters * 9;
+    if (base == "ko")
+        return scripts[7] * 10 >= letters * 9;
+    if (base == "el")
+        return scripts[1] * 10 >= letters * 9;
+    if (base == "he")
+        return scripts[3] * 10 >= letters * 9;
+    if (base == "th")
+        return scripts[6] * 10 >= letters * 9;
+    if (base == "zh")
+        return scripts[9] * 10 >= letters * 9 && scripts[7] == 0 && scripts[8] == 0 && MatchesHanVariant(text, lang);
+    if (scripts[7] + scripts[8] + scripts[9] > 0)
+        return false;
+    return GuessLanguageByStopWords(text) == base;
+}
+
+void EnsureLanguageIdLoaded() {
+    if (langid_initialized)
+        return;
+    langid_initialized = true;
+    langid_codes.resize(0);
+    langid_words.resize(0);
+    langid_han_codes.resize(0);
+    langid_han_markers.resize(0);
+
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(pre_langid_json, root) || !root.isObject())
+        return;
+    if (root["min_words"].isInt())
+        langid_min_words = root["min_words"].asInt();
+    if (root["min_share"].isInt())
+        langid_min_share = root["min_share"].asInt();
+    JsonValue stopWords = root["stop_words"];
+    if (stopWords.isArray()) {
+        int count = stopWords.size();
+        for (int i = 0; i < count; i++) {
+            JsonValue entry = stopWords[i];
+            if (entry.isObject() && entry["lang"].isString() && entry["words"].isString() && entry["words"].asString() != "") {
+                langid_codes.insertLast(ToLower(entry["lang"].asString()));
+                langid_words.insertLast(" " + entry["words"].asString() + " ");
+            }
+        }
+    }
+    JsonValue variants = root["han_variants"];
+    if (variants.isArray()) {
+        int count = variants.size();
+        for (int i = 0; i < count; i++) {
+            JsonValue entry = variants[i];
+            if (entry.isObject() && entry["lang"].isString() && entry["chars"].isString() && entry["chars"].asString() != "") {
+                langid_han_codes.insertLast(ToLower(entry["lang"].asString()));
+                langid_han_markers.insertLast(entry["chars"].asString());
+            }
+        }
+    }
+}
+
+// Language whose stop words make up most of the cue, or "" when the cue is short or the call is close
+string GuessLanguageByStopWords(const string &in text) {
+    EnsureLanguageIdLoaded();
+    if (langid_codes.length() == 0)
+        return "";
+    array<int> hits(langid_codes.length(), 0);
+    int words = 0;
+    uint at = 0;
+    uint wordStart = 0;
+    bool inWord = false;
+    while (at <= text.length()) {
+        uint start = at;
+        int script = -1;
+        uint cp = 0;
+        if (at < text.length()) {
+            cp = NextCodePoint(text, at);
+            script = CueLetterScript(cp);
+        } else {
+            at++;
+        }
+        // Apostrophes stay inside a word ("don't", "c'est")
+        bool wordChar = (script >= 0 && script <= 5) || script == 10 || (inWord && (cp == 0x27 || cp == 0x2019));
+        if (wordChar) {
+            if (!inWord)
+                wordStart = start;
+            inWord = true;
+            continue;
+        }
+        if (!inWord)
+            continue;
+        inWord = false;
+        words++;
+        string word = " " + text.substr(wordStart, start - wordStart).MakeLower() + " ";
+        for (uint i = 0; i < langid_codes.length(); i++) {
+            if (langid_words[i].find(word) >= 0)
+                hits[i]++;
+        }
+    }
+    if (words < langid_min_words)
+        return "";
+    int best = -1;
+    int second = 0;
+    for (uint i = 0; i < hits.length(); i++) {
+        if (best < 0 || hits[i] > hits[best]) {
+            if (best >= 0)
+                second = hits[best];
+            best = int(i);
+        } else if (hits[i] > second) {
+            second = hits[i];
+        }
+    }
+    if (hits[best] < 2 || hits[best] * 100 < words * langid_min_share || hits[best] <= second * 2)
+        return "";
+    return langid_codes[best];
+}
+
+// Han text counts as the target variant only with a character that variant alone writes and none of the others'
+bool MatchesHanVariant(const string &in text, const string &in lang) {
+    EnsureLanguageIdLoaded();
+    int own = langid_han_codes.find(lang);
+    if (own < 0)
+        return false;
+    bool ownSeen = false;
+    uint at = 0;
+    while (at < text.length()) {
+        uint start = at;
+        if (CueLetterScript(NextCodePoint(text, at)) != 9)
+            continue;
+        string ch = text.substr(start, at - start);
+        for (uint i = 0; i < langid_han_codes.length(); i++) {
+            if (langid_han_markers[i].find(ch) < 0)
+                continue;
+            if (int(i) != own)
+                return false;
+            ownSeen = true;
+        }
+    }
+    return ownSeen;
+}
+
+// ========= Translation memory (index written by tools/translation_memory.py) =========
+
+uint FnvByte(uint h, uint8 b) {
+    h ^= b;
+    return h * 16777619;
+}
+
+uint Mix32(uint x) {
+    x ^= x >> 16;
+    x *= 0x85EBCA6B;
+    x ^= x >> 13;
+    x *= 0xC2B2AE35;
+    x ^= x >> 16;
+    return x;
+}
+
+// Sorted, de-duplicated FNV-1a hashes of the byte trigrams of a NormalizeCueKey() key
+array<uint> CueTrigrams(const string &in key) {
+    array<uint> grams;
+    for (uint i = 0; i + 2 < key.length(); i++) {
+        uint h = 2166136261;
+        for (uint j = i; j < i + 3; j++) {
+            uint8 b = key[j];
+            h = FnvByte(h, b);
+        }
+        grams.insertLast(h);
+    }
+    grams.sortAsc();
+    array<uint> unique;
+    for (uint i = 0; i < grams.length(); i++) {
+        if (i == 0 || grams[i] != grams[i - 1])
+            unique.insertLast(grams[i]);
+    }
+    return unique;
+}
+
+// MinHash over TM_PERMS seeded mixes, folded into TM_BANDS band hashes of two rows each
+array<uint> TranslationMemoryBands(const array<uint> &in grams) {
+    array<uint> bands;
+    uint rows = TM_PERMS / TM_BANDS;
+    uint h = 2166136261;
+    for (uint p = 0; p < TM_PERMS; p++) {
+        uint seed = Mix32((p + 1) * 0x9E3779B9);
+        uint lowest = 0xFFFFFFFF;
+        for (uint i = 0; i < grams.length(); i++) {
+            uint v = Mix32(grams[i] ^ seed);
+            if (v < lowest)
+                lowest = v;
+        }
+        if (p % rows == 0)
+            h = FnvByte(2166136261, uint8(p / rows));
+        for (uint k = 0; k < 4; k++)
+            h = FnvByte(h, uint8((lowest >> (8 * k)) & 0xFF));
+        if (p % rows == rows - 1)
+            bands.insertLast(h);
+    }
+    return bands;
+}
+
+int TrigramSimilarityPercent(const array<uint> &in a, const array<uint> &in b) {
+    if (a.length() == 0 || b.length() == 0)
+        return 0;
+    uint i = 0;
+    uint j = 0;
+    uint shared = 0;
+    while (i < a.length() && j < b.length()) {
+        if (a[i] == b[j]) {
+            shared++;
+            i++;
+            j++;
+        } else if (a[i] < b[j]) {
+            i++;
+        } else {
+            j++;
+        }
+    }
+    return int(shared * 100 / (a.length() + b.length() - shared));
+}
+
+uint ParseHex32(const string &in text) {
+    uint value = 0;
+    for (uint i = 0; i < text.length(); i++) {
+        uint8 c = text[i];
+        uint digit = 0;
+        if (c >= 48 && c <= 57)
+            digit = c - 48;
+        else if (c >= 97 && c <= 102)
+            digit = c - 87;
+        else if (c >= 65 && c <= 70)
+            digit = c - 55;
+        else
+            return 0;
+        value = (value << 4) | digit;
+    }
+    return value;
+}
+
+string UnescapeMemoryField(const string &in text) {
+    if (text.find("\\") == -1)
+        return text;
+    string result = "";
+    for (uint i = 0; i < text.length(); i++) {
+        uint8 c = text[i];
+        if (c == 92 && i + 1 < text.length()) {
+            uint8 n = text[i + 1];
+            result += n == 116 ? "\t" : (n == 110 ? "\n" : text.substr(i + 1, 1));
+            i++;
+        } else {
+            result += text.substr(i, 1);
+        }
+    }
+    return result;
+}
+
+void LoadTranslationMemory() {
+    tm_langs.resize(0);
+    tm_sources.resize(0);
+    tm_translations.resize(0);
+    tm_bands.resize(0);
+    tm_loaded_path = tm_path;
+    tm_loaded_length = -1;
+    tm_checked_tick = HostGetTickCount();
+    uintptr fp = HostFileOpen(tm_path);
+    if (fp == 0) {
+        HostPrintUTF8("Translation memory: cannot open " + tm_path + "\n");
+        return;
+    }
+    tm_loaded_length = HostFileLength(fp);
+    string data = tm_loaded_length > 0 ? HostFileRead(fp, uint(tm_loaded_length)) : "";
+    HostFileClose(fp);
+    if (data.length() < 5 || data.substr(0, 5) != "#PTM1") {
+        HostPrintUTF8("Translation memory: " + tm_path + " is not a translation memory index.\n");
+        return;
+    }
+
+    uint start = 0;
+    for (uint i = 0; i <= data.length(); i++) {
+        uint8 c = i < data.length() ? data[i] : 10;
+        if (c != 10)
+            continue;
+        string line = data.substr(start, i - start);
+        start = i + 1;
+        if (line.length() < 3 || line.substr(1, 1) != "\t")
+            continue;
+        array<string> fields;
+        uint fieldStart = 2;
+        for (uint k = 2; k <= line.length(); k++) {
+            if (k == line.length() || line.substr(k, 1) == "\t") {
+                fields.insertLast(line.substr(fieldStart, k - fieldStart));
+                fieldStart = k + 1;
+            }
+        }
+        if (line.substr(0, 1) == "E" && fields.length() == 3) {
+            tm_langs.insertLast(fields[0]);
+            tm_sources.insertLast(UnescapeMemoryField(fields[1]));
+            tm_translations.insertLast(UnescapeMemoryField(fields[2]));
+        } else if (line.substr(0, 1) == "B" && fields.length() == 2) {
+            tm_bands.insertLast((uint64(ParseHex32(fields[0])) << 32) | uint64(ParseInt(fields[1])));
+        }
+    }
+    HostPrintUTF8("Translation memory: loaded " + tm_sources.length() + " entries from " + tm_path + "\n");
+}
+
+// A rebuilt index is picked up within TM_RECHECK_MS without logging in again
+void RefreshTranslationMemory() {
+    if (tm_path != tm_loaded_path) {
+        LoadTranslationMemory();
+        return;
+    }
+    if (HostGetTickCount() - tm_checked_tick < TM_RECHECK_MS)
+        return;
+    tm_checked_tick = HostGetTickCount();
+    uintptr fp = HostFileOpen(tm_path);
+    if (fp == 0)
+        return;
+    int64 length = HostFileLength(fp);
+    HostFileClose(fp);
+    if (length != tm_loaded_length)
+        LoadTranslationMemory();
+}
+
+// Best remembered translation of a line like source into targetLang; similarity is 0-100 (0 = none)
+string LookupTranslationMemory(const string &in source, const string &in targetLang, string &out matchedSource, int &out similarity) {
+    matchedSource = "";
+    similarity = 0;
+    if (tm_path == "")
+        return "";
+    RefreshTranslationMemory();
+    if (tm_bands.length() == 0)
+        return "";
+    string key = NormalizeCueKey(source);
+    if (key.length() < 3)
+        return "";
+    array<uint> grams = CueTrigrams(key);
+    array<uint> bands = TranslationMemoryBands(grams);
+    array<int> checked;
+    int best = -1;
+    for (uint b = 0; b < bands.length(); b++) {
+        // Lower bound of the band hash in the sorted table
+        uint64 wanted = uint64(bands[b]) << 32;
+        uint lo = 0;
+        uint hi = tm_bands.length();
+        while (lo < hi) {
+            uint mid = (lo + hi) / 2;
+            if (tm_bands[mid] < wanted)
+                lo = mid + 1;
+            else
+                hi = mid;
+        }
+        for (uint i = lo; i < tm_bands.length() && (tm_bands[i] >> 32) == uint64(bands[b]); i++) {
+            int entry = int(tm_bands[i] & 0xFFFFFFFF);
+            if (entry >= int(tm_sources.length()) || checked.find(entry) >= 0 || tm_langs[entry] != targetLang)
+                continue;
+            checked.insertLast(entry);
+            string entryKey = NormalizeCueKey(tm_sources[entry]);
+            int score = entryKey == key ? 100 : TrigramSimilarityPercent(grams, CueTrigrams(entryKey));
+            if (score > similarity) {
+                similarity = score;
+                best = entry;
+            }
+        }
+    }
+    if (best < 0)
+        return "";
+    matchedSource = tm_sources[best];
+    return tm_translations[best];
+}
+
+// Sends one cue with the given model (Responses first when caching is enabled, then chat).
+// On failure returns "" and sets failureText to what Translate() should return.
+string RequestTranslation(const string &in model, const string &in escapedSystemMsg, const string &in escapedText, const string &in headers, int delayInt, int retryModeInt, string &out failureText) {
+    string cacheSessionKey = context_cache_mode + "|" + apiUrl + "|" + selected_model;
+    if (cacheSessionKey != context_cache_disable_key)
+        context_cache_disabled_for_session = false;
+    context_cache_disable_key = cacheSessionKey;
+
+    failureText = "";
+    cue_deadline_missed = false;
+    string translation = "";
+    if (context_cache_mode != "off" && !context_cache_disabled_for_session) {
+        string responsesUrl = DeriveResponsesUrl(apiUrl);
+        string cacheFailure = "";
+        if (responsesUrl != "") {
+            // Cues for a model other than the anchored one (routing escalations) go stateless
+            bool anchorAttempted = false;
+            if (context_cache_mode == "chain" && !response_chain_disabled_for_session &&
+                (response_chain_id == "" || model == response_chain_model)) {
+                anchorAttempted = (response_chain_id == "");
+                translation = TranslateWithResponseChain(responsesUrl, model, headers, escapedSystemMsg, escapedText, delayInt, retryModeInt, cacheFailure);
+            }
+            // A failed anchor already was the stateless request; a rejected follow-up is retried with full context
+            if (translation == "" && !cue_deadline_missed && !anchorAttempted)
+                translation = TranslateWithResponses(responsesUrl, model, headers, escapedSystemMsg, escapedText, delayInt, retryModeInt, cacheFailure);
+        } else {
+            cacheFailure = "Unable to resolve responses endpoint from current API URL.";
+        }
+        if (translation == "" && cue_deadline_missed)
+            return "";
+        if (translation == "") {
+            if (!context_cache_disabled_for_session) {
+                context_cache_disabled_for_session = true;
+                string fallbackMessage = cacheFailure == "" ? "Context caching failed." : "Context caching failed: " + cacheFailure;
+                HostPrintUTF8(fallbackMessage + "\nUsing chat completions for this session.\n");
+            }
+        }
+    }
+
+    if (translation == "") {
+        string profileFields = RequestProfileFields(model, apiUrl, false);
+        string requestData = BuildChatPayload(model, escapedSystemMsg, escapedText, profileFields);
+        string response = ExecuteProfiledRequest(apiUrl, headers, requestData, model, profileFields, false, delayInt, retryModeInt);
+        if (response == "" && cue_deadline_ms > 0 && CueDeadlinePassed())
+            return "";
+        if (response == "") {
+            HostPrintUTF8("Translation request failed. Please check network connection or API Key.\n");
+            return "";
+        }
+
+        JsonReader Reader;
+        JsonValue Root;
+        if (!Reader.parse(response, Root)) {
+            HostPrintUTF8("Failed to parse API response.\n");
+            return "";
+        }
+
+        JsonValue choices = Root["choices"];
+        if (choices.isArray() && choices.size() > 0 &&
+            choices[0].isObject() &&
+            choices[0]["message"].isObject() &&
+            choices[0]["message"]["content"].isString()) {
+            translation = choices[0]["message"]["content"].asString();
+            if (Root["usage"].isObject() && Root["usage"]["prompt_tokens"].isInt())
+                last_prompt_tokens = Root["usage"]["prompt_tokens"].asInt();
+        } else if (IsDeadlineExceededResponse(Root)) {
+            return "";
+        } else if (Root.isObject() &&
+                   Root["error"].isObject() &&
+                   Root["error"]["message"].isString()) {
+            string errorMessage = Root["error"]["message"].asString();
+            HostPrintUTF8("API Error: " + errorMessage + "\n");
+            failureText = "API Error: " + errorMessage;
+            return "";
+        } else {
+            HostPrintUTF8("Translation failed. Please check input parameters or API Key configuration.\n");
+            failureText = "Translation failed. Please check input parameters or API Key configuration.";
+            return "";
+        }
+    }
+    return translation;
+}
+
+// "http://host:8080/v1" or a full URL -> chat completions endpoint of the LAN server; "off" clears it
+string NormalizeLocalApiUrl(const string &in value) {
+    string url = value.Trim();
+    if (ToLower(url) == "off" || ToLower(url) == "none")
+        return "";
+    while (url != "" && url.substr(url.length() - 1, 1) == "/")
+        url = url.substr(0, url.length() - 1);
+    if (url != "" && url.find("/chat/completions") == -1)
+        url += "/chat/completions";
+    return url;
+}
+
+void ResetLocalProvider() {
+    local_spilled = false;
+    local_latency_ewma = -1;
+    local_roundtrip_ewma = -1;
+    local_probe_after_ms = 0;
+}
+
+string LocalProviderCounters() {
+    int total = local_cue_count + spilled_cue_count;
+    int share = total > 0 ? local_cue_count * 100 / total : 0;
+    return "local=" + local_cue_count + " cloud=" + spilled_cue_count + " errors=" + local_error_count
+         + " spills=" + local_spill_events + " (" + share + "% local)";
+}
+
+// Local-first policy: the LAN server gets every cue until it spills. While spilled, one cue per
+// back-off period is tried there again, and only a clearly fast answer brings traffic back.
+// The local request blocks until the server answers, so under a cue deadline a usual round trip
+// longer than half of the time left spills as well: the cloud keeps the rest of the deadline, and
+// the back-off probe measures the server again later.
+bool LocalProviderSelected() {
+    if (local_api_url == "" || local_model == "")
+        return false;
+    if (local_spilled) {
+        if (HostGetTickCount() - local_spill_tick >= local_probe_after_ms)
+            return true;
+        spilled_cue_count++;
+        return false;
+    }
+    if (cue_deadline_ms > 0 && local_roundtrip_ewma > 0) {
+        int remainingMs = cue_deadline_ms - int(HostGetTickCount() - cue_start_tick);
+        if (local_roundtrip_ewma * 2 > remainingMs) {
+            spilled_cue_count++;
+            SpillToCloud("round trip of " + local_roundtrip_ewma + " ms does not fit the " + cue_deadline_ms + " ms cue deadline");
+            return false;
+        }
+    }
+    return true;
+}
+
+void SpillToCloud(const string &in reason) {
+    if (!local_spilled) {
+        local_spilled = true;
+        local_spill_events++;
+        local_probe_after_ms = LOCAL_PROBE_MIN_MS;
+    } else {
+        local_probe_after_ms *= 2;
+        if (local_probe_after_ms > LOCAL_PROBE_MAX_MS)
+            local_probe_after_ms = LOCAL_PROBE_MAX_MS;
+    }
+    local_spill_tick = HostGetTickCount();
+    HostPrintUTF8("Local server " + reason + "; spilling over to " + selected_model + ", next local try in "
+                  + (local_probe_after_ms / 1000) + " s. " + LocalProviderCounters() + "\n");
+}
+
+int JsonMilliseconds(JsonValue value) {
+    if (value.isInt())
+        return value.asInt();
+    if (value.isFloat())
+        return int(value.asFloat());
+    return 0;
+}
+
+// One chat request to the LAN server without retries; any failure sends the cue to the cloud.
+// HostUrlGetString has no timeout, so a stalled server holds the cue for the whole round trip (the
+// host's own connection timeout when it never answers) before the cloud is asked; the measured round
+// trip, failures included, is what LocalProviderSelected checks against the next cue's deadline.
+// Queue latency is the round trip minus the compute time the server reports ("timings" from
+// llama.cpp-style servers), or the whole round trip when it reports none.
+string RequestLocalTranslation(const string &in escapedSystemMsg, const string &in escapedText) {
+    bool probing = local_spilled;
+    string requestData = BuildChatPayload(local_model, escapedSystemMsg, escapedText);
+    uint started = HostGetTickCount();
+    string response = HostUrlGetString(local_api_url, UserAgent, "Content-Type: application/json", requestData);
+    int elapsed = int(HostGetTickCount() - started);
+    local_roundtrip_ewma = local_roundtrip_ewma < 0 ? elapsed : (local_roundtrip_ewma * 3 + elapsed) / 4;
+
+    string translation = "";
+    JsonReader Reader;
+    JsonValue Root;
+    if (response != "" && Reader.parse(response, Root)) {
+        JsonValue choices = Root["choices"];
+        if (choices.isArray() && choices.size() > 0 &&
+            choices[0].isObject() &&
+            choices[0]["message"].isObject() &&
+            choices[0]["message"]["content"].isString())
+            translation = choices[0]["message"]["content"].asString();
+    }
+    if (translation == "") {
+        local_error_count++;
+        spilled_cue_count++;
+        SpillToCloud(response == "" ? "did not answer" : "returned an error");
+        return "";
+    }
+
+    int queueMs = elapsed;
+    if (Root["timings"].isObject()) {
+        int computeMs = JsonMilliseconds(Root["timings"]["prompt_ms"]) + JsonMilliseconds(Root["timings"]["predicted_ms"]);
+        if (computeMs > 0 && computeMs < elapsed)
+            queueMs = elapsed - computeMs;
+    }
+    local_cue_count++;
+    int threshold = ParseInt(spill_threshold_ms);
+    if (threshold <= 0)
+        threshold = 2000;
+    if (probing) {
+        // Hysteresis: come back only well under the threshold, otherwise back off further
+        if (queueMs * 2 <= threshold) {
+            local_spilled = false;
+            local_latency_ewma = queueMs;
+            HostPrintUTF8("Local server recovered (queue " + queueMs + " ms); cues stay local again. " + LocalProviderCounters() + "\n");
+        } else {
+            SpillToCloud("is still slow (queue " + queueMs + " ms)");
+        }
+        return translation;
+    }
+    local_latency_ewma = local_latency_ewma < 0 ? queueMs : (local_latency_ewma * 3 + queueMs) / 4;
+    if (local_latency_ewma > threshold)
+        SpillToCloud("queue latency " + local_latency_ewma + " ms is over " + threshold + " ms");
+    return translation;
+}
+
+// Load and login only arm the warm-up; no request is made there, so an offline machine or an unreachable
+// endpoint never holds up plugin load or login. The first cue that is answered without a request
+// (pre-filtered, a fan-out slot, translation memory) sends it instead, so the connection is open for the
+// next cue; when the first cue needs the API anyway, its own request opens the connection and the warm-up
+// is dropped. HostOpenHTTP returns once the reply headers are in, so that cue is shown one round trip
+// later (a connection timeout when offline). The default is a /models GET, which costs no tokens.
+// warmup=probe sends a Responses request capped at 16 output tokens instead, to learn whether the
+// endpoint supports it. The instruction prefix is far below the 1024 tokens prompt caching needs, so no
+// mode primes the cache.
+void ArmWarmup(const string &in reason) {
+    first_cue_pending = true;
+    first_cue_warmed = false;
+    warmup_pending = (warmup_mode != "off" && api_key != "" && apiUrl != "");
+    warmup_reason = reason;
+}
+
+void RunPendingWarmup() {
+    if (!warmup_pending)
+        return;
+    warmup_pending = false;
+    string headers = "Authorization: Bearer " + api_key + "\nContent-Type: application/json";
+    bool probesResponses = (warmup_mode == "probe" && context_cache_mode != "off");
+    string url = apiUrl;
+    string payload = "";
+    if (probesResponses) {
+        url = DeriveResponsesUrl(apiUrl);
+        string effort = JsonEscape(RequestProfileEffort(selected_model));
+        string fields = ",\"max_output_tokens\":16" + (effort != "" ? ",\"reasoning\":{\"effort\":\"" + effort + "\"}" : "");
+        payload = BuildResponsesPayload(selected_model, JsonEscape("Reply with OK."), "OK", fields);
+    } else {
+        int chatPos = apiUrl.find("/chat/completions");
+        url = (chatPos != -1 ? apiUrl.substr(0, chatPos) : apiUrl) + "/models";
+        headers = "Authorization: Bearer " + api_key;
+    }
+    uintptr http = HostOpenHTTP(url, UserAgent, headers, payload);
+    if (http == 0)
+        return;
+    int status = HostGetStatusHTTP(http);
+    HostCloseHTTP(http);
+    first_cue_warmed = (status > 0);
+    if (probesResponses && (status == 404 || status == 405 || status == 501)) {
+        // Same decision RequestTranslation would reach after a failed cue, without paying for it
+        context_cache_disabled_for_session = true;
+        context_cache_disable_key = context_cache_mode + "|" + apiUrl + "|" + selected_model;
+        HostPrintUTF8("Warm-up: Responses endpoint unavailable (HTTP " + status + "); using chat completions for this session.\n");
+    } else {
+        HostPrintUTF8("Warm-up after " + warmup_reason + " finished (HTTP " + status + ").\n");
+    }
+}
+
+void ReportFirstCueLatency(uint startTick) {
+    if (!first_cue_pending)
+        return;
+    first_cue_pending = false;
+    HostPrintUTF8("First cue translated in " + (HostGetTickCount() - startTick) + " ms (" + (first_cue_warmed ? "warmed" : "cold") + ").\n");
+}
+
+// Plugin Initialization
+void OnInitialize() {
+    HostPrintUTF8("ChatGPT translation plugin loaded.\n");
+    RefreshConfiguration();
+    context_cache_disabled_for_session = false;
+    context_cache_disable_key = "";
+    if (api_key != "") {
+        HostPrintUTF8("Saved API Key, model name, and API URL loaded.\n");
+        ArmWarmup("load");
+    }
+}
+
+// Plugin Finalization
+void OnFinalize() {
+    HostPrintUTF8("ChatGPT translation plugin unloaded.\n");
+}
+string ToLower(const string &in s) {
+    return s.MakeLower();
+}
+
+string NormalizeCacheMode(const string &in mode) {
+    string trimmed = mode.Trim();
+    if (trimmed == "")
+        return "auto";
+    string lower = ToLower(trimmed);
+    if (lower == "off" || lower == "disable" || lower == "disabled" || lower == "chat")
+        return "off";
+    if (lower == "chain" || lower == "stateful")
+        return "chain";
+    return "auto";
+}
+
+string NormalizeWarmupMode(const string &in mode) {
+    string lower = ToLower(mode.Trim());
+    if (lower == "off" || lower == "probe")
+        return lower;
+    return "on";
+}
+
+string NormalizeRouteMode(const string &in mode) {
+    string lower = ToLower(mode.Trim());
+    if (lower == "auto" || lower == "on" || lower == "route")
+        return "auto";
+    return "off";
+}
+
+// Rough difficulty score: longer cues, more clauses and more mid-sentence capitalised words
+// (names, places) push a cue towards the strong model.
+int ScoreCueDifficulty(const string &in text) {
+    int clauses = 0;
+    int entities = 0;
+    bool atSentenceStart = true;
+    bool inWord = false;
+    for (uint i = 0; i < text.length(); i++) {
+        uint8 c = text[i];
+        bool isUpper = (c >= 65 && c <= 90);
+        bool isLetter = isUpper || (c >= 97 && c <= 122) || c >= 128;
+        if (isLetter) {
+            if (!inWord && isUpper && !atSentenceStart)
+                entities++;
+            if (!inWord)
+                atSentenceStart = false;
+            inWord = true;
+            continue;
+        }
+        inWord = false;
+        if (c == 46 || c == 33 || c == 63) { // . ! ?
+            clauses++;
+            atSentenceStart = true;
+        } else if (c == 44 || c == 59 || c == 58) { // , ; :
+            clauses++;
+        } else if (c == 10 || c == 45) { // new line or dialogue dash
+            atSentenceStart = true;
+        }
+    }
+    // Fixed ratio so the routing threshold does not drift with the usage correction
+    return int(text.length()) / 4 + clauses * 2 + entities * 3;
+}
+
+string SelectModelForCue(const string &in text) {
+    if (route_mode != "auto" || route_fast_model == "" || route_strong_model == "")
+        return selected_model;
+    int threshold = ParseInt(route_threshold);
+    if (threshold <= 0)
+        threshold = 12;
+    return ScoreCueDifficulty(text) <= threshold ? route_fast_model : route_strong_model;
+}
+
+// Signals that the fast model likely failed: echoed source, leaked context or a runaway reply
+bool IsLowConfidenceTranslation(const string &in source, const string &in translation) {
+    string trimmed = translation.Trim();
+    if (trimmed == "")
+        return true;
+    if (source.length() > 3 && EqualsIgnoreCase(trimmed, source.Trim()))
+        return true;
+    if (trimmed.find("Subtitle context") != -1)
+        return true;
+    return trimmed.length() > source.length() * 4 + 40;
+}
+
+void EnsureTokenRulesLoaded() {
+    if (token_rules_initialized)
+        return;
+    token_rules_initialized = true;
+    default_model_token_limit = 4096;
+    token_rule_types.resize(0);
+    token_rule_values.resize(0);
+    token_rule_limits.resize(0);
+
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(pre_model_token_limits_json, root))
+        return;
+    if (!root.isObject())
+        return;
+
+    if (root["default"].isInt())
+        default_model_token_limit = root["default"].asInt();
+    else if (root["default"].isString()) {
+        int parsedDefault = ParseInt(root["default"].asString());
+        if (parsedDefault > 0)
+            default_model_token_limit = parsedDefault;
+    }
+
+    JsonValue rulesNode = root["rules"];
     if (!rulesNode.isArray())
         return;
 
@@ -829,6 +2767,155 @@ void EnsureTokenRulesLoaded() {
     }
 }
 
+void EnsureRequestProfilesLoaded() {
+    if (request_profiles_initialized)
+        return;
+    request_profiles_initialized = true;
+    profile_rule_types.resize(0);
+    profile_rule_values.resize(0);
+    profile_rule_efforts.resize(0);
+    profile_rule_verbosities.resize(0);
+    profile_rule_temperatures.resize(0);
+    profile_rule_output_fields.resize(0);
+    profile_rule_output_bases.resize(0);
+    profile_rule_output_per_tokens.resize(0);
+    profile_rule_output_caps.resize(0);
+
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(pre_request_profiles_json, root))
+        return;
+    if (!root.isObject())
+        return;
+
+    JsonValue rulesNode = root["rules"];
+    if (rulesNode.isArray()) {
+        int count = rulesNode.size();
+        for (int i = 0; i < count; i++) {
+            JsonValue entry = rulesNode[i];
+            if (!entry.isObject() || !entry["type"].isString() || !entry["value"].isString())
+                continue;
+            if (entry["type"].asString() != "" && entry["value"].asString() != "")
+                AddRequestProfile(entry["type"].asString(), entry["value"].asString(), entry);
+        }
+    }
+    // The default profile goes last and applies to every model no rule matched
+    if (root["default"].isObject())
+        AddRequestProfile("default", "", root["default"]);
+}
+
+void AddRequestProfile(const string &in matchType, const string &in matchValue, JsonValue &in entry) {
+    profile_rule_types.insertLast(matchType);
+    profile_rule_values.insertLast(matchValue);
+    profile_rule_efforts.insertLast(entry["reasoning_effort"].isString() ? entry["reasoning_effort"].asString() : "");
+    profile_rule_verbosities.insertLast(entry["verbosity"].isString() ? entry["verbosity"].asString() : "");
+    int temperature = -1;
+    if (entry["temperature"].isInt())
+        temperature = entry["temperature"].asInt() * 100;
+    else if (entry["temperature"].isFloat())
+        temperature = int(entry["temperature"].asFloat() * 100.0f + 0.5f);
+    profile_rule_temperatures.insertLast(temperature);
+    profile_rule_output_fields.insertLast(entry["output_field"].isString() ? entry["output_field"].asString() : "");
+    profile_rule_output_bases.insertLast(entry["output_base"].isInt() ? entry["output_base"].asInt() : 0);
+    profile_rule_output_per_tokens.insertLast(entry["output_per_token"].isInt() ? entry["output_per_token"].asInt() : 0);
+    profile_rule_output_caps.insertLast(entry["output_cap"].isInt() ? entry["output_cap"].asInt() : 0);
+}
+
+// Extra body fields for the model's request profile, as ",\"field\":value" text that goes right after
+// the model field. The output cap is base + per_token x the cue's expected reply, up to output_cap,
+// so a runaway reply stops early while a long line still has room.
+string RequestProfileFields(const string &in model, const string &in url, bool responses) {
+    string trimmedModel = model.Trim();
+    if (trimmedModel == "" || request_profile_rejected_key == trimmedModel + "|" + url)
+        return "";
+    EnsureRequestProfilesLoaded();
+    for (uint i = 0; i < profile_rule_types.length(); i++) {
+        if (profile_rule_types[i] != "default" && !ModelRuleMatches(profile_rule_types[i], profile_rule_values[i], trimmedModel))
+            continue;
+        string fields = "";
+        string effort = JsonEscape(profile_rule_efforts[i]);
+        string verbosity = JsonEscape(profile_rule_verbosities[i]);
+        if (effort != "")
+            fields += responses ? ",\"reasoning\":{\"effort\":\"" + effort + "\"}" : ",\"reasoning_effort\":\"" + effort + "\"";
+        if (verbosity != "")
+            fields += responses ? ",\"text\":{\"verbosity\":\"" + verbosity + "\"}" : ",\"verbosity\":\"" + verbosity + "\"";
+        int temperature = profile_rule_temperatures[i];
+        if (temperature >= 0)
+            fields += ",\"temperature\":" + (temperature / 100) + "." + (temperature % 100 < 10 ? "0" : "") + (temperature % 100);
+        string outputField = responses ? "max_output_tokens" : profile_rule_output_fields[i];
+        int cap = profile_rule_output_caps[i];
+        if (outputField != "" && cap > 0) {
+            int scaled = profile_rule_output_bases[i] + profile_rule_output_per_tokens[i] * request_profile_cue_tokens;
+            fields += ",\"" + outputField + "\":" + (scaled < cap ? scaled : cap);
+        }
+        return fields;
+    }
+    return "";
+}
+
+// Reasoning effort of the model's request profile, "" when it sets none
+string RequestProfileEffort(const string &in model) {
+    string trimmedModel = model.Trim();
+    EnsureRequestProfilesLoaded();
+    for (uint i = 0; i < profile_rule_types.length(); i++) {
+        if (profile_rule_types[i] == "default" || ModelRuleMatches(profile_rule_types[i], profile_rule_values[i], trimmedModel))
+            return profile_rule_efforts[i];
+    }
+    return "";
+}
+
+// 0 = usable, 1 = the endpoint refused a profile field, 2 = the output cap ended the reply before any text
+int ProfileFailureKind(const string &in response, bool responses) {
+    JsonReader reader;
+    JsonValue root;
+    if (response == "" || !reader.parse(response, root) || !root.isObject())
+        return 0;
+    JsonValue error = root["error"];
+    if (error.isObject()) {
+        string detail = ToLower((error["message"].isString() ? error["message"].asString() : "") + " "
+                                + (error["param"].isString() ? error["param"].asString() : "") + " "
+                                + (error["code"].isString() ? error["code"].asString() : ""));
+        array<string> hints = {"reasoning", "verbosity", "temperature", "max_tokens", "max_completion_tokens",
+                               "max_output_tokens", "unsupported", "unrecognized", "unknown parameter", "not supported"};
+        for (uint i = 0; i < hints.length(); i++) {
+            if (detail.find(hints[i]) != -1)
+                return 1;
+        }
+        return 0;
+    }
+    if (responses)
+        return (root["status"].isString() && root["status"].asString() == "incomplete" && ExtractResponsesText(root) == "") ? 2 : 0;
+    JsonValue choices = root["choices"];
+    if (choices.isArray() && choices.size() > 0 && choices[0].isObject() &&
+        choices[0]["finish_reason"].isString() && choices[0]["finish_reason"].asString() == "length") {
+        JsonValue message = choices[0]["message"];
+        if (!message.isObject() || !message["content"].isString() || message["content"].asString().Trim() == "")
+            return 2;
+    }
+    return 0;
+}
+
+// Sends a body carrying the model's profile fields. When the endpoint refuses them the profile is
+// dropped for this model and endpoint; when the output cap cut the reply off before any text only
+// this cue goes out again. Either way the same body is resent once without the fields.
+string ExecuteProfiledRequest(const string &in url, const string &in headers, const string &in payload, const string &in model, const string &in profileFields, bool responses, int delayInt, int retryModeInt) {
+    string response = ExecuteWithRetry(url, headers, payload, delayInt, retryModeInt);
+    if (profileFields == "")
+        return response;
+    int failure = ProfileFailureKind(response, responses);
+    int pos = payload.find(profileFields);
+    if (failure == 0 || pos < 0 || (cue_deadline_ms > 0 && CueDeadlinePassed()))
+        return response;
+    if (failure == 1) {
+        request_profile_rejected_key = model.Trim() + "|" + url;
+        HostPrintUTF8("Request profile for " + model + " was rejected; sending plain requests to " + url + " for this session.\n");
+    } else {
+        HostPrintUTF8("Request profile output cap cut off the reply; resending without it.\n");
+    }
+    string plainPayload = payload.substr(0, pos) + payload.substr(pos + profileFields.length());
+    return ExecuteWithRetry(url, headers, plainPayload, delayInt, retryModeInt);
+}
+
 string DeriveResponsesUrl(const string &in originalUrl) {
     string url = originalUrl.Trim();
     while (url.length() > 0 && url.substr(url.length() - 1, 1) == "/")
@@ -851,22 +2938,274 @@ string ExecuteWithRetry(const string &in url, const string &in headers, const st
             if (delayInt > 0)
                 HostSleep(delayInt);
         }
-        response = HostUrlGetString(url, UserAgent, headers, payload);
+        response = PostRequestBody(url, headers, payload);
         if (response != "" || retryModeInt == 0 || (retryModeInt == 1 && attempts >= 1))
             break;
+        // Retries never run past the cue deadline; the late-fill helper finishes the work instead
+        if (cue_deadline_ms > 0 && CueDeadlinePassed())
+            break;
         attempts++;
     }
     return response;
 }
 
-string BuildResponsesPayload(const string &in systemMsg, const string &in subtitleText) {
-    string escapedSystem = JsonEscape(systemMsg);
-    string escapedSubtitle = JsonEscape(subtitleText);
-    string payload = "{\"model\":\"" + selected_model + "\",\"input\":[";
-    payload += "{\"role\":\"system\",\"content\":[{\"type\":\"input_text\",\"text\":\"" + escapedSystem + "\",\"cache_control\":{\"type\":\"ephemeral\"}}]}";
-    payload += ",{\"role\":\"user\",\"content\":[{\"type\":\"input_text\",\"text\":\"" + escapedSubtitle + "\"}]}";
-    payload += "]}";
-    return payload;
+void LoadGzipEndpoints() {
+    if (gzip_endpoints_loaded)
+        return;
+    gzip_endpoints_loaded = true;
+    // "1 <url>" / "0 <url>" per line, so a gateway is probed once, not once per session
+    string stored = HostLoadString("gpt_gzip_endpoints", "");
+    int start = 0;
+    for (int i = 0; i <= int(stored.length()); i++) {
+        if (i < int(stored.length()) && stored.substr(i, 1) != "\n")
+            continue;
+        string line = stored.substr(start, i - start).Trim();
+        start = i + 1;
+        if (line.length() > 2 && (line.substr(0, 2) == "1 " || line.substr(0, 2) == "0 ")) {
+            gzip_endpoint_urls.insertLast(line.substr(2));
+            gzip_endpoint_accepts.insertLast(line.substr(0, 1) == "1");
+        }
+    }
+}
+
+void RememberGzipSupport(const string &in url, bool accepts, int plainBytes, int sentBytes) {
+    gzip_endpoint_urls.insertLast(url);
+    gzip_endpoint_accepts.insertLast(accepts);
+    string stored = "";
+    for (uint i = 0; i < gzip_endpoint_urls.length(); i++)
+        stored += (gzip_endpoint_accepts[i] ? "1 " : "0 ") + gzip_endpoint_urls[i] + "\n";
+    HostSaveString("gpt_gzip_endpoints", stored);
+    if (accepts)
+        HostPrintUTF8("Gzip: " + url + " accepts compressed bodies (" + plainBytes + " -> " + sentBytes + " bytes).\n");
+    else
+        HostPrintUTF8("Gzip: " + url + " rejected a compressed body; sending uncompressed from now on.\n");
+}
+
+void ResetGzipEndpoints() {
+    gzip_endpoint_urls.resize(0);
+    gzip_endpoint_accepts.resize(0);
+    gzip_endpoints_loaded = true;
+    HostSaveString("gpt_gzip_endpoints", "");
+}
+
+bool IsAcceptedResponse(const string &in response) {
+    if (response == "")
+        return false;
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(response, root) || !root.isObject())
+        return false;
+    return !root["error"].isObject() && !root["error"].isString();
+}
+
+// A gateway that cannot read gzip bodies answers 400/415 or reports that it could not parse the body.
+// Anything else (429, 5xx, timeouts) says nothing about compression, so it must not count as a rejection.
+bool IsGzipRejection(int status, const string &in response) {
+    if (status == 400 || status == 415)
+        return true;
+    JsonReader reader;
+    JsonValue root;
+    if (!reader.parse(response, root) || !root.isObject())
+        return false;
+    string message = "";
+    if (root["error"].isString())
+        message = root["error"].asString();
+    else if (root["error"].isObject() && root["error"]["message"].isString())
+        message = root["error"]["message"].asString();
+    message = ToLower(message);
+    return message.find("parse") != -1 || message.find("decode") != -1 || message.find("invalid json") != -1;
+}
+
+// Sends large bodies gzip-compressed once the endpoint is known to accept them; the first large
+// body to an unprobed endpoint is the probe. A rejection is retried uncompressed straight away and
+// remembered once the plain body succeeds; a transient failure is returned as-is and probed again later.
+string PostRequestBody(const string &in url, const string &in headers, const string &in payload) {
+    int minBytes = ParseInt(gzip_min_bytes);
+    if (minBytes <= 0 || int(payload.length()) < minBytes)
+        return HostUrlGetString(url, UserAgent, headers, payload);
+    LoadGzipEndpoints();
+    int known = gzip_endpoint_urls.find(url);
+    if (known >= 0 && !gzip_endpoint_accepts[known])
+        return HostUrlGetString(url, UserAgent, headers, payload);
+
+    string compressed = HostGzipCompress(payload);
+    if (compressed == "" || compressed.length() >= payload.length())
+        return HostUrlGetString(url, UserAgent, headers, payload);
+    if (known >= 0)
+        return HostUrlGetString(url, UserAgent, headers + "\nContent-Encoding: gzip", compressed);
+
+    // The probe needs the status code, which HostUrlGetString does not report
+    uintptr http = HostOpenHTTP(url, UserAgent, headers + "\nContent-Encoding: gzip", compressed);
+    if (http == 0)
+        return "";
+    int status = HostGetStatusHTTP(http);
+    string response = HostGetContentHTTP(http);
+    HostCloseHTTP(http);
+    if (status >= 200 && status < 300 && IsAcceptedResponse(response)) {
+        RememberGzipSupport(url, true, int(payload.length()), int(compressed.length()));
+        return response;
+    }
+    if (!IsGzipRejection(status, response))
+        return response;
+    string plainResponse = HostUrlGetString(url, UserAgent, headers, payload);
+    // Only a plain success proves the compression was the problem; otherwise probe again next time
+    if (IsAcceptedResponse(plainResponse))
+        RememberGzipSupport(url, false, int(payload.length()), int(compressed.length()));
+    return plainResponse;
+}
+
+// Payload builders take pre-escaped text and assemble the body in a single expression;
+// request profile fields always follow the model field so ExecuteProfiledRequest can cut them out
+string BuildChatPayload(const string &in model, const string &in escapedSystem, const string &in escapedSubtitle, const string &in profileFields = "") {
+    return "{\"model\":\"" + model + "\"" + profileFields + ","
+           "\"messages\":[{\"role\":\"system\",\"content\":\"" + escapedSystem + "\"},"
+           "{\"role\":\"user\",\"content\":\"" + escapedSubtitle + "\"}]}";
+}
+
+string BuildResponsesPayload(const string &in model, const string &in escapedSystem, const string &in escapedSubtitle, const string &in profileFields = "") {
+    return "{\"model\":\"" + model + "\"" + profileFields + ",\"input\":["
+           "{\"role\":\"system\",\"content\":[{\"type\":\"input_text\",\"text\":\"" + escapedSystem + "\",\"cache_control\":{\"type\":\"ephemeral\"}}]}"
+           ",{\"role\":\"user\",\"content\":[{\"type\":\"input_text\",\"text\":\"" + escapedSubtitle + "\"}]}"
+           "]}";
+}
+
+// Follow-up turn in a stored conversation: only the new cue is uploaded
+string BuildChainedResponsesPayload(const string &in model, const string &in previousId, const string &in escapedSubtitle, const string &in profileFields = "") {
+    return "{\"model\":\"" + model + "\"" + profileFields + ",\"previous_response_id\":\"" + JsonEscape(previousId) + "\",\"store\":true,\"input\":["
+           "{\"role\":\"user\",\"content\":[{\"type\":\"input_text\",\"text\":\"" + escapedSubtitle + "\"}]}"
+           "]}";
+}
+
+int ResponsesUsageTokens(JsonValue &in root, const string &in field) {
+    if (root.isObject() && root["usage"].isObject() && root["usage"][field].isInt())
+        return root["usage"][field].asInt();
+    return 0;
+}
+
+// Quiet per cue: a line when a chain anchors (or re-anchors), otherwise averages once every
+// RESPONSES_UPLOAD_REPORT_EVERY cues
+void ReportResponsesUpload(const string &in mode, int payloadBytes, JsonValue &in root) {
+    last_prompt_tokens = ResponsesUsageTokens(root, "input_tokens");
+    responses_upload_cues++;
+    responses_upload_bytes += payloadBytes;
+    responses_upload_tokens += last_prompt_tokens;
+    if (mode == "chain anchor")
+        HostPrintUTF8("Responses chain anchored: uploaded " + payloadBytes + " bytes, input_tokens=" + last_prompt_tokens + "\n");
+    if (responses_upload_cues < RESPONSES_UPLOAD_REPORT_EVERY)
+        return;
+    HostPrintUTF8("Responses uploads (" + mode + "), last " + responses_upload_cues + " cues: " + (responses_upload_bytes / responses_upload_cues)
+                  + " bytes and " + (responses_upload_tokens / responses_upload_cues) + " input tokens per cue on average.\n");
+    responses_upload_cues = 0;
+    responses_upload_bytes = 0;
+    responses_upload_tokens = 0;
+}
+
+void ResetResponseChain(const string &in reason) {
+    if (reason != "" && response_chain_id != "")
+        HostPrintUTF8("Responses chain re-anchored (" + reason + ") after " + response_chain_turns + " cues.\n");
+    response_chain_id = "";
+    response_chain_key = "";
+    response_chain_model = "";
+    response_chain_anchor_tokens = 0;
+    response_chain_tokens = 0;
+    response_chain_turns = 0;
+}
+
+// A long pause or a cue that already went through the chain means the user seeked;
+// the server-side history no longer matches what is on screen.
+void DetectChainDiscontinuity(const string &in text) {
+    if (response_chain_id == "")
+        return;
+    if (HostGetTickCount() - response_chain_last_tick > RESPONSE_CHAIN_IDLE_MS) {
+        ResetResponseChain("idle");
+        return;
+    }
+    if (EstimateTokenCount(text) < 3)
+        return;
+    int last = int(subtitleHistory.length()) - 2;
+    int first = last - response_chain_turns + 1;
+    if (first < 0)
+        first = 0;
+    for (int i = last; i >= first; i--) {
+        if (subtitleHistory[i] == text) {
+            ResetResponseChain("seek");
+            return;
+        }
+    }
+}
+
+// True once the chain holds more history than a fresh anchor with the configured window would
+bool ResponseChainNeedsReanchor(const string &in model, const string &in escapedSubtitle) {
+    int safeBudget = GetModelMaxTokens(model) - 1000;
+    if (safeBudget <= 0)
+        safeBudget = GetModelMaxTokens(model);
+    int contextBudget = config_context_budget;
+    if (contextBudget <= 0 || contextBudget > safeBudget)
+        contextBudget = safeBudget;
+    int projected = response_chain_tokens + EstimateTokenCount(escapedSubtitle);
+    return projected > safeBudget || projected - response_chain_anchor_tokens > contextBudget;
+}
+
+// Stateful Responses mode: the first cue anchors the chain with the full system prompt and
+// context, later cues send only themselves with previous_response_id.
+string TranslateWithResponseChain(const string &in responsesUrl, const string &in model, const string &in headers, const string &in escapedSystemMsg, const string &in escapedSubtitle, int delayInt, int retryModeInt, string &out failureReason) {
+    string anchorKey = responsesUrl + "|" + prompt_prefix_cache_key;
+    if (response_chain_id != "" && anchorKey != response_chain_key)
+        ResetResponseChain("prompt changed");
+    else if (response_chain_id != "" && ResponseChainNeedsReanchor(model, escapedSubtitle))
+        ResetResponseChain("token limit");
+
+    bool anchoring = (response_chain_id == "");
+    string profileFields = RequestProfileFields(model, responsesUrl, true);
+    string requestData = anchoring ? BuildResponsesPayload(model, escapedSystemMsg, escapedSubtitle, profileFields)
+                                   : BuildChainedResponsesPayload(model, response_chain_id, escapedSubtitle, profileFields);
+    string response = ExecuteProfiledRequest(responsesUrl, headers, requestData, model, profileFields, true, delayInt, retryModeInt);
+    if (response == "" && CueDeadlinePassed()) {
+        cue_deadline_missed = true;
+        failureReason = "Deadline exceeded.";
+        return "";
+    }
+    JsonReader reader;
+    JsonValue root;
+    string translatedText = "";
+    if (response != "" && reader.parse(response, root))
+        translatedText = ExtractResponsesText(root);
+    if (translatedText == "") {
+        if (response != "" && IsDeadlineExceededResponse(root)) {
+            failureReason = "Deadline exceeded.";
+            return "";
+        }
+        if (!anchoring) {
+            string reason = root.isObject() && root["error"].isObject() && root["error"]["message"].isString()
+                            ? root["error"]["message"].asString() : "no usable output";
+            HostPrintUTF8("Responses chaining rejected (" + reason + "); sending full context for this session.\n");
+            response_chain_disabled_for_session = true;
+        }
+        ResetResponseChain("");
+        failureReason = "Responses chain request failed.";
+        return "";
+    }
+
+    string responseId = root["id"].isString() ? root["id"].asString() : "";
+    if (responseId == "") {
+        // Nothing to chain from: the endpoint does not store responses
+        HostPrintUTF8("Responses endpoint returned no response id; chaining disabled for this session.\n");
+        response_chain_disabled_for_session = true;
+        ResetResponseChain("");
+    } else {
+        int tokens = ResponsesUsageTokens(root, "input_tokens") + ResponsesUsageTokens(root, "output_tokens");
+        if (anchoring) {
+            response_chain_key = anchorKey;
+            response_chain_model = model;
+            response_chain_anchor_tokens = tokens;
+        }
+        response_chain_id = responseId;
+        response_chain_tokens = tokens;
+        response_chain_turns++;
+        response_chain_last_tick = HostGetTickCount();
+    }
+    ReportResponsesUpload(anchoring ? "chain anchor" : "chained", int(requestData.length()), root);
+    return translatedText;
 }
 
 string ExtractResponsesText(JsonValue &in root) {
@@ -895,9 +3234,15 @@ string ExtractResponsesText(JsonValue &in root) {
     return "";
 }
 
-string TranslateWithResponses(const string &in responsesUrl, const string &in headers, const string &in systemMsg, const string &in subtitleText, int delayInt, int retryModeInt, string &out failureReason) {
-    string requestData = BuildResponsesPayload(systemMsg, subtitleText);
-    string response = ExecuteWithRetry(responsesUrl, headers, requestData, delayInt, retryModeInt);
+string TranslateWithResponses(const string &in responsesUrl, const string &in model, const string &in headers, const string &in escapedSystemMsg, const string &in escapedSubtitle, int delayInt, int retryModeInt, string &out failureReason) {
+    string profileFields = RequestProfileFields(model, responsesUrl, true);
+    string requestData = BuildResponsesPayload(model, escapedSystemMsg, escapedSubtitle, profileFields);
+    string response = ExecuteProfiledRequest(responsesUrl, headers, requestData, model, profileFields, true, delayInt, retryModeInt);
+    if (response == "" && CueDeadlinePassed()) {
+        cue_deadline_missed = true;
+        failureReason = "Deadline exceeded.";
+        return "";
+    }
     if (response == "") {
         failureReason = "No response from Responses endpoint.";
         return "";
@@ -912,8 +3257,13 @@ string TranslateWithResponses(const string &in responsesUrl, const string &in he
 
     string translatedText = ExtractResponsesText(root);
     if (translatedText != "") {
+        ReportResponsesUpload("stateless", int(requestData.length()), root);
         return translatedText;
     }
+    if (IsDeadlineExceededResponse(root)) {
+        failureReason = "Deadline exceeded.";
+        return "";
+    }
 
     if (root.isObject() && root["error"].isObject() && root["error"]["message"].isString()) {
         failureReason = root["error"]["message"].asString();
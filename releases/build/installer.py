@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """PyQt6 based installer for PotPlayer ChatGPT Translate — FINAL (OpenAI SDK, Dark Theme)"""
 
+import argparse
+import contextlib
 import ctypes
 import hashlib
 import json
@@ -8,6 +10,11 @@ import os
 import re
 import shutil
 import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
 import winreg
 import webbrowser
 
@@ -48,56 +55,16 @@ def _format_language_strings(strings):
 
 # ========= Per-model provider dict (model → api_base ROOT & purchase link) =========
 # 重要：api_base 统一为“根路径”（例如 https://api.openai.com/v1），不要带 /chat/completions
-API_PROVIDERS = {
-    # Official OpenAI presets
-    "gpt-5": {
-        "model": "gpt-5",
-        "api_base": "https://api.openai.com/v1",
-        "purchase_page": "https://platform.openai.com/account/billing"
-    },
-    "gpt-5-mini": {
-        "model": "gpt-5-mini",
-        "api_base": "https://api.openai.com/v1",
-        "purchase_page": "https://platform.openai.com/account/billing"
-    },
-    "gpt-5-nano": {
-        "model": "gpt-5-nano",
-        "api_base": "https://api.openai.com/v1",
-        "purchase_page": "https://platform.openai.com/account/billing"
-    },
-    "gpt-4o": {
-        "model": "gpt-4o",
-        "api_base": "https://api.openai.com/v1",
-        "purchase_page": "https://platform.openai.com/account/billing"
-    },
-    "gpt-4.1": {
-        "model": "gpt-4.1",
-        "api_base": "https://api.openai.com/v1",
-        "purchase_page": "https://platform.openai.com/account/billing"
-    },
-    "gpt-4.1-mini": {
-        "model": "gpt-4.1-mini",
-        "api_base": "https://api.openai.com/v1",
-        "purchase_page": "https://platform.openai.com/account/billing"
-    },
-    # 示例第三方：需 OpenAI-兼容接口（路径中一般包含 /v1）
-    # 如你有网关给的是完整 endpoint（.../chat/completions），也能用，代码会自动规范化为根路径
-    "glm-4": {
-        "model": "glm-4",
-        "api_base": "https://open.bigmodel.cn/api/paas/v4",  # 假设兼容 /chat/completions
-        "purchase_page": "https://open.bigmodel.cn/billing"
-    },
-    # Sentinel for custom entry (user-defined)
-    "__CUSTOM__": {
-        "model": "",
-        "api_base": "",
-        "purchase_page": ""
-    }
-}
+# 示例第三方需 OpenAI-兼容接口（路径中一般包含 /v1）；完整 endpoint 也能用，代码会自动规范化为根路径
+# "__CUSTOM__" 为自定义条目的占位项
+API_PROVIDERS = load_json_resource("api_providers.json")
 
 LANGUAGE_STRINGS = load_json_resource("language_strings.json")
 _format_language_strings(LANGUAGE_STRINGS)
 MODEL_TOKEN_LIMITS_JSON = load_json_text("model_token_limits.json")
+MODEL_TOKEN_LIMITS = json.loads(MODEL_TOKEN_LIMITS_JSON)
+MODEL_REQUEST_PROFILES_JSON = load_json_text("model_request_profiles.json")
+LANGUAGE_ID_JSON = load_json_text("language_id.json")
 
 OFFLINE_FILES = {
     "with_context": [
@@ -235,6 +202,110 @@ def verify_api_settings(model, api_url, api_key):
     except Exception as e:
         return False, str(e)
 
+# ========= Model catalog cache (/models per API base, TTL + ETag) =========
+
+MODEL_CATALOG_TTL = 6 * 3600
+
+def resolve_model_token_limit(model):
+    """与插件 GetModelMaxTokens() 相同的匹配规则。"""
+    default = int(MODEL_TOKEN_LIMITS.get("default", 4096) or 4096)
+    for rule in MODEL_TOKEN_LIMITS.get("rules", []):
+        value = rule.get("value", "")
+        tokens = int(rule.get("tokens", 0) or 0)
+        if not value or tokens <= 0:
+            continue
+        match_type = rule.get("type", "")
+        if (match_type == "prefix" and model.startswith(value)) or \
+           (match_type == "contains" and value in model) or \
+           (match_type == "equals" and model == value):
+            return tokens
+    return default
+
+def _catalog_key_digest(api_key):
+    """同一 API 根地址下不同账号/项目的 Key 可见模型不同，缓存按 Key 摘要区分（Key 本身不落盘）。"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+def _catalog_cache_path(base_url, key_digest):
+    root = os.environ.get("LOCALAPPDATA") or tempfile.gettempdir()
+    folder = os.path.join(root, "PotPlayerChatGPTTranslate", "model_catalog")
+    digest = hashlib.sha1(f"{base_url}\n{key_digest}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(folder, f"{digest}.json")
+
+def load_cached_catalog(base_url, api_key):
+    key_digest = _catalog_key_digest(api_key)
+    try:
+        with open(_catalog_cache_path(base_url, key_digest), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("base_url") != base_url or data.get("key_digest") != key_digest \
+            or not isinstance(data.get("models"), list):
+        return None
+    return data
+
+def _save_catalog(data):
+    path = _catalog_cache_path(data["base_url"], data["key_digest"])
+    try:
+        ensure_dir_exists(os.path.dirname(path))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def fetch_model_catalog(base_url, api_key, cached=None, timeout=15):
+    """
+    GET {base_url}/models，带 If-None-Match 重新验证缓存。
+    返回 catalog dict；304 时只刷新 fetched_at。失败时抛出异常。
+    """
+    req = urllib.request.Request(base_url + "/models", method="GET")
+    req.add_header("Authorization", f"Bearer {api_key}")
+    if cached and cached.get("etag"):
+        req.add_header("If-None-Match", cached["etag"])
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            payload = json.loads(resp.read().decode("utf-8"))
+            etag = resp.headers.get("ETag", "")
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached:
+            cached["fetched_at"] = time.time()
+            _save_catalog(cached)
+            return cached
+        raise
+    models = sorted({item["id"] for item in payload.get("data", [])
+                     if isinstance(item, dict) and isinstance(item.get("id"), str)})
+    data = {"base_url": base_url, "key_digest": _catalog_key_digest(api_key), "fetched_at": time.time(),
+            "etag": etag, "models": models}
+    _save_catalog(data)
+    return data
+
+class ModelCatalogThread(QtCore.QThread):
+    loaded = QtCore.pyqtSignal(str, str, list)   # base_url, key digest, model ids
+    failed = QtCore.pyqtSignal(str, str, str)    # base_url, key digest, error
+
+    def __init__(self, base_url, api_key, cached=None):
+        super().__init__()
+        self.base_url = base_url
+        self.api_key = api_key
+        self.cached = cached
+
+    def run(self):
+        try:
+            data = fetch_model_catalog(self.base_url, self.api_key, self.cached)
+            self.loaded.emit(self.base_url, data["key_digest"], data["models"])
+        except Exception as e:
+            self.failed.emit(self.base_url, _catalog_key_digest(self.api_key), str(e))
+
+def build_login_cache_entry(model, api_url, api_key):
+    """
+    生成与插件 LookupLoginCache() 相同格式的登录缓存行: "<sha256> pending <endpoint>"。
+    插件首次使用时会改写为带时间戳的记录，因此相同设置的首次登录无需联网验证。
+    """
+    base_url = _normalize_base_url_for_openai(api_url)
+    digest = hashlib.sha256(f"{base_url}\n{model}\n{api_key}".encode("utf-8")).hexdigest()
+    return f"{digest} pending {base_url}/chat/completions"
+
 def reg_key_name(install_dir, context_type):
     id_base = os.path.abspath(install_dir).lower() + "|" + context_type
     id_hash = hashlib.md5(id_base.encode("utf-8")).hexdigest()[:8]
@@ -280,7 +351,10 @@ def generate_uninstaller(uninstall_bat_path, files_to_delete, reg_key):
 
 def apply_preconfig(file_path, api_key, model, api_base, delay_ms, retry_mode, debug_mode,
                     context_budget=None, context_truncation=None, context_cache_mode=None,
-                    token_limits_json=None):
+                    token_limits_json=None, route_mode=None, route_fast_model=None,
+                    route_strong_model=None, deadline_ms=None, extra_target_langs=None, login_cache=None,
+                    local_api_url=None, local_model=None, spill_threshold_ms=None, context_budget_mode=None,
+                    request_profiles_json=None, config_generation=None, langid_json=None):
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             data = f.read()
@@ -301,6 +375,42 @@ def apply_preconfig(file_path, api_key, model, api_base, delay_ms, retry_mode, d
             escaped_json = _escape_for_as_string(token_limits_json)
             data = re.sub(r'pre_model_token_limits_json\s*=\s*".*?"',
                           f'pre_model_token_limits_json = "{escaped_json}"', data)
+        if request_profiles_json is not None:
+            data = re.sub(r'pre_request_profiles_json\s*=\s*".*?"',
+                          f'pre_request_profiles_json = "{_escape_for_as_string(request_profiles_json)}"', data)
+        if langid_json is not None:
+            data = re.sub(r'pre_langid_json\s*=\s*".*?"',
+                          f'pre_langid_json = "{_escape_for_as_string(langid_json)}"', data)
+        if config_generation is not None:
+            data = re.sub(r'pre_config_generation\s*=\s*".*?"', f'pre_config_generation = "{config_generation}"', data)
+        if route_mode is not None:
+            data = re.sub(r'pre_route_mode\s*=\s*".*?"', f'pre_route_mode = "{route_mode}"', data)
+        # pre_route_threshold keeps the plugin default on purpose: the wizard has no control for it, and it is
+        # tuned with tools/route_replay.py --threshold and edited in the plugin, not chosen per install
+        if route_fast_model is not None:
+            data = re.sub(r'pre_route_fast_model\s*=\s*".*?"',
+                          f'pre_route_fast_model = "{_escape_for_as_string(route_fast_model)}"', data)
+        if route_strong_model is not None:
+            data = re.sub(r'pre_route_strong_model\s*=\s*".*?"',
+                          f'pre_route_strong_model = "{_escape_for_as_string(route_strong_model)}"', data)
+        if deadline_ms is not None:
+            data = re.sub(r'pre_deadline_ms\s*=\s*".*?"', f'pre_deadline_ms = "{deadline_ms}"', data)
+        if extra_target_langs is not None:
+            data = re.sub(r'pre_extra_target_langs\s*=\s*".*?"',
+                          f'pre_extra_target_langs = "{_escape_for_as_string(extra_target_langs)}"', data)
+        if login_cache is not None:
+            data = re.sub(r'pre_login_cache\s*=\s*".*?"',
+                          f'pre_login_cache = "{_escape_for_as_string(login_cache)}"', data)
+        if local_api_url is not None:
+            data = re.sub(r'pre_local_api_url\s*=\s*".*?"',
+                          f'pre_local_api_url = "{_escape_for_as_string(local_api_url)}"', data)
+        if local_model is not None:
+            data = re.sub(r'pre_local_model\s*=\s*".*?"',
+                          f'pre_local_model = "{_escape_for_as_string(local_model)}"', data)
+        if spill_threshold_ms is not None:
+            data = re.sub(r'pre_spill_threshold_ms\s*=\s*".*?"', f'pre_spill_threshold_ms = "{spill_threshold_ms}"', data)
+        if context_budget_mode is not None:
+            data = re.sub(r'pre_context_budget_mode\s*=\s*".*?"', f'pre_context_budget_mode = "{context_budget_mode}"', data)
         if debug_mode and "HostOpenConsole();" not in data:
             idx = data.find("*/")
             if idx != -1:
@@ -355,6 +465,76 @@ def apply_fusion_dark_palette(app: QtWidgets.QApplication):
         QLabel a:hover { text-decoration: underline; }
     """)
 
+# ========= Install tracing =========
+
+TRACE_ENV = "POTPLAYER_TRANSLATE_TRACE"
+TRACE_FILE_NAME = "install_trace.json"
+
+class PhaseTracer:
+    """
+    可选的安装阶段计时：每个阶段 / 每个文件记录一个 span，导出为 Chrome trace JSON
+    （chrome://tracing 或 Perfetto 可直接打开）。等待用户回答的时间记为 "wait"，与 "work" 分开统计；
+    无界面安装按命令行参数自动作答，记为 "auto" 类别的 auto_answer，不算作等待。
+    通过 --trace 参数或环境变量 POTPLAYER_TRANSLATE_TRACE=1 开启；关闭时 span() 不做任何事。
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, category="work", **args):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            event = {
+                "name": name, "cat": category, "ph": "X",
+                "ts": round((started - self._origin) * 1e6), "dur": round((ended - started) * 1e6),
+                "pid": os.getpid(), "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = args
+            with self._lock:
+                self.events.append(event)
+
+    def totals(self):
+        """顶层 work span 的毫秒数（扣除其中等待用户回答的时间）与 wait 的毫秒数。"""
+        with self._lock:
+            events = sorted(self.events, key=lambda e: (e["tid"], e["ts"], -e["dur"]))
+        work = wait = 0
+        work_until = {}
+        for e in events:
+            inside = e["ts"] < work_until.get(e["tid"], -1)
+            if e["cat"] == "wait":
+                wait += e["dur"]
+                if inside:
+                    work -= e["dur"]
+            elif not inside:
+                work_until[e["tid"]] = e["ts"] + e["dur"]
+                work += e["dur"]
+        return {"work": round(work / 1000, 1), "wait": round(wait / 1000, 1)}
+
+    def export(self, path):
+        with self._lock:
+            events = list(self.events)
+        data = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"version": PLUGIN_VERSION, "totals_ms": self.totals()},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        return path
+
+TRACER = PhaseTracer("--trace" in sys.argv or os.environ.get(TRACE_ENV, "") not in ("", "0"))
+
 # ========= Installation Thread  (NO UI inside thread) =========
 
 class InstallThread(QtCore.QThread):
@@ -371,15 +551,19 @@ class InstallThread(QtCore.QThread):
             self._loop.quit()
 
     def _ask_main(self, signal, *args):
-        self._answer = None
-        self._loop = QtCore.QEventLoop()
-        signal.emit(*args)
-        self._loop.exec()
-        ans = self._answer
-        self._loop = None
+        with TRACER.span("prompt", "wait", title=args[0] if args else ""):
+            self._answer = None
+            self._loop = QtCore.QEventLoop()
+            signal.emit(*args)
+            self._loop.exec()
+            ans = self._answer
+            self._loop = None
         return ans
 
-    def __init__(self, install_dir, versions, script_dir, language, api_key, model, api_base, delay_ms, retry_mode, debug_mode, context_budget, context_truncation, context_cache_mode):
+    def __init__(self, install_dir, versions, script_dir, language, api_key, model, api_base, delay_ms, retry_mode, debug_mode, context_budget, context_truncation, context_cache_mode,
+                 route_mode="off", route_fast_model="", route_strong_model="", deadline_ms=0,
+                 extra_target_langs="", login_cache="", local_api_url="", local_model="", spill_threshold_ms=2000,
+                 context_budget_mode="fixed"):
         super().__init__()
         self.install_dir = install_dir
         self.versions = list(versions) if versions else []
@@ -394,6 +578,16 @@ class InstallThread(QtCore.QThread):
         self.context_budget = context_budget
         self.context_truncation = context_truncation
         self.context_cache_mode = context_cache_mode
+        self.route_mode = route_mode
+        self.route_fast_model = route_fast_model
+        self.route_strong_model = route_strong_model
+        self.deadline_ms = deadline_ms
+        self.extra_target_langs = extra_target_langs
+        self.login_cache = login_cache
+        self.local_api_url = local_api_url
+        self.local_model = local_model
+        self.spill_threshold_ms = spill_threshold_ms
+        self.context_budget_mode = context_budget_mode
         self.files_installed = []
         self._loop = None
         self._answer = None
@@ -407,13 +601,60 @@ class InstallThread(QtCore.QThread):
                 self.progress.emit("DONE")
                 return
             for variant in self.versions:
-                self._install_variant(variant, s)
+                with TRACER.span("install_variant", variant=variant):
+                    self._install_variant(variant, s)
+            self._export_trace()
             self.progress.emit(LANGUAGE_STRINGS["en"]["installation_complete"] + "\n" +
                                LANGUAGE_STRINGS["zh"]["installation_complete"])
             self.progress.emit("DONE")
         except Exception as e:
             self.progress.emit(merge_bilingual("installation_failed").format(str(e)))
+            self._export_trace()
+            return
+
+    def _export_trace(self):
+        if not TRACER.enabled:
             return
+        tools_dir = os.path.join(self.install_dir, "tools")
+        try:
+            ensure_dir_exists(tools_dir)
+            path = TRACER.export(os.path.join(tools_dir, TRACE_FILE_NAME))
+        except OSError as e:
+            self.progress.emit(f"Trace export failed: {e}")
+            return
+        totals = TRACER.totals()
+        self.progress.emit(f"Trace written to {path} (work {totals.get('work', 0)} ms, "
+                           f"waiting for answers {totals.get('wait', 0)} ms).")
+
+    def _copy(self, src_path, dest_path):
+        with TRACER.span("copy", "work", file=os.path.basename(dest_path)):
+            shutil.copy(src_path, dest_path)
+
+    def _preconfigure(self, path, variant):
+        with TRACER.span("apply_preconfig", "work", file=os.path.basename(path)):
+            self._apply_preconfig(path, variant)
+
+    def _apply_preconfig(self, path, variant):
+        with_context = (variant == "with_context")
+        apply_preconfig(path, self.api_key, self.model, self.api_base, self.delay_ms, self.retry_mode, self.debug_mode,
+                        str(self.context_budget) if with_context else None,
+                        self.context_truncation if with_context else None,
+                        self.context_cache_mode if with_context else None,
+                        MODEL_TOKEN_LIMITS_JSON,
+                        self.route_mode if with_context else None,
+                        self.route_fast_model if with_context else None,
+                        self.route_strong_model if with_context else None,
+                        self.deadline_ms if with_context else None,
+                        self.extra_target_langs if with_context else None,
+                        self.login_cache,
+                        self.local_api_url if with_context else None,
+                        self.local_model if with_context else None,
+                        self.spill_threshold_ms if with_context else None,
+                        self.context_budget_mode if with_context else None,
+                        MODEL_REQUEST_PROFILES_JSON,
+                        # A new install stamp makes running plugins reload their configuration snapshot
+                        str(int(time.time())),
+                        LANGUAGE_ID_JSON)
 
     def _install_variant(self, variant, strings):
         files_for_variant = []
@@ -439,13 +680,9 @@ class InstallThread(QtCore.QThread):
                     self.progress.emit(merge_bilingual("installation_cancelled"))
                     return
                 elif choice == "overwrite":
-                    shutil.copy(src_path, dest_path)
+                    self._copy(src_path, dest_path)
                     if dest_name.lower().endswith(".as"):
-                        apply_preconfig(dest_path, self.api_key, self.model, self.api_base, self.delay_ms, self.retry_mode, self.debug_mode,
-                                        str(self.context_budget) if variant == "with_context" else None,
-                                        self.context_truncation if variant == "with_context" else None,
-                                        self.context_cache_mode if variant == "with_context" else None,
-                                        MODEL_TOKEN_LIMITS_JSON)
+                        self._preconfigure(dest_path, variant)
                     self.progress.emit(f"Installed {dest_name} (Overwritten).")
                     self.files_installed.append(dest_path)
                     files_for_variant.append(dest_path)
@@ -470,13 +707,9 @@ class InstallThread(QtCore.QThread):
                         if os.path.exists(new_dest_path):
                             _ = self._ask_main(self.ask_file_exists, strings["app_title"], strings["file_exists_3choice"].format(new_name))
                             continue
-                        shutil.copy(src_path, new_dest_path)
+                        self._copy(src_path, new_dest_path)
                         if new_name.lower().endswith(".as"):
-                            apply_preconfig(new_dest_path, self.api_key, self.model, self.api_base, self.delay_ms, self.retry_mode, self.debug_mode,
-                                            str(self.context_budget) if variant == "with_context" else None,
-                                            self.context_truncation if variant == "with_context" else None,
-                                            self.context_cache_mode if variant == "with_context" else None,
-                                            MODEL_TOKEN_LIMITS_JSON)
+                            self._preconfigure(new_dest_path, variant)
                         self.progress.emit(f"Installed {new_name}.")
                         self.files_installed.append(new_dest_path)
                         files_for_variant.append(new_dest_path)
@@ -484,13 +717,9 @@ class InstallThread(QtCore.QThread):
                             reg_write = True
                         break
             else:
-                shutil.copy(src_path, dest_path)
+                self._copy(src_path, dest_path)
                 if dest_name.lower().endswith(".as"):
-                    apply_preconfig(dest_path, self.api_key, self.model, self.api_base, self.delay_ms, self.retry_mode, self.debug_mode,
-                                    str(self.context_budget) if variant == "with_context" else None,
-                                    self.context_truncation if variant == "with_context" else None,
-                                    self.context_cache_mode if variant == "with_context" else None,
-                                    MODEL_TOKEN_LIMITS_JSON)
+                    self._preconfigure(dest_path, variant)
                 self.progress.emit(f"Installed {dest_name}.")
                 self.files_installed.append(dest_path)
                 files_for_variant.append(dest_path)
@@ -502,16 +731,42 @@ class InstallThread(QtCore.QThread):
             ensure_dir_exists(tools_dir)
             uninstaller_path = os.path.join(tools_dir, f"uninstaller_{key_name}.bat")
             files_to_delete = list(files_for_variant)
+            if TRACER.enabled:
+                files_to_delete.append(os.path.join(tools_dir, TRACE_FILE_NAME))
             files_to_delete.append(uninstaller_path)
-            generate_uninstaller(uninstaller_path, files_to_delete, key_name)
-            register_software(
-                display_name=display_name,
-                uninstall_path=uninstaller_path,
-                install_dir=self.install_dir,
-                key_name=key_name,
-                version=PLUGIN_VERSION,
-                context_type=context_type
-            )
+            with TRACER.span("generate_uninstaller"):
+                generate_uninstaller(uninstaller_path, files_to_delete, key_name)
+            with TRACER.span("register_software", variant=variant):
+                register_software(
+                    display_name=display_name,
+                    uninstall_path=uninstaller_path,
+                    install_dir=self.install_dir,
+                    key_name=key_name,
+                    version=PLUGIN_VERSION,
+                    context_type=context_type
+                )
+
+class HeadlessInstallThread(InstallThread):
+    """
+    无界面安装：不弹窗，按命令行给定的策略回答提示，在调用线程中同步执行 run()。
+    供脚本 / CI 使用，配合 --trace 可以用数字发现安装耗时的回归。
+    """
+
+    def __init__(self, *args, overwrite=True, register=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.overwrite = overwrite
+        self.register = register
+
+    def _ask_main(self, signal, *args):
+        # Nobody is waited on here, so these are not "wait" spans; headless runs have no directory
+        # detection or API verification step either, so their traces lack those two spans
+        with TRACER.span("auto_answer", "auto", title=args[0] if args else ""):
+            name = signal.signal
+            if "ask_file_exists" in name:
+                return "overwrite" if self.overwrite else None
+            if "ask_yesno" in name:
+                return self.register
+            return None
 
 # ========= Wizard Pages & UI =========
 
@@ -622,13 +877,16 @@ class DirectoryPage(QtWidgets.QWizardPage):
         self.browse.setText(s["browse"])
         set_button_texts_for(self.wizard)
 
-        detected = auto_detect_directory()
+        with TRACER.span("auto_detect_directory"):
+            detected = auto_detect_directory()
         if detected:
-            if QtWidgets.QMessageBox.question(
-                self, s["app_title"],
-                s["confirm_path"].format(detected),
-                QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
-            ) == QtWidgets.QMessageBox.StandardButton.Yes:
+            with TRACER.span("confirm_path", "wait"):
+                accepted = QtWidgets.QMessageBox.question(
+                    self, s["app_title"],
+                    s["confirm_path"].format(detected),
+                    QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+                ) == QtWidgets.QMessageBox.StandardButton.Yes
+            if accepted:
                 self.edit.setText(detected)
         else:
             QtWidgets.QMessageBox.information(self, s["app_title"], s["not_detected"])
@@ -712,6 +970,30 @@ class ConfigPage(QtWidgets.QWizardPage):
         self.api_edit = QtWidgets.QLineEdit()
         self.key_edit = QtWidgets.QLineEdit()
         self.key_edit.setEchoMode(QtWidgets.QLineEdit.EchoMode.Password)
+        self.route_hint = QtWidgets.QLabel()
+        self.route_hint.setWordWrap(True)
+        self.local_edit = QtWidgets.QLineEdit()
+        self.local_model_edit = QtWidgets.QLineEdit()
+        self.spill_spin = QtWidgets.QSpinBox()
+        self.spill_spin.setRange(200, 30000)
+        self.spill_spin.setSingleStep(100)
+        self.spill_spin.setSuffix(" ms")
+        self.local_hint = QtWidgets.QLabel()
+        self.local_hint.setWordWrap(True)
+        self.catalog_model = QtGui.QStandardItemModel(self)
+        self.completer = QtWidgets.QCompleter(self.catalog_model, self)
+        self.completer.setCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+        self.completer.setFilterMode(QtCore.Qt.MatchFlag.MatchContains)
+        self.model_edit.setCompleter(self.completer)
+        self.model_info = QtWidgets.QLabel()
+        self.model_info.setWordWrap(True)
+        self.model_edit.textChanged.connect(self.update_model_info)
+        self.api_edit.editingFinished.connect(self.refresh_catalog)
+        self.key_edit.editingFinished.connect(self.refresh_catalog)
+        self.catalog_base = ""
+        self.catalog_key_digest = ""
+        self.catalog_ids = set()
+        self.catalog_thread = None
 
         self.purchase_btn = QtWidgets.QPushButton()
         self.verify_btn = QtWidgets.QPushButton()
@@ -731,7 +1013,10 @@ class ConfigPage(QtWidgets.QWizardPage):
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(self.intro)
         layout.addLayout(self.form)
+        layout.addWidget(self.model_info)
         layout.addLayout(btn_row)
+        layout.addWidget(self.route_hint)
+        layout.addWidget(self.local_hint)
         layout.addWidget(self.status)
         self.setLayout(layout)
 
@@ -762,6 +1047,34 @@ class ConfigPage(QtWidgets.QWizardPage):
         self.form.addRow(s["config_key"], self.key_edit)
         self.key_edit.setPlaceholderText(s["config_key_placeholder"])
 
+        self.route_check = QtWidgets.QCheckBox(s["config_route_enable"])
+        self.route_check.toggled.connect(self.on_route_toggled)
+        self.route_fast_combo = QtWidgets.QComboBox()
+        self.route_strong_combo = QtWidgets.QComboBox()
+        route_models = [API_PROVIDERS[k]["model"] for k in preset_names]
+        for combo, current in ((self.route_fast_combo, self.wizard.route_fast_model),
+                               (self.route_strong_combo, self.wizard.route_strong_model)):
+            combo.setEditable(True)
+            combo.addItems(route_models)
+            combo.setCurrentText(current)
+        self.form.addRow("", self.route_check)
+        self.form.addRow(s["config_route_fast"], self.route_fast_combo)
+        self.form.addRow(s["config_route_strong"], self.route_strong_combo)
+        self.route_hint.setText(s["config_route_hint"])
+        self.route_check.setChecked(self.wizard.route_mode == "auto")
+        self.on_route_toggled(self.route_check.isChecked())
+
+        self.form.addRow(s["config_local_url"], self.local_edit)
+        self.form.addRow(s["config_local_model"], self.local_model_edit)
+        self.form.addRow(s["config_spill_threshold"], self.spill_spin)
+        self.local_edit.setPlaceholderText(s["config_local_url_placeholder"])
+        self.local_edit.setText(self.wizard.local_api_url)
+        self.local_model_edit.setText(self.wizard.local_model)
+        self.spill_spin.setValue(int(self.wizard.spill_threshold_ms))
+        self.local_hint.setText(s["config_local_hint"])
+        for widget in (self.local_edit, self.local_model_edit, self.spill_spin):
+            widget.setEnabled(self.wizard.has_context_variant)
+
         self.purchase_btn.setText(s["purchase_button"])
         self.purchase_btn.setToolTip(s["purchase_hint"])
         self.verify_btn.setText(s["verify"])
@@ -801,6 +1114,53 @@ class ConfigPage(QtWidgets.QWizardPage):
         self.key_edit.setText(stored_key)
         self.status.setText("")
         self.skip = False
+        self.refresh_catalog()
+
+    def refresh_catalog(self):
+        """Show the cached catalog for this API base and key at once; revalidate it in the background when stale."""
+        base_url = _normalize_base_url_for_openai(self.api_edit.text().strip())
+        api_key = self.key_edit.text().strip()
+        key_digest = _catalog_key_digest(api_key)
+        cached = load_cached_catalog(base_url, api_key)
+        if base_url != self.catalog_base or key_digest != self.catalog_key_digest:
+            self.catalog_base = base_url
+            self.catalog_key_digest = key_digest
+            self.set_catalog(cached["models"] if cached else [])
+        if not api_key or (self.catalog_thread is not None and self.catalog_thread.isRunning()):
+            return
+        if cached and time.time() - cached.get("fetched_at", 0) < MODEL_CATALOG_TTL:
+            return
+        self.catalog_thread = ModelCatalogThread(base_url, api_key, cached)
+        self.catalog_thread.loaded.connect(self.on_catalog_loaded)
+        self.catalog_thread.failed.connect(self.on_catalog_failed)
+        self.catalog_thread.start()
+
+    def set_catalog(self, models):
+        self.catalog_ids = set(models)
+        self.catalog_model.clear()
+        for model in models:
+            item = QtGui.QStandardItem(model)
+            item.setToolTip(self.wizard.strings["config_model_listed"].format(resolve_model_token_limit(model)))
+            self.catalog_model.appendRow(item)
+        self.update_model_info(self.model_edit.text())
+
+    def on_catalog_loaded(self, base_url, key_digest, models):
+        if base_url == self.catalog_base and key_digest == self.catalog_key_digest:
+            self.set_catalog(models)
+
+    def on_catalog_failed(self, base_url, key_digest, error):
+        if base_url == self.catalog_base and key_digest == self.catalog_key_digest and not self.catalog_ids:
+            self.model_info.setText(self.wizard.strings["config_catalog_failed"].format(error))
+
+    def update_model_info(self, text):
+        s = self.wizard.strings
+        model = text.strip()
+        if not model or not self.catalog_ids:
+            self.model_info.setText("")
+        elif model in self.catalog_ids:
+            self.model_info.setText(s["config_model_listed"].format(resolve_model_token_limit(model)))
+        else:
+            self.model_info.setText(s["config_model_unlisted"].format(len(self.catalog_ids)))
 
     def on_model_change(self, name, initializing=False):
         if name == "Custom...":
@@ -820,6 +1180,10 @@ class ConfigPage(QtWidgets.QWizardPage):
         if not initializing:
             self.status.setText("")
 
+    def on_route_toggled(self, checked):
+        self.route_fast_combo.setEnabled(checked)
+        self.route_strong_combo.setEnabled(checked)
+
     def open_purchase_page(self):
         if self.purchase_link:
             webbrowser.open(self.purchase_link)
@@ -830,18 +1194,28 @@ class ConfigPage(QtWidgets.QWizardPage):
         if not api_key:
             self.status.setText(s["verify_success"])
             return True
+        model = self.model_edit.text().strip()
+        # /models does not list every name a provider serves (aliases, fine-tunes, gateway routes), so an
+        # unlisted name is only a warning and the real request below decides
+        unlisted = ""
+        if self.catalog_ids and self.catalog_base == _normalize_base_url_for_openai(self.api_edit.text().strip()) \
+                and self.catalog_key_digest == _catalog_key_digest(api_key) and model not in self.catalog_ids:
+            unlisted = s["config_model_unlisted"].format(len(self.catalog_ids))
         self.status.setText(s["verifying"])
         QtWidgets.QApplication.processEvents()
-        ok, msg = verify_api_settings(
-            self.model_edit.text().strip(),
-            self.api_edit.text().strip(),
-            api_key,
-        )
+        with TRACER.span("verify_api_settings", model=self.model_edit.text().strip()):
+            ok, msg = verify_api_settings(
+                self.model_edit.text().strip(),
+                self.api_edit.text().strip(),
+                api_key,
+            )
         if ok:
-            self.status.setText(msg or s["verify_success"])
+            self.wizard.login_cache = build_login_cache_entry(
+                self.model_edit.text().strip(), self.api_edit.text().strip(), api_key)
+            self.status.setText((msg or s["verify_success"]) + (f"\n{unlisted}" if unlisted else ""))
             return True
         else:
-            self.status.setText(s["verify_fail"].format(msg))
+            self.status.setText(s["verify_fail"].format(msg) + (f"\n{unlisted}" if unlisted else ""))
             return False
 
     def on_skip(self):
@@ -852,6 +1226,13 @@ class ConfigPage(QtWidgets.QWizardPage):
         self.wizard.model = self.model_edit.text().strip()
         self.wizard.api_base = _normalize_base_url_for_openai(self.api_edit.text().strip())
         self.wizard.api_key = self.key_edit.text().strip()
+        self.wizard.route_mode = "auto" if self.route_check.isChecked() else "off"
+        self.wizard.route_fast_model = self.route_fast_combo.currentText().strip()
+        self.wizard.route_strong_model = self.route_strong_combo.currentText().strip()
+        self.wizard.local_api_url = self.local_edit.text().strip()
+        self.wizard.local_model = self.local_model_edit.text().strip()
+        self.wizard.spill_threshold_ms = self.spill_spin.value()
+        self.wizard.login_cache = ""
         if self.skip:
             return True
         return self.verify()
@@ -867,11 +1248,19 @@ class DelayPage(QtWidgets.QWizardPage):
         self.spin = QtWidgets.QSpinBox()
         self.spin.setRange(0, 60000)
         self.spin.setSuffix(" ms")
+        self.deadline_spin = QtWidgets.QSpinBox()
+        self.deadline_spin.setRange(0, 30000)
+        self.deadline_spin.setSingleStep(250)
+        self.deadline_spin.setSuffix(" ms")
+        self.deadline_hint = QtWidgets.QLabel()
+        self.deadline_hint.setWordWrap(True)
         self.form = QtWidgets.QFormLayout()
         self.form.addRow("", self.spin)
+        self.form.addRow("", self.deadline_spin)
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(self.intro)
         layout.addLayout(self.form)
+        layout.addWidget(self.deadline_hint)
         self.setLayout(layout)
 
     def initializePage(self):
@@ -880,10 +1269,16 @@ class DelayPage(QtWidgets.QWizardPage):
         self.intro.setText(s["delay_intro"])
         self.form.setItem(0, QtWidgets.QFormLayout.ItemRole.LabelRole, QtWidgets.QLabel(s["delay_label"]))
         self.spin.setValue(self.wizard.delay_ms)
+        self.form.setItem(1, QtWidgets.QFormLayout.ItemRole.LabelRole, QtWidgets.QLabel(s["delay_deadline_label"]))
+        self.deadline_spin.setSpecialValueText(s["delay_deadline_off"])
+        self.deadline_spin.setValue(self.wizard.deadline_ms)
+        self.deadline_spin.setEnabled(self.wizard.has_context_variant)
+        self.deadline_hint.setText(s["delay_deadline_hint"])
         set_button_texts_for(self.wizard)
 
     def validatePage(self):
         self.wizard.delay_ms = self.spin.value()
+        self.wizard.deadline_ms = self.deadline_spin.value()
         return True
 
 class RetryPage(QtWidgets.QWizardPage):
@@ -926,21 +1321,32 @@ class ContextPage(QtWidgets.QWizardPage):
         self.length_spin.setSingleStep(500)
         self.length_hint = QtWidgets.QLabel()
         self.length_hint.setWordWrap(True)
+        self.adaptive_check = QtWidgets.QCheckBox()
+        self.adaptive_hint = QtWidgets.QLabel()
+        self.adaptive_hint.setWordWrap(True)
         self.trunc_label = QtWidgets.QLabel()
         self.trunc_combo = QtWidgets.QComboBox()
         self.cache_label = QtWidgets.QLabel()
         self.cache_combo = QtWidgets.QComboBox()
         self.cache_hint = QtWidgets.QLabel()
         self.cache_hint.setWordWrap(True)
+        self.targets_label = QtWidgets.QLabel()
+        self.targets_edit = QtWidgets.QLineEdit()
+        self.targets_hint = QtWidgets.QLabel()
+        self.targets_hint.setWordWrap(True)
         form = QtWidgets.QFormLayout()
         form.addRow(self.length_label, self.length_spin)
+        form.addRow("", self.adaptive_check)
         form.addRow(self.trunc_label, self.trunc_combo)
         form.addRow(self.cache_label, self.cache_combo)
+        form.addRow(self.targets_label, self.targets_edit)
         layout = QtWidgets.QVBoxLayout()
         layout.addWidget(self.intro)
         layout.addLayout(form)
         layout.addWidget(self.length_hint)
+        layout.addWidget(self.adaptive_hint)
         layout.addWidget(self.cache_hint)
+        layout.addWidget(self.targets_hint)
         self.setLayout(layout)
 
     def initializePage(self):
@@ -960,6 +1366,9 @@ class ContextPage(QtWidgets.QWizardPage):
         self.length_spin.setSpecialValueText(s.get("context_length_auto", "Auto"))
         self.length_spin.setValue(int(self.wizard.context_token_budget))
         self.length_hint.setText(s["context_length_hint"])
+        self.adaptive_check.setText(s["context_adaptive_check"])
+        self.adaptive_check.setChecked(self.wizard.context_budget_mode == "adaptive")
+        self.adaptive_hint.setText(s["context_adaptive_hint"])
         self.trunc_label.setText(s["context_trunc_label"])
         self.trunc_combo.clear()
         self.trunc_combo.addItem(s["context_trunc_drop_oldest"], "drop_oldest")
@@ -973,6 +1382,7 @@ class ContextPage(QtWidgets.QWizardPage):
         self.cache_label.setText(s["context_cache_label"])
         self.cache_combo.clear()
         self.cache_combo.addItem(s["context_cache_auto"], "auto")
+        self.cache_combo.addItem(s["context_cache_chain"], "chain")
         self.cache_combo.addItem(s["context_cache_off"], "off")
         cache_mode = getattr(self.wizard, "context_cache_mode", "auto") or "auto"
         cache_index = self.cache_combo.findData(cache_mode)
@@ -981,17 +1391,24 @@ class ContextPage(QtWidgets.QWizardPage):
         else:
             self.cache_combo.setCurrentIndex(0)
         self.cache_hint.setText(s["context_cache_hint"])
+        self.targets_label.setText(s["context_targets_label"])
+        self.targets_edit.setPlaceholderText("ja, ko")
+        self.targets_edit.setText(self.wizard.extra_target_langs)
+        self.targets_hint.setText(s["context_targets_hint"])
 
     def validatePage(self):
         if not self.wizard.has_context_variant:
             return True
         self.wizard.context_token_budget = self.length_spin.value()
+        self.wizard.context_budget_mode = "adaptive" if self.adaptive_check.isChecked() else "fixed"
         data = self.trunc_combo.currentData()
         if data:
             self.wizard.context_truncation_mode = data
         cache_data = self.cache_combo.currentData()
         if cache_data:
             self.wizard.context_cache_mode = cache_data
+        langs = [lang.strip() for lang in self.targets_edit.text().split(",") if lang.strip()]
+        self.wizard.extra_target_langs = ",".join(dict.fromkeys(langs))
         return True
 
 class DebugPage(QtWidgets.QWizardPage):
@@ -1056,6 +1473,16 @@ class ProgressPage(QtWidgets.QWizardPage):
             self.wizard.context_token_budget,
             self.wizard.context_truncation_mode,
             self.wizard.context_cache_mode,
+            self.wizard.route_mode,
+            self.wizard.route_fast_model,
+            self.wizard.route_strong_model,
+            self.wizard.deadline_ms,
+            self.wizard.extra_target_langs,
+            self.wizard.login_cache,
+            self.wizard.local_api_url,
+            self.wizard.local_model,
+            self.wizard.spill_threshold_ms,
+            self.wizard.context_budget_mode,
         )
         self.thread.progress.connect(self.append_text)
         self.thread.ask_file_exists.connect(self.on_ask_file_exists)
@@ -1142,6 +1569,16 @@ class InstallerWizard(QtWidgets.QWizard):
         self.context_token_budget = 6000
         self.context_truncation_mode = "drop_oldest"
         self.context_cache_mode = "auto"
+        self.context_budget_mode = "fixed"
+        self.route_mode = "off"
+        self.route_fast_model = API_PROVIDERS["gpt-5-nano"]["model"]
+        self.route_strong_model = API_PROVIDERS["gpt-5"]["model"]
+        self.deadline_ms = 0
+        self.extra_target_langs = ""
+        self.login_cache = ""
+        self.local_api_url = ""
+        self.local_model = ""
+        self.spill_threshold_ms = 2000
         self.has_context_variant = True
 
         self.setWizardStyle(QtWidgets.QWizard.WizardStyle.ModernStyle)
@@ -1173,7 +1610,48 @@ def set_high_dpi_attrs_if_available():
     except Exception:
         pass
 
+def run_headless(argv):
+    parser = argparse.ArgumentParser(description="PotPlayer ChatGPT Translate headless install")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--trace", action="store_true", help=f"Write tools\\{TRACE_FILE_NAME} (Chrome trace JSON)")
+    parser.add_argument("--install-dir", required=True)
+    parser.add_argument("--variant", action="append", choices=["with_context", "without_context"])
+    parser.add_argument("--language", default="en", choices=sorted(LANGUAGE_STRINGS))
+    parser.add_argument("--api-key", default="")
+    parser.add_argument("--model", default=API_PROVIDERS["gpt-5-nano"]["model"])
+    parser.add_argument("--api-base", default=API_PROVIDERS["gpt-5-nano"]["api_base"])
+    parser.add_argument("--delay-ms", type=int, default=0)
+    parser.add_argument("--retry-mode", type=int, default=0)
+    parser.add_argument("--context-budget", type=int, default=6000)
+    parser.add_argument("--context-truncation", default="drop_oldest")
+    parser.add_argument("--cache-mode", default="auto")
+    parser.add_argument("--adaptive-budget", action="store_true", help="Tune the context budget to observed latency")
+    parser.add_argument("--local-url", default="", help="LAN server tried before the cloud endpoint")
+    parser.add_argument("--local-model", default="")
+    parser.add_argument("--spill-ms", type=int, default=2000)
+    parser.add_argument("--no-overwrite", action="store_true", help="Cancel instead of overwriting existing files")
+    parser.add_argument("--register", action="store_true", help="Write the uninstaller and registry entry")
+    args = parser.parse_args(argv)
+
+    if args.register and not is_admin():
+        print(LANGUAGE_STRINGS["en"]["admin_required"])
+        return 1
+    app = QtCore.QCoreApplication(sys.argv[:1])  # noqa: F841 - QThread / QObject need an application instance
+    thread = HeadlessInstallThread(
+        args.install_dir, args.variant or ["with_context"], os.path.dirname(os.path.abspath(__file__)),
+        args.language, args.api_key, args.model, args.api_base, args.delay_ms, args.retry_mode, False,
+        args.context_budget, args.context_truncation, args.cache_mode,
+        local_api_url=args.local_url, local_model=args.local_model, spill_threshold_ms=args.spill_ms,
+        context_budget_mode="adaptive" if args.adaptive_budget else "fixed",
+        overwrite=not args.no_overwrite, register=args.register,
+    )
+    thread.progress.connect(lambda msg: print(msg) if msg != "DONE" else None)
+    thread.run()
+    return 0 if thread.files_installed else 1
+
 def main():
+    if "--headless" in sys.argv:
+        sys.exit(run_headless(sys.argv[1:]))
     set_high_dpi_attrs_if_available()
     app = QtWidgets.QApplication(sys.argv)
 
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+"""Performance regression benchmarks for the installer and the plugin logic ports.
+
+Each case is timed over several rounds and its median is compared with
+``benchmarks_baseline.json``. The run fails (exit code 1) when any case is
+slower than its baseline by more than ``--threshold``. Results are written as
+JSON so runs can be collected for trend tracking.
+
+Every run also times a fixed pure-Python ``calibration`` workload, at the
+start and again at the end (averaged), and each case is compared as a
+multiple of it. A machine that is busier or clocked
+lower than when the baseline was recorded slows the calibration as much as
+the cases, so that drift cancels out. Shared or virtualised machines still
+vary by about 10-20% per case between runs once normalised. That is why the
+default threshold is 25% and ``--update-baseline`` stores the median of
+``--runs`` whole suite runs (default 5) rather than a single run. Each of
+those runs starts in a fresh interpreter, as a gate run does.
+
+Cases:
+  * ``apply_preconfig`` on both bundled ``.as`` files
+  * installer startup: ``load_json_text`` + ``_format_language_strings``
+  * token-limit resolution for every model named in ``model_token_limits.json``
+  * directory detection (``scan_shortcuts``) over a synthetic profile tree
+  * context selection + chat payload building at 10 to 2048 history lines
+  * request-body escaping before/after the cached escaped history, at the
+    same sizes: ``escape_rebuild_before_N`` ports the old six-pass
+    ``JsonEscape`` over the whole rebuilt system prompt, ``escape_rebuild_after_N``
+    escapes only the new line in one pass and joins the escaped history onto
+    the cached escaped prefix
+
+The installer cases import ``releases/build/installer.py`` and so need its
+Windows build environment (PyQt6, pywin32, openai). Elsewhere they are
+reported as skipped and only the portable cases run.
+
+Example:
+    python tools/benchmarks.py --out bench_results.json
+    python tools/benchmarks.py --update-baseline --runs 5
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from translate_core import (  # noqa: E402
+    BUILD_DIR, REPO_ROOT, Translator, build_system_prompt, load_token_limits, resolve_token_limit,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+HISTORY_SIZES = (10, 64, 256, 1024, 2048)
+PLUGIN_FILES = ("SubtitleTranslate - ChatGPT.as", "SubtitleTranslate - ChatGPT - Without Context.as")
+DEFAULT_THRESHOLD = 0.25
+
+# ========= Timing =========
+
+def measure(run, setup=None, rounds=15, min_seconds=0.02):
+    """Median seconds per call of ``run``; ``setup`` runs untimed before every call."""
+    loops = 1
+    while True:
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(loops):
+            run()
+        if time.perf_counter() - started >= min_seconds or setup or loops >= 1 << 16:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(rounds):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append((time.perf_counter() - started) / loops)
+    return statistics.median(samples), min(samples)
+
+
+# ========= Cases =========
+
+def _import_installer():
+    sys.path.insert(0, BUILD_DIR)
+    try:
+        import installer  # noqa: F401
+    except Exception as e:  # winreg / PyQt6 / pywin32 / openai outside the Windows build env
+        return None, f"{type(e).__name__}: {e}"
+    return installer, ""
+
+
+def _synthetic_history(count, seed=7):
+    rng = random.Random(seed)
+    words = ("we", "should", "leave", "before", "the", "storm", "hits", "captain", "I", "told", "you",
+             "never", "again", "where", "is", "she", "going", "tonight", "listen", "to", "me")
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(3, 14))).capitalize() + rng.choice(".?!")
+            for _ in range(count)]
+
+
+def calibration():
+    """Fixed interpreter-bound workload every case is normalised by."""
+    rows = [{"index": i, "text": "line %d" % i, "tags": ["a", "b"]} for i in range(200)]
+
+    def run():
+        total = 0
+        for row in rows:
+            total += len(json.dumps(row)) + len(row["text"].upper().split())
+        return total
+
+    return ("calibration", run, None)
+
+
+def context_cases():
+    cases = []
+    for size in HISTORY_SIZES:
+        history = _synthetic_history(size)
+        translator = Translator(model="gpt-5-nano", api_key="", context_budget=6000)
+
+        def run(history=history, translator=translator):
+            messages = translator.build_messages("Get down, now!", "", "zh-CN", history)
+            json.dumps({"model": translator.model, "messages": messages}, ensure_ascii=False)
+
+        cases.append((f"context_payload_{size}", run, None))
+    return cases
+
+
+_JSON_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t", "/": "\\/"}
+
+
+def json_escape_six_pass(text):
+    """Port of the plugin's JsonEscape before the single-pass rewrite."""
+    for raw in ("\\", '"', "\n", "\r", "\t", "/"):
+        text = text.replace(raw, _JSON_ESCAPES[raw])
+    return text
+
+
+def json_escape_single_pass(text):
+    """Port of the plugin's current JsonEscape: one scan, unchanged runs copied whole."""
+    parts = []
+    run_start = 0
+    for i, ch in enumerate(text):
+        replacement = _JSON_ESCAPES.get(ch)
+        if replacement is None:
+            continue
+        if i > run_start:
+            parts.append(text[run_start:i])
+        parts.append(replacement)
+        run_start = i + 1
+    if run_start == 0:
+        return text
+    parts.append(text[run_start:])
+    return "".join(parts)
+
+
+def escape_cases():
+    cases = []
+    text = 'He said "get down" - now!'
+    model = "gpt-5-nano"
+    for size in HISTORY_SIZES:
+        # Every fourth line quoted / with a slash so both escapers have work to do
+        history = [f'"{line}"' if i % 4 == 0 else line.replace(" ", " / ", 1) if i % 4 == 2 else line
+                   for i, line in enumerate(_synthetic_history(size))]
+
+        def before(history=history):
+            # Join the raw history, then escape the whole system prompt and the line on every request
+            context = "\n".join(history)
+            system = json_escape_six_pass(build_system_prompt("", "zh-CN", context))
+            user = json_escape_six_pass(text)
+            return ('{"model":"' + model + '","messages":[{"role":"system","content":"' + system
+                    + '"},{"role":"user","content":"' + user + '"}]}')
+
+        escaped_history = [json_escape_single_pass(line) for line in history]
+        escaped_prefix = json_escape_single_pass(build_system_prompt("", "zh-CN"))
+
+        def after(escaped_history=escaped_history, escaped_prefix=escaped_prefix):
+            # Only the incoming line is escaped; the history mirror and prefix are reused
+            user = json_escape_single_pass(text)
+            system = (escaped_prefix + "\\nSubtitle context (older to newer):\\n" + "\\n".join(escaped_history)
+                      + "\\n\\nDo not translate or repeat any context entries.")
+            return ('{"model":"' + model + '","messages":[{"role":"system","content":"' + system
+                    + '"},{"role":"user","content":"' + user + '"}]}')
+
+        if before() != after():
+            raise AssertionError(f"escape_rebuild_{size}: before/after payloads differ")
+        cases.append((f"escape_rebuild_before_{size}", before, None))
+        cases.append((f"escape_rebuild_after_{size}", after, None))
+    return cases
+
+
+def token_limit_cases():
+    limits = load_token_limits()
+    models = [rule["value"] for rule in limits.get("rules", []) if rule.get("value")]
+    # Dated and suffixed variants exercise the prefix / contains fall-through as well
+    models += [m + "-2025-08-07" for m in models] + ["unknown-model"]
+
+    def run():
+        for model in models:
+            resolve_token_limit(model, limits)
+
+    return [(f"token_limits_{len(models)}_models", run, None)]
+
+
+def installer_cases(installer, workdir):
+    cases = []
+    for name in PLUGIN_FILES:
+        source = os.path.join(REPO_ROOT, name)
+        target = os.path.join(workdir, name)
+        with open(source, "rb") as f:
+            original = f.read()
+
+        def setup(target=target, original=original):
+            with open(target, "wb") as f:
+                f.write(original)
+
+        with_context = "Without" not in name
+        # Same shape as _apply_preconfig: context-only settings stay None for the Without Context variant
+        context = dict(context_budget="6000", context_truncation="drop_oldest", context_cache_mode="auto",
+                       local_api_url="http://127.0.0.1:8080/v1", local_model="qwen2.5-7b-instruct",
+                       spill_threshold_ms="2000", context_budget_mode="adaptive") if with_context else {}
+
+        def run(target=target, context=context):
+            installer.apply_preconfig(target, "sk-bench", "gpt-5-nano", "https://api.openai.com/v1/chat/completions",
+                                      0, 0, False, token_limits_json=installer.MODEL_TOKEN_LIMITS_JSON,
+                                      route_mode="off", route_fast_model="", route_strong_model="",
+                                      deadline_ms="0", extra_target_langs="", login_cache="",
+                                      request_profiles_json=installer.MODEL_REQUEST_PROFILES_JSON,
+                                      langid_json=installer.LANGUAGE_ID_JSON, **context)
+
+        label = "with_context" if with_context else "without_context"
+        cases.append((f"apply_preconfig_{label}", run, setup))
+
+    def startup():
+        strings = json.loads(installer.load_json_text("language_strings.json"))
+        installer._format_language_strings(strings)
+        installer.load_json_text("model_token_limits.json")
+        installer.load_json_text("model_request_profiles.json")
+        installer.load_json_text("language_id.json")
+        installer.load_json_text("api_providers.json")
+
+    cases.append(("installer_startup_json", startup, None))
+
+    def model_limits():
+        for rule in installer.MODEL_TOKEN_LIMITS.get("rules", []):
+            installer.resolve_model_token_limit(rule.get("value", "") + "-2025-08-07")
+
+    cases.append(("installer_token_limits", model_limits, None))
+
+    profile = _build_profile_tree(os.path.join(workdir, "profile"))
+
+    def detect():
+        saved = {k: os.environ.get(k) for k in ("USERPROFILE", "APPDATA")}
+        os.environ["USERPROFILE"] = profile
+        os.environ["APPDATA"] = os.path.join(profile, "AppData", "Roaming")
+        try:
+            installer.scan_shortcuts()
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+    cases.append(("scan_shortcuts_synthetic_tree", detect, None))
+    return cases
+
+
+def _build_profile_tree(root, dirs=60, files_per_dir=25):
+    """Desktop plus a Start Menu with many program folders and no PotPlayer shortcut (worst case)."""
+    start_menu = os.path.join(root, "AppData", "Roaming", "Microsoft", "Windows", "Start Menu", "Programs")
+    for base in (os.path.join(root, "Desktop"), start_menu):
+        for d in range(dirs):
+            folder = os.path.join(base, f"Program {d:03d}")
+            os.makedirs(folder, exist_ok=True)
+            for n in range(files_per_dir):
+                ext = ".lnk" if n % 5 == 0 else ".url"
+                with open(os.path.join(folder, f"Item {n:02d}{ext}"), "w") as f:
+                    f.write("")
+    return root
+
+
+# ========= Runner =========
+
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(), "machine": platform.machine()}
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_suite(args):
+    workdir = tempfile.mkdtemp(prefix="potplayer_bench_")
+    try:
+        cases = [calibration()] + context_cases() + escape_cases() + token_limit_cases()
+        skipped = {}
+        installer, reason = _import_installer()
+        if installer is not None:
+            cases += installer_cases(installer, workdir)
+        else:
+            skipped["installer"] = reason
+        if args.filter:
+            cases = [c for c in cases if c[0] == "calibration" or args.filter in c[0]]
+
+        results = {}
+        for name, run, setup in cases:
+            median, best = measure(run, setup, rounds=args.rounds)
+            results[name] = {"median_us": round(median * 1e6, 2), "min_us": round(best * 1e6, 2)}
+            print(f"{name:<36} {results[name]['median_us']:>12.2f} us")
+        # Time the calibration again at the end and average, so one burst at
+        # the start cannot rescale every case
+        _, run, _ = cases[0]
+        median, best = measure(run, rounds=args.rounds)
+        first = results["calibration"]
+        first["median_us"] = round((first["median_us"] + median * 1e6) / 2, 2)
+        first["min_us"] = round(min(first["min_us"], best * 1e6), 2)
+        return results, skipped
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    base_cases = baseline.get("cases", {})
+    # Compare in units of the calibration workload when both runs have it
+    scale = 1.0
+    if results.get("calibration") and base_cases.get("calibration", {}).get("median_us"):
+        scale = base_cases["calibration"]["median_us"] / results["calibration"]["median_us"]
+    for name, result in results.items():
+        base = base_cases.get(name)
+        if name == "calibration":
+            result["status"] = "reference"
+            continue
+        if not base:
+            result["status"] = "new"
+            continue
+        ratio = result["median_us"] * scale / base["median_us"] if base["median_us"] else 1.0
+        result["baseline_us"] = base["median_us"]
+        result["ratio"] = round(ratio, 3)
+        result["status"] = "regressed" if ratio > 1 + threshold else "ok"
+        if result["status"] == "regressed":
+            regressions.append(name)
+    return regressions
+
+
+def _run_fresh_suite(args):
+    """One suite run in a new interpreter, so it starts as cold as a gate run does.
+
+    Repeating the suite in-process is biased fast: the allocator keeps large
+    blocks from the previous run (glibc raises its mmap threshold after the
+    first big free), which halves some of the big-string payload cases.
+    """
+    fd, out = tempfile.mkstemp(prefix="potplayer_bench_", suffix=".json")
+    os.close(fd)
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--rounds", str(args.rounds),
+                        "--filter", args.filter, "--baseline", "", "--out", out], check=True)
+        with open(out, "r", encoding="utf-8") as f:
+            return json.load(f)["cases"]
+    finally:
+        os.remove(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark installer and plugin-logic code paths")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown over the baseline median (0.25 = 25%%)")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store the median of --runs suite runs as the new baseline")
+    parser.add_argument("--runs", type=int, default=5, help="Suite runs medianed by --update-baseline")
+    parser.add_argument("--out", default="", help="Write the JSON results here as well")
+    args = parser.parse_args(argv)
+
+    results, skipped = run_suite(args)
+    if args.update_baseline and args.runs > 1:
+        runs = [results] + [_run_fresh_suite(args) for _ in range(args.runs - 1)]
+        for name, result in results.items():
+            medians = [r[name]["median_us"] for r in runs]
+            result["median_us"] = round(statistics.median(medians), 2)
+            result["spread"] = round(max(medians) / min(medians), 3) if min(medians) else 1.0
+            print(f"{name:<36} {result['median_us']:>12.2f} us  (median of {len(runs)} runs, spread {result['spread']:.2f}x)")
+    baseline = load_baseline(args.baseline)
+    if baseline.get("machine") and baseline["machine"] != machine_info():
+        print("Note: baseline was recorded on a different machine; compare trends, not absolute numbers.")
+    regressions = [] if args.update_baseline else compare(results, baseline, args.threshold)
+
+    report = {"timestamp": int(time.time()), "machine": machine_info(), "threshold": args.threshold,
+              "cases": results, "skipped": skipped, "regressions": regressions}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        cases = dict(baseline.get("cases", {}))
+        cases.update({name: {"median_us": r["median_us"]} for name, r in results.items()})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"machine": machine_info(), "cases": cases}, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+    for name, reason in skipped.items():
+        print(f"Skipped {name} cases: {reason}")
+    if regressions:
+        print("Regressed beyond threshold: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Styling markup removal and restoration (port of the plugin's StripCueMarkup).
+
+ASS override blocks (``{\\an8}``, ``{\\i1}``) and HTML-ish tags (``<i>``,
+``<font color="#ffff00">``) are lifted out of a cue before it is sent and put
+back into the translation afterwards: at the start or end of the same line
+when the line counts agree, otherwise at the same relative position.
+"""
+
+_WORD_SNAP = 6
+
+
+def _tag_length(text, pos):
+    c = text[pos]
+    if c == "{":
+        for i in range(pos + 1, len(text)):
+            if text[i] == "}":
+                return i - pos + 1
+            if text[i] == "\n":
+                return 0
+        return 0
+    if c != "<" or pos + 2 >= len(text):
+        return 0
+    n = text[pos + 1]
+    if not (("a" <= n <= "z") or ("A" <= n <= "Z") or n == "/"):
+        return 0
+    for i in range(pos + 1, min(len(text), pos + 64)):
+        if text[i] == ">":
+            return i - pos + 1
+        if text[i] in "<\n":
+            return 0
+    return 0
+
+
+def strip_markup(text):
+    """Return ``(plain, marks)``; ``marks`` is a list of ``(offset in plain, tags)`` runs."""
+    marks = []
+    parts = []
+    plain_len = 0
+    run_start = 0
+    i = 0
+    while i < len(text):
+        length = _tag_length(text, i)
+        if not length:
+            i += 1
+            continue
+        parts.append(text[run_start:i])
+        plain_len += i - run_start
+        tag = text[i:i + length]
+        if marks and marks[-1][0] == plain_len:
+            marks[-1] = (plain_len, marks[-1][1] + tag)
+        else:
+            marks.append((plain_len, tag))
+        i += length
+        run_start = i
+    if not marks:
+        return text, []
+    parts.append(text[run_start:])
+    plain = "".join(parts)
+
+    lead = len(plain) - len(plain.lstrip(" \t"))
+    plain = plain.strip(" \t")
+    merged = []
+    for pos, tag in marks:
+        pos = min(max(pos - lead, 0), len(plain))
+        if merged and merged[-1][0] == pos:
+            merged[-1] = (pos, merged[-1][1] + tag)
+        else:
+            merged.append((pos, tag))
+    return plain, merged
+
+
+def _map_position(pos, plain, translation, closing):
+    src_lines = plain.split("\n")
+    dst_lines = translation.split("\n")
+    src_start, src_end = 0, len(plain)
+    dst_start, dst_end = 0, len(translation)
+    if len(src_lines) == len(dst_lines):
+        src_line = plain.count("\n", 0, pos)
+        src_start = sum(len(line) + 1 for line in src_lines[:src_line])
+        src_end = src_start + len(src_lines[src_line])
+        dst_start = sum(len(line) + 1 for line in dst_lines[:src_line])
+        dst_end = dst_start + len(dst_lines[src_line])
+        if pos == src_start:
+            return dst_start
+        if pos == src_end:
+            return dst_end
+
+    at = dst_start + (pos - src_start) * (dst_end - dst_start) // (src_end - src_start)
+    for d in range(_WORD_SNAP + 1):
+        right, left = at + d, at - d
+        if right < dst_end and translation[right] == " ":
+            space = right
+        elif dst_start < left < dst_end and translation[left] == " ":
+            space = left
+        else:
+            continue
+        # "<i>word" and "word</i>" hug the word, not the space
+        return space if closing else space + 1
+    return at
+
+
+def restore_markup(translation, plain, marks):
+    """Reinsert the runs recorded by ``strip_markup(source)`` into a translation of ``plain``."""
+    if not marks:
+        return translation
+    prefix, suffix, parts = "", "", []
+    copied = 0
+    for pos, tag in marks:
+        if pos <= 0:
+            prefix += tag
+        elif pos >= len(plain):
+            suffix += tag
+        else:
+            at = max(_map_position(pos, plain, translation, tag.startswith("</")), copied)
+            parts.append(translation[copied:at] + tag)
+            copied = at
+    return prefix + "".join(parts) + translation[copied:] + suffix
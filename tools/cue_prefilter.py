@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Find cues that need no translation, the way the plugin's pre-filter does.
+
+``classify`` mirrors ``ClassifyNoTranslationCue`` in the context plugin: a
+cue with only digits, punctuation and symbols (``♪``, ``...``), one whose
+letters all sit in sound-effect tags (``[door slams]``, ``(gasps)``,
+``*sighs*``), a lone speaker tag (``NARRATOR:``) and, when the source
+language is auto-detected, a cue already written in the target language is
+shown as-is without a request. Target-language detection uses the letter
+scripts of the cue and the stop words and Han variant markers in
+``language_id.json``, the table the installer injects into the plugin.
+
+Run over subtitle files, the tool reports the skip rate per reason and the
+API calls the pre-filter saves, with sample cues for each reason.
+
+Example:
+    python tools/cue_prefilter.py ep01.srt ep02.ass --lang zh-CN --out prefilter_report.json
+    python tools/cue_prefilter.py movie.en.srt --lang en --samples 5
+    python tools/cue_prefilter.py --check
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cue_markup import strip_markup  # noqa: E402
+from subtitle_io import read_cues  # noqa: E402
+from translate_core import load_build_json  # noqa: E402
+
+REASONS = ("symbols", "sound", "speaker", "target")
+LATIN, GREEK, CYRILLIC, HEBREW, ARABIC, DEVANAGARI, THAI, HANGUL, KANA, HAN, OTHER = range(11)
+_OPENING = {0x28, 0x5B, 0x7B, 0xFF08, 0xFF3B, 0x3010, 0x3014}
+_CLOSING = {0x29, 0x5D, 0x7D, 0xFF09, 0xFF3D, 0x3011, 0x3015}
+_SCRIPT_TARGETS = {"ja": None, "ko": HANGUL, "el": GREEK, "he": HEBREW, "th": THAI}
+# (cue, dst_lang, expected reason) checked by --check; dialogue that merely ends in a colon must be sent
+CHECK_CASES = (
+    ("NARRATOR:", "en", "speaker"),
+    ("MAN #2:", "zh-CN", "speaker"),
+    ("【旁白】：", "en", "sound"),
+    ("[door slams]", "zh-CN", "sound"),
+    ("♪ ♪", "zh-CN", "symbols"),
+    ("我告诉你：", "en", ""),
+    ("听着：", "en", ""),
+    ("聞いてください：", "en", ""),
+    ("Слушай:", "en", ""),
+    ("THE RULES ARE:", "zh-CN", ""),
+    ("Listen:", "zh-CN", ""),
+)
+
+# ========= Classifier (mirrors the plugin's pre-filter functions) =========
+
+def letter_script(cp):
+    """Script index of a letter code point, or -1 for digits, punctuation, symbols and marks."""
+    if cp < 0x80:
+        return LATIN if (65 <= cp <= 90 or 97 <= cp <= 122) else -1
+    if cp < 0xC0 or cp in (0xD7, 0xF7):
+        return -1
+    if cp < 0x250 or 0x1E00 <= cp < 0x1F00 or 0xFF21 <= cp <= 0xFF3A or 0xFF41 <= cp <= 0xFF5A:
+        return LATIN
+    if cp < 0x370:
+        return -1
+    if cp < 0x400:
+        return GREEK
+    if cp < 0x530:
+        return CYRILLIC
+    if 0x5D0 <= cp < 0x5F0:
+        return HEBREW
+    if (0x620 <= cp <= 0x64A or 0x66E <= cp <= 0x6D3 or 0x6FA <= cp < 0x700 or 0x750 <= cp < 0x780
+            or 0xFB50 <= cp < 0xFE00 or 0xFE70 <= cp < 0xFF00):
+        return ARABIC
+    if 0x900 <= cp < 0x964:
+        return DEVANAGARI
+    if 0xE01 <= cp < 0xE4F:
+        return THAI
+    if 0x1100 <= cp < 0x1200 or 0x3130 <= cp < 0x3190 or 0xAC00 <= cp < 0xD7A4:
+        return HANGUL
+    if (0x3040 <= cp < 0x3100 and cp != 0x30FB) or 0x31F0 <= cp < 0x3200 or 0xFF66 <= cp < 0xFFA0:
+        return KANA
+    if 0x3400 <= cp < 0x4DC0 or 0x4E00 <= cp < 0xA000 or 0xF900 <= cp < 0xFB00 or 0x20000 <= cp < 0x40000:
+        return HAN
+    if 0x2000 <= cp < 0x2C00 or 0x3000 <= cp < 0x3040 or 0xE000 <= cp < 0xF900 or cp >= 0xFE00:
+        return -1
+    if 0x591 <= cp < 0x5D0 or 0x600 <= cp < 0x700:
+        return -1
+    return OTHER
+
+
+def load_language_id():
+    return load_build_json("language_id.json")
+
+
+def _ascii_lower(text):
+    return "".join(chr(ord(c) + 32) if "A" <= c <= "Z" else c for c in text)
+
+
+def letter_case(cp):
+    """1 for a capital, 2 for a lowercase letter, 0 for scripts without case."""
+    if 65 <= cp <= 90 or 0xC0 <= cp <= 0xDE:
+        return 1
+    if 97 <= cp <= 122 or 0xDF <= cp <= 0xFF:
+        return 2
+    if 0x100 <= cp < 0x250 or 0x1E00 <= cp < 0x1F00:
+        # Upper/lower pairs; these two runs put the capital on the odd code point
+        odd_upper = 0x139 <= cp <= 0x148 or 0x179 <= cp <= 0x17E
+        return 1 if (cp % 2 == 1) == odd_upper else 2
+    if 0x391 <= cp <= 0x3AB or 0x400 <= cp <= 0x42F or 0xFF21 <= cp <= 0xFF3A:
+        return 1
+    if 0x3AC <= cp <= 0x3CE or 0x430 <= cp <= 0x45F or 0xFF41 <= cp <= 0xFF5A:
+        return 2
+    if 0x460 <= cp < 0x530:
+        return 1 if cp % 2 == 0 else 2
+    return 0
+
+
+def _is_speaker_tag(trimmed, letters, upper, lower, scripts):
+    # Han, Kana and Hangul have no case; a name in them only counts in brackets, which is a sound tag
+    if letters > 24 or not upper or lower or "\n" in trimmed or scripts[HANGUL] + scripts[KANA] + scripts[HAN]:
+        return False
+    return trimmed.endswith((":", "：")) and trimmed.count(" ") + 1 <= 2
+
+
+def guess_language(text, table):
+    """Language whose stop words make up most of ``text``, or ``""`` for short cues and close calls."""
+    entries = [(e["lang"].lower(), set(e["words"].split())) for e in table.get("stop_words", []) if e.get("words")]
+    if not entries:
+        return ""
+    words = []
+    current = []
+    for ch in text + " ":
+        script = letter_script(ord(ch))
+        if 0 <= script <= DEVANAGARI or script == OTHER or (current and ch in "'’"):
+            current.append(ch)
+        elif current:
+            words.append(_ascii_lower("".join(current)))
+            current = []
+    if len(words) < table.get("min_words", 3):
+        return ""
+    hits = [sum(1 for w in words if w in stop) for _, stop in entries]
+    best = max(range(len(hits)), key=lambda i: hits[i])
+    second = max((h for i, h in enumerate(hits) if i != best), default=0)
+    if hits[best] < 2 or hits[best] * 100 < len(words) * table.get("min_share", 34) or hits[best] <= second * 2:
+        return ""
+    return entries[best][0]
+
+
+def matches_han_variant(text, lang, table):
+    """True when ``text`` has a character only ``lang``'s Chinese variant writes and none of the others'."""
+    variants = {e["lang"].lower(): e["chars"] for e in table.get("han_variants", []) if e.get("chars")}
+    if lang not in variants:
+        return False
+    own_seen = False
+    for ch in text:
+        if letter_script(ord(ch)) != HAN:
+            continue
+        for code, chars in variants.items():
+            if ch in chars:
+                if code != lang:
+                    return False
+                own_seen = True
+    return own_seen
+
+
+def is_target_language(text, dst_lang, scripts, letters, table):
+    lang = dst_lang.strip().lower()
+    base = lang.split("-", 1)[0] if lang.find("-") > 0 else lang
+    if base == "ja":
+        return scripts[KANA] > 0 and (scripts[KANA] + scripts[HAN]) * 10 >= letters * 9
+    if base in _SCRIPT_TARGETS:
+        return scripts[_SCRIPT_TARGETS[base]] * 10 >= letters * 9
+    if base == "zh":
+        return (scripts[HAN] * 10 >= letters * 9 and not scripts[HANGUL] and not scripts[KANA]
+                and matches_han_variant(text, lang, table))
+    if scripts[HANGUL] + scripts[KANA] + scripts[HAN]:
+        return False
+    return guess_language(text, table) == base
+
+
+def classify(text, src_lang, dst_lang, table=None):
+    """Reason the cue needs no request (one of ``REASONS``), or ``""`` to translate it.
+
+    ``text`` is the cue without styling markup; an empty ``src_lang`` means Auto Detect.
+    """
+    scripts = [0] * 11
+    letters = outside = upper = lower = depth = 0
+    starred = False
+    for ch in text:
+        cp = ord(ch)
+        if cp in _OPENING:
+            depth += 1
+        elif cp in _CLOSING and depth > 0:
+            depth -= 1
+        elif cp == 0x2A:
+            starred = not starred
+        script = letter_script(cp)
+        if script < 0:
+            continue
+        scripts[script] += 1
+        letters += 1
+        if depth == 0 and not starred:
+            outside += 1
+        case = letter_case(cp)
+        upper += case == 1
+        lower += case == 2
+    if letters == 0:
+        return "symbols"
+    # An unclosed bracket or asterisk is part of a sentence, not an effect tag
+    if outside == 0 and depth == 0 and not starred:
+        return "sound"
+    if _is_speaker_tag(text.strip(), letters, upper, lower, scripts):
+        return "speaker"
+    if not src_lang and is_target_language(text, dst_lang, scripts, letters, table or {}):
+        return "target"
+    return ""
+
+
+# ========= Report =========
+
+def scan_file(path, args, table):
+    cues = read_cues(path)
+    counts = dict.fromkeys(REASONS, 0)
+    samples = {reason: [] for reason in REASONS}
+    empty = 0
+    for cue in cues:
+        plain = strip_markup(cue.text)[0]
+        if not plain.strip():
+            # Markup-only cues never reach the pre-filter; the plugin returns them before it
+            empty += 1
+            continue
+        reason = classify(plain, args.src_lang, args.lang, table)
+        if reason:
+            counts[reason] += 1
+            if len(samples[reason]) < args.samples:
+                samples[reason].append(plain)
+    return {"file": path, "cues": len(cues), "markup_only": empty, "skipped": sum(counts.values()),
+            "by_reason": counts, "samples": samples}
+
+
+def _ratio(part, whole):
+    return round(part / whole, 3) if whole else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report which cues the plugin's pre-filter shows without a request")
+    parser.add_argument("subtitles", nargs="*")
+    parser.add_argument("--lang", default="zh-CN", help="Target language, as selected in PotPlayer")
+    parser.add_argument("--src-lang", default="", help="Source language (default: Auto Detect)")
+    parser.add_argument("--samples", type=int, default=3, help="Sample cues per reason and file")
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    parser.add_argument("--check", action="store_true", help="Classify CHECK_CASES and exit 1 on a mismatch")
+    args = parser.parse_args(argv)
+
+    table = load_language_id()
+    if args.check:
+        failed = [(text, lang, expected, classify(text, "", lang, table)) for text, lang, expected in CHECK_CASES
+                  if classify(text, "", lang, table) != expected]
+        for text, lang, expected, got in failed:
+            print(f"{text!r} -> {lang}: expected {expected!r}, got {got!r}")
+        print(json.dumps({"cases": len(CHECK_CASES), "failed": len(failed)}))
+        sys.exit(1 if failed else 0)
+    if not args.subtitles:
+        parser.error("give subtitle files to scan, or --check")
+    files = [scan_file(path, args, table) for path in args.subtitles]
+    translatable = sum(f["cues"] - f["markup_only"] for f in files)
+    skipped = sum(f["skipped"] for f in files)
+    total = {
+        "cues": sum(f["cues"] for f in files),
+        "cues_checked": translatable,
+        "skipped": skipped,
+        "skip_ratio": _ratio(skipped, translatable),
+        "api_calls_without_prefilter": translatable,
+        "api_calls_with_prefilter": translatable - skipped,
+        "api_calls_saved": skipped,
+        "by_reason": {reason: sum(f["by_reason"][reason] for f in files) for reason in REASONS},
+    }
+    for f in files:
+        f["skip_ratio"] = _ratio(f["skipped"], f["cues"] - f["markup_only"])
+    report = {"lang": args.lang, "src_lang": args.src_lang or "Auto Detect", "total": total, "per_file": files}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
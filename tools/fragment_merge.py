@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Sentence-fragment detection, grouping and proportional splitting.
+
+Long sentences are often spread over two or three cues. ``plan_groups``
+joins a cue that ends mid-sentence with the cues that finish it, as long as
+the last of them starts within ``hold_ms`` of the first, so the whole
+sentence can be translated in one request. ``split_translation`` cuts the
+reply back into one part per cue, sized in proportion to the source
+fragments and snapped to the nearest word or clause boundary.
+"""
+
+import re
+
+DEFAULT_HOLD_MS = 2500
+DEFAULT_MAX_CUES = 3
+
+_TERMINAL = ".!?。！？…♪\"'”’」』)）]"
+_CONTINUES = ",，、;；:：-–—"
+_TRAILING_WORDS = {
+    "a", "an", "and", "as", "at", "because", "but", "by", "for", "from", "if", "in", "into", "is", "of", "on",
+    "or", "so", "than", "that", "the", "to", "was", "were", "when", "where", "which", "while", "who", "with",
+    "your", "my", "our", "their", "his", "her",
+}
+_LAST_WORD = re.compile(r"([A-Za-z']+)\W*$")
+_SPEAKER_DASH = re.compile(r"^\s*[-–—]\s", re.MULTILINE)
+_SNAP = 8
+_BREAKS = " ，、,;；:："
+
+
+def _flat(text):
+    return " ".join(text.split())
+
+
+def is_unfinished(text):
+    """True when the cue reads as the first part of a sentence that continues in the next cue."""
+    flat = _flat(text)
+    if not flat:
+        return False
+    if flat.endswith(("...", "…")):
+        # Trailing off is as often a finished line as a continued one; the next cue decides
+        return False
+    last = flat[-1]
+    if last in _CONTINUES:
+        return True
+    if last in _TERMINAL:
+        return False
+    m = _LAST_WORD.search(flat)
+    if m and m.group(1).lower() in _TRAILING_WORDS:
+        return True
+    # No terminal punctuation at all: typical of split lines in Latin-script subtitles
+    return last.isalnum()
+
+
+def continues(previous, text):
+    """True when ``text`` can carry on the sentence left open by ``previous``."""
+    flat = _flat(text)
+    # Two-speaker cues ("- Me?\n- Yes.") are exchanges, not halves of one sentence
+    if not flat or _SPEAKER_DASH.search(text) or _SPEAKER_DASH.search(previous):
+        return False
+    if flat.startswith(("...", "…")):
+        return True
+    if not is_unfinished(previous):
+        return False
+    prev = _flat(previous)
+    m = _LAST_WORD.search(prev)
+    open_ended = prev[-1] in _CONTINUES or (m is not None and m.group(1).lower() in _TRAILING_WORDS)
+    # Without a comma or dangling word, a capitalised start is usually a new sentence ("I" excepted)
+    if not open_ended and flat[0].isupper() and not re.match(r"I\b", flat):
+        return False
+    return True
+
+
+def plan_groups(cues, hold_ms=DEFAULT_HOLD_MS, max_cues=DEFAULT_MAX_CUES):
+    """Group cue indexes into sentences; ``cues`` need ``text`` and ``start_ms``. Singletons stay alone."""
+    groups = []
+    current = []
+    for i, cue in enumerate(cues):
+        if current:
+            first = cues[current[0]]
+            if (len(current) < max_cues and cue.start_ms - first.start_ms <= hold_ms
+                    and continues(cues[current[-1]].text, cue.text)):
+                current.append(i)
+                continue
+            groups.append(current)
+        current = [i]
+    if current:
+        groups.append(current)
+    return groups
+
+
+def merged_text(texts):
+    parts = [_flat(t) for t in texts]
+    # "I was going to..." + "...tell you" reads as one sentence without the ellipses
+    for i in range(1, len(parts)):
+        if parts[i].startswith(("...", "…")) and parts[i - 1].endswith(("...", "…")):
+            parts[i - 1] = parts[i - 1].rstrip(".…").rstrip()
+            parts[i] = parts[i].lstrip(".…").lstrip()
+    return " ".join(p for p in parts if p)
+
+
+def _snap(translation, at, lo, hi):
+    for d in range(_SNAP + 1):
+        for pos in (at + d, at - d):
+            if lo < pos < hi and translation[pos - 1] in _BREAKS:
+                return pos
+    return at
+
+
+def split_translation(translation, texts):
+    """Cut ``translation`` into ``len(texts)`` parts sized like the source fragments."""
+    if len(texts) <= 1:
+        return [translation]
+    weights = [max(1, len(_flat(t))) for t in texts]
+    total = sum(weights)
+    cuts = []
+    done = 0
+    previous = 0
+    for weight in weights[:-1]:
+        done += weight
+        at = round(len(translation) * done / total)
+        at = _snap(translation, at, previous, len(translation))
+        at = max(at, previous)
+        cuts.append(at)
+        previous = at
+    parts = []
+    start = 0
+    for cut in cuts + [len(translation)]:
+        parts.append(translation[start:cut].strip())
+        start = cut
+    return parts
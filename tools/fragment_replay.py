@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Replay recorded subtitle streams to validate sentence-fragment merging.
+
+Cues are grouped with ``fragment_merge.plan_groups`` (the rules the
+prefetch proxy uses with ``--merge-fragments``) and the report compares
+requests per minute of dialogue with and without merging, the hold time a
+first fragment waits for the rest of its sentence, and sample groups. With
+``--live`` every cue is also translated both ways, one request per cue and
+one request per merged sentence split back across its cues, so the outputs
+can be compared side by side.
+
+Example:
+    python tools/fragment_replay.py ep01.srt ep02.srt --hold-ms 2500 --out fragment_report.json
+    python tools/fragment_replay.py ep01.srt --live --lang zh-CN --samples 20
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fragment_merge import (  # noqa: E402
+    DEFAULT_HOLD_MS, DEFAULT_MAX_CUES, is_unfinished, merged_text, plan_groups, split_translation,
+)
+from subtitle_io import read_cues  # noqa: E402
+from translate_core import DEFAULT_API_BASE, DEFAULT_CONTEXT_BUDGET, TranslationError, Translator  # noqa: E402
+
+HISTORY_WINDOW = 2048
+
+
+def _per_minute(count, minutes):
+    return round(count / minutes, 2) if minutes > 0 else 0.0
+
+
+def replay_file(path, args, translator=None):
+    cues = read_cues(path)
+    groups = plan_groups(cues, args.hold_ms, args.max_cues)
+    merged = [g for g in groups if len(g) > 1]
+    holds = [cues[g[-1]].start_ms - cues[g[0]].start_ms for g in merged]
+    minutes = (cues[-1].end_ms - cues[0].start_ms) / 60000.0 if cues else 0.0
+    stats = {
+        "file": path,
+        "cues": len(cues),
+        "dialogue_minutes": round(minutes, 2),
+        "unfinished_cues": sum(1 for cue in cues if is_unfinished(cue.text)),
+        "merged_groups": len(merged),
+        "cues_in_merged_groups": sum(len(g) for g in merged),
+        "requests_per_cue": len(cues),
+        "requests_merged": len(groups),
+        "requests_per_minute_per_cue": _per_minute(len(cues), minutes),
+        "requests_per_minute_merged": _per_minute(len(groups), minutes),
+        "hold_ms_median": round(statistics.median(holds)) if holds else 0,
+        "hold_ms_max": max(holds) if holds else 0,
+        "samples": [],
+    }
+    for group in merged[:args.samples]:
+        stats["samples"].append({"cues": [cues[i].text for i in group],
+                                 "merged": merged_text([cues[i].text for i in group])})
+    if translator is not None:
+        stats.update(translate_both(cues, groups, merged[:args.samples], stats["samples"], translator, args))
+    return stats
+
+
+def translate_both(cues, groups, sample_groups, samples, translator, args):
+    texts = [cue.text for cue in cues]
+    per_cue = {}
+    started = time.perf_counter()
+    errors = 0
+    for i, text in enumerate(texts):
+        try:
+            per_cue[i] = translator.translate_raw(text, args.src_lang, args.lang, texts[max(0, i - HISTORY_WINDOW):i])
+        except TranslationError:
+            errors += 1
+    per_cue_seconds = time.perf_counter() - started
+
+    split = {}
+    started = time.perf_counter()
+    for group in groups:
+        first = group[0]
+        parts = [texts[i] for i in group]
+        try:
+            reply = translator.translate_raw(merged_text(parts), args.src_lang, args.lang,
+                                             texts[max(0, first - HISTORY_WINDOW):first])
+        except TranslationError:
+            errors += 1
+            continue
+        for i, part in zip(group, split_translation(reply, parts) if len(group) > 1 else [reply]):
+            split[i] = part
+    merged_seconds = time.perf_counter() - started
+
+    for sample, group in zip(samples, sample_groups):
+        sample["per_cue"] = [per_cue.get(i, "") for i in group]
+        sample["merged_split"] = [split.get(i, "") for i in group]
+    return {"live_seconds_per_cue": round(per_cue_seconds, 2), "live_seconds_merged": round(merged_seconds, 2),
+            "live_errors": errors}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay subtitles to measure sentence-fragment merging")
+    parser.add_argument("subtitles", nargs="+")
+    parser.add_argument("--hold-ms", type=int, default=DEFAULT_HOLD_MS,
+                        help="Longest wait from a fragment's start to the last cue merged with it")
+    parser.add_argument("--max-cues", type=int, default=DEFAULT_MAX_CUES)
+    parser.add_argument("--samples", type=int, default=10, help="Merged groups to include in the report")
+    parser.add_argument("--live", action="store_true", help="Also translate every cue both ways")
+    parser.add_argument("--lang", default="zh-CN")
+    parser.add_argument("--src-lang", default="")
+    parser.add_argument("--model", default="gpt-5-nano")
+    parser.add_argument("--api-base", default=DEFAULT_API_BASE)
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET)
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    translator = None
+    if args.live:
+        translator = Translator(model=args.model, api_base=args.api_base, api_key=args.api_key,
+                                context_budget=args.context_budget)
+    files = [replay_file(path, args, translator) for path in args.subtitles]
+    total = {key: sum(f[key] for f in files)
+             for key in ("cues", "unfinished_cues", "merged_groups", "requests_per_cue", "requests_merged")}
+    minutes = sum(f["dialogue_minutes"] for f in files)
+    total["requests_per_minute_per_cue"] = _per_minute(total["requests_per_cue"], minutes)
+    total["requests_per_minute_merged"] = _per_minute(total["requests_merged"], minutes)
+    total["requests_saved_ratio"] = (round(1 - total["requests_merged"] / total["requests_per_cue"], 3)
+                                     if total["requests_per_cue"] else 0.0)
+    report = {"hold_ms": args.hold_ms, "max_cues": args.max_cues, "total": total, "per_file": files}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Measure what gzip-compressed request bodies save on the wire.
+
+Cues from the given subtitle files (or a synthetic episode) are turned into
+the chat/completions bodies the context plugin would send with the given
+context budget, and each body is uploaded twice to an in-process stand-in
+over a throttled uplink: once as-is and once through ``GzipPolicy``, a port
+of the plugin's ``PostRequestBody``. The report has bytes on the wire and
+upload time for both modes. The policy is also replayed against a stand-in
+that rejects ``Content-Encoding: gzip`` to show that the probe costs one
+extra request and every later body goes out uncompressed.
+
+Example:
+    python tools/gzip_savings.py ep01.srt --budget 12000 --uplink-kbps 2000 --out gzip_report.json
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from proxy_common import JsonHandler, parse_plugin_request, synthesize_response  # noqa: E402
+from subtitle_io import iter_cues  # noqa: E402
+from translate_core import Translator  # noqa: E402
+
+DEFAULT_MIN_BYTES = 16384
+HISTORY_WINDOW = 2048
+_CHUNK = 4096
+
+# ========= Stand-in =========
+
+class StandIn:
+    def __init__(self, accepts_gzip=True):
+        self.accepts_gzip = accepts_gzip
+        self.requests = 0
+        self.wire_bytes = 0
+        self._lock = threading.Lock()
+
+
+def make_handler(standin):
+    class Handler(JsonHandler):
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            raw = self.read_body()
+            with standin._lock:
+                standin.requests += 1
+                standin.wire_bytes += len(raw)
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                if not standin.accepts_gzip:
+                    self.send_json(415, {"error": {"message": "Unsupported Content-Encoding: gzip"}})
+                    return
+                try:
+                    raw = gzip.decompress(raw)
+                except OSError:
+                    self.send_json(400, {"error": {"message": "Corrupt gzip body"}})
+                    return
+            req = parse_plugin_request(self.path, raw)
+            if req is None:
+                self.send_json(400, {"error": {"message": "Bad request"}})
+                return
+            self.send_bytes(200, synthesize_response(req.kind, req.model, req.user_text))
+
+    return Handler
+
+
+def start_standin(standin):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(standin))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ========= Client =========
+
+class Uplink:
+    """One keep-alive connection whose request bodies are paced to ``kbps``."""
+
+    def __init__(self, port, kbps):
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.conn.connect()
+        # Headers and body go out as separate writes; without this, delayed ACKs dominate the timing
+        self.conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.bytes_per_second = kbps * 1000 / 8.0 if kbps > 0 else 0
+
+    def post(self, body, compressed=False):
+        """Returns (status, response body, seconds from first byte sent to reply read)."""
+        started = time.perf_counter()
+        self.conn.putrequest("POST", "/v1/chat/completions")
+        self.conn.putheader("Content-Type", "application/json")
+        self.conn.putheader("Content-Length", str(len(body)))
+        if compressed:
+            self.conn.putheader("Content-Encoding", "gzip")
+        self.conn.endheaders()
+        for i in range(0, len(body), _CHUNK):
+            chunk = body[i:i + _CHUNK]
+            self.conn.send(chunk)
+            if self.bytes_per_second:
+                time.sleep(len(chunk) / self.bytes_per_second)
+        resp = self.conn.getresponse()
+        data = resp.read()
+        return resp.status, data, time.perf_counter() - started
+
+    def close(self):
+        self.conn.close()
+
+
+def is_accepted_response(status, data):
+    if status != 200:
+        return False
+    try:
+        root = json.loads(data.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        return False
+    return isinstance(root, dict) and "error" not in root
+
+
+class GzipPolicy:
+    """Port of ``PostRequestBody``: probe once per endpoint, then compress or not from the cache."""
+
+    def __init__(self, min_bytes=DEFAULT_MIN_BYTES):
+        self.min_bytes = min_bytes
+        self.endpoints = {}
+        self.events = []
+
+    def post(self, uplink, endpoint, body):
+        """Returns (bytes sent, seconds, requests made)."""
+        known = self.endpoints.get(endpoint)
+        if self.min_bytes <= 0 or len(body) < self.min_bytes or known is False:
+            _, _, seconds = uplink.post(body)
+            return len(body), seconds, 1
+        compressed = gzip.compress(body)
+        if len(compressed) >= len(body):
+            _, _, seconds = uplink.post(body)
+            return len(body), seconds, 1
+        status, data, seconds = uplink.post(compressed, compressed=True)
+        if known or is_accepted_response(status, data):
+            if known is None:
+                self.endpoints[endpoint] = True
+                self.events.append({"endpoint": endpoint, "accepts_gzip": True})
+            return len(compressed), seconds, 1
+        status, data, plain_seconds = uplink.post(body)
+        if is_accepted_response(status, data):
+            self.endpoints[endpoint] = False
+            self.events.append({"endpoint": endpoint, "accepts_gzip": False})
+        return len(compressed) + len(body), seconds + plain_seconds, 2
+
+
+# ========= Replay =========
+
+def _synthetic_cues(count=600):
+    lines = ("Where were you last night?", "I told you, I was at the station until midnight.",
+             "The captain wants the report on his desk by morning.", "We can't keep running from them forever.",
+             "Listen to me. Nobody leaves this room until we know who took it.", "Fine.")
+    return [lines[i % len(lines)] + ("" if i % 7 else f" That was {i // 7} days ago.") for i in range(count)]
+
+
+def build_bodies(paths, budget, lang, model):
+    translator = Translator(model=model, api_key="", context_budget=budget)
+    texts = []
+    for path in paths:
+        texts.extend(cue.text for cue in iter_cues(path))
+    if not texts:
+        texts = _synthetic_cues()
+    history = []
+    for text in texts:
+        messages = translator.build_messages(text, "", lang, history[-HISTORY_WINDOW:])
+        yield json.dumps({"model": model, "messages": messages}, ensure_ascii=False).encode("utf-8")
+        history.append(text)
+
+
+def replay(bodies, accepts_gzip, min_bytes, kbps):
+    standin = StandIn(accepts_gzip)
+    server = start_standin(standin)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    uplink = Uplink(server.server_address[1], kbps)
+    policy = GzipPolicy(min_bytes)
+    totals = {"cues": 0, "compressed_cues": 0, "bytes_plain": 0, "bytes_sent": 0, "requests": 0,
+              "upload_s_plain": 0.0, "upload_s_sent": 0.0}
+    try:
+        for body in bodies:
+            _, _, plain_seconds = uplink.post(body)
+            sent, seconds, requests = policy.post(uplink, endpoint, body)
+            totals["cues"] += 1
+            totals["compressed_cues"] += 1 if sent != len(body) and requests == 1 else 0
+            totals["bytes_plain"] += len(body)
+            totals["bytes_sent"] += sent
+            totals["requests"] += requests
+            totals["upload_s_plain"] += plain_seconds
+            totals["upload_s_sent"] += seconds
+    finally:
+        uplink.close()
+        server.shutdown()
+    totals["bytes_saved_ratio"] = (round((totals["bytes_plain"] - totals["bytes_sent"]) / totals["bytes_plain"], 4)
+                                   if totals["bytes_plain"] else 0.0)
+    totals["upload_ms_saved"] = round((totals["upload_s_plain"] - totals["upload_s_sent"]) * 1000)
+    totals["upload_s_plain"] = round(totals["upload_s_plain"], 3)
+    totals["upload_s_sent"] = round(totals["upload_s_sent"], 3)
+    totals["probe"] = policy.events
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare plain and gzip request bodies against a local stand-in")
+    parser.add_argument("paths", nargs="*", help="Subtitle files to replay (default: a synthetic episode)")
+    parser.add_argument("--budget", type=int, default=6000, help="Context token budget, as pre_context_token_budget")
+    parser.add_argument("--lang", default="zh-CN")
+    parser.add_argument("--model", default="gpt-5-nano")
+    parser.add_argument("--min-bytes", type=int, default=DEFAULT_MIN_BYTES, help="As gzip= in the login token")
+    parser.add_argument("--uplink-kbps", type=int, default=2000, help="Simulated uplink speed (0 = unthrottled)")
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    bodies = list(build_bodies(args.paths, args.budget, args.lang, args.model))
+    report = {"budget": args.budget, "min_bytes": args.min_bytes, "uplink_kbps": args.uplink_kbps,
+              "accepting_endpoint": replay(bodies, True, args.min_bytes, args.uplink_kbps),
+              "rejecting_endpoint": replay(bodies, False, args.min_bytes, args.uplink_kbps)}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""Shared translation cache for several PotPlayer machines on one network.
+
+``serve`` runs a service that the plugin's ``pre_apiUrl`` (or the API URL in
+the login token) can point at, e.g.
+``http://192.168.1.10:8768/v1/chat/completions``. It speaks the same
+chat/completions and Responses protocol as the provider. Requests are keyed
+on the model, the target language, the cue, a digest of the prompt
+instructions and a digest of the last ``--context-lines`` context entries.
+Machines playing the same episode therefore share one upstream call per cue.
+Identical requests that arrive while the first is still upstream wait for
+that call instead of making their own (single flight). Finished
+translations live in an LRU store bounded by ``--max-bytes`` and can be
+saved to ``--store`` on exit.
+
+Chained Responses turns (``previous_response_id``) and bodies the service
+cannot read are forwarded unchanged. Cached Responses replies carry a local
+id, so the plugin stops chaining against this endpoint and sends full
+context instead. Everyone who can reach the service shares its
+translations, whatever API key they send.
+
+``check`` starts an upstream stand-in and the service in-process, replays
+one episode from several simulated machines at once and reports hit ratio,
+coalesced requests and upstream calls avoided.
+
+Example:
+    python tools/lan_cache.py serve --upstream https://api.openai.com/v1 --host 0.0.0.0 --store lan_cache.jsonl
+    python tools/lan_cache.py check --machines 4 --cues 80 --out lan_cache_report.json
+
+``GET /cache/stats`` reports hits, coalesced requests, upstream calls and evictions.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from proxy_common import (  # noqa: E402
+    JsonHandler, extract_reply_text, forward, parse_plugin_request, synthesize_response, upstream_url,
+)
+from subtitle_io import read_cues  # noqa: E402
+from translate_core import Translator  # noqa: E402
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_CONTEXT_LINES = 3
+CONTEXT_MARKER = "\nSubtitle context (older to newer):\n"
+CONTEXT_END = "\n\nDo not translate or repeat any context entries."
+HISTORY_WINDOW = 2048
+
+# ========= Keys =========
+
+def _normalize(text):
+    return " ".join(text.split()).lower()
+
+
+def _digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def split_system_prompt(system_text):
+    """Returns (instructions, context entries); anything after the context block counts as instructions."""
+    start = system_text.find(CONTEXT_MARKER)
+    if start < 0:
+        return system_text, []
+    body = system_text[start + len(CONTEXT_MARKER):]
+    end = body.find(CONTEXT_END)
+    if end < 0:
+        return system_text[:start], [line for line in body.split("\n") if line.strip()]
+    # A translation-memory hint follows the context block and changes the reply, so it stays in the key
+    instructions = system_text[:start] + body[end + len(CONTEXT_END):]
+    return instructions, [line for line in body[:end].split("\n") if line.strip()]
+
+
+def cache_key(req, context_lines=DEFAULT_CONTEXT_LINES):
+    instructions, context = split_system_prompt(req.system_text)
+    recent = context[-context_lines:] if context_lines > 0 else []
+    return (req.model, _normalize(req.dst_lang), _normalize(req.user_text),
+            _digest(_normalize(instructions)), _digest("\n".join(_normalize(line) for line in recent)))
+
+
+# ========= Cache =========
+
+class _Flight:
+    """One upstream call that identical concurrent requests wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.status = 502
+        self.body = b""
+        self.text = ""
+
+
+class LanCache:
+    def __init__(self, upstream, max_bytes=DEFAULT_MAX_BYTES, context_lines=DEFAULT_CONTEXT_LINES,
+                 upstream_timeout=120.0):
+        self.upstream = upstream
+        self.max_bytes = max_bytes
+        self.context_lines = context_lines
+        self.upstream_timeout = upstream_timeout
+        self.entries = OrderedDict()   # key -> translated text, most recently used last
+        self.bytes = 0
+        self.flights = {}              # key -> _Flight
+        self.counters = {"requests": 0, "hits": 0, "coalesced": 0, "upstream_calls": 0, "upstream_errors": 0,
+                         "passthrough": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data.update(entries=len(self.entries), bytes=self.bytes, max_bytes=self.max_bytes,
+                        in_flight=len(self.flights))
+        avoided = data["hits"] + data["coalesced"]
+        data["upstream_calls_avoided"] = avoided
+        data["hit_ratio"] = round(avoided / data["requests"], 3) if data["requests"] else 0.0
+        return data
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @staticmethod
+    def _entry_size(key, text):
+        return sum(len(part.encode("utf-8")) for part in key) + len(text.encode("utf-8"))
+
+    def _store_locked(self, key, text):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= self._entry_size(key, old)
+        self.entries[key] = text
+        self.bytes += self._entry_size(key, text)
+        while self.bytes > self.max_bytes and self.entries:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.bytes -= self._entry_size(evicted_key, evicted)
+            self.counters["evictions"] += 1
+
+    def handle(self, req, headers):
+        """Return (status, body) for a cacheable request."""
+        key = cache_key(req, self.context_lines)
+        with self._lock:
+            self.counters["requests"] += 1
+            text = self.entries.get(key)
+            if text is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return 200, synthesize_response(req.kind, req.model, text)
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self.flights[key] = flight
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            flight.done.wait(self.upstream_timeout + 5)
+            if flight.text:
+                return 200, synthesize_response(req.kind, req.model, flight.text)
+            return flight.status, flight.body
+
+        try:
+            flight.status, flight.body = forward(upstream_url(self.upstream, req.kind), req.raw, headers,
+                                                 self.upstream_timeout)
+            if flight.status == 200:
+                try:
+                    flight.text = extract_reply_text(req.kind, json.loads(flight.body.decode("utf-8")))
+                except (UnicodeDecodeError, ValueError):
+                    flight.text = ""
+        finally:
+            with self._lock:
+                self.counters["upstream_calls"] += 1
+                if flight.text:
+                    self._store_locked(key, flight.text)
+                else:
+                    self.counters["upstream_errors"] += 1
+                self.flights.pop(key, None)
+            flight.done.set()
+        return flight.status, flight.body
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with self._lock:
+            items = list(self.entries.items())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for key, text in items:
+                f.write(json.dumps({"key": list(key), "text": text}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+        return len(items)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f, self._lock:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._store_locked(tuple(entry["key"]), entry["text"])
+        return len(self.entries)
+
+
+def make_handler(cache):
+    class Handler(JsonHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/cache/stats":
+                self.send_json(200, cache.stats())
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            raw = self.read_body()
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                try:
+                    raw = gzip.decompress(raw)
+                except OSError:
+                    self.send_json(400, {"error": {"message": "Corrupt gzip body"}})
+                    return
+            req = parse_plugin_request(self.path, raw)
+            # Copy the headers: the upstream call may be shared with other connections
+            headers = {name: self.headers[name] for name in ("Authorization", "User-Agent") if self.headers.get(name)}
+            if req is None or not req.user_text or req.body.get("previous_response_id"):
+                cache.count("passthrough")
+                status, body = forward(upstream_url(cache.upstream, req.kind if req else "chat"), raw, headers)
+                self.send_bytes(status, body)
+                return
+            status, body = cache.handle(req, headers)
+            self.send_bytes(status, body)
+
+    return Handler
+
+
+def start_server(handler, host, port):
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ========= Check =========
+
+class StandInUpstream:
+    """Provider stand-in with a fixed reply time that counts the calls it gets."""
+
+    def __init__(self, service_ms=300):
+        self.service_ms = service_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+
+
+def make_standin_handler(standin):
+    class Handler(JsonHandler):
+        def do_POST(self):
+            req = parse_plugin_request(self.path, self.read_body())
+            if req is None:
+                self.send_json(400, {"error": {"message": "Bad request"}})
+                return
+            with standin._lock:
+                standin.calls += 1
+            time.sleep(standin.service_ms / 1000.0)
+            self.send_bytes(200, synthesize_response(req.kind, req.model, f"[{req.dst_lang}] {req.user_text}"))
+
+    return Handler
+
+
+def _synthetic_episode(count):
+    lines = ("Where were you last night?", "I told you, I was at the station until midnight.",
+             "The captain wants the report on his desk by morning.", "We can't keep running from them forever.",
+             "Listen to me. Nobody leaves this room until we know who took it.", "Fine.")
+    return [f"{lines[i % len(lines)]} ({i})" for i in range(count)]
+
+
+def _post(url, payload, timeout=60.0):
+    req = urllib.request.Request(url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"), method="POST")
+    req.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return extract_reply_text("chat", json.loads(resp.read().decode("utf-8")))
+
+
+def _play(url, texts, lang, offset_ms, gap_ms, results, index):
+    """One machine playing the episode: cues in order, each with the plugin's context."""
+    translator = Translator(model="gpt-5-nano", api_key="")
+    rng = random.Random(index)
+    time.sleep(offset_ms / 1000.0)
+    replies = []
+    for i, text in enumerate(texts):
+        messages = translator.build_messages(text, "", lang, texts[max(0, i - HISTORY_WINDOW):i])
+        try:
+            replies.append(_post(url, {"model": translator.model, "messages": messages}))
+        except OSError:
+            replies.append(None)
+        time.sleep(gap_ms * rng.uniform(0.5, 1.5) / 1000.0)
+    results[index] = replies
+
+
+def run_check(args):
+    texts = []
+    for path in args.subtitles:
+        texts.extend(cue.text for cue in read_cues(path))
+    texts = (texts or _synthetic_episode(args.cues))[:args.cues]
+    standin = StandInUpstream(args.service_ms)
+    upstream_server = start_server(make_standin_handler(standin), "127.0.0.1", 0)
+    cache = LanCache(f"http://127.0.0.1:{upstream_server.server_address[1]}/v1", args.max_bytes, args.context_lines)
+    cache_server = start_server(make_handler(cache), "127.0.0.1", 0)
+    url = f"http://127.0.0.1:{cache_server.server_address[1]}/v1/chat/completions"
+    results = [None] * args.machines
+    started = time.perf_counter()
+    try:
+        # Machines start within a fraction of a cue of each other, so many requests overlap in flight
+        threads = [threading.Thread(target=_play, args=(url, texts, args.lang, i * args.stagger_ms, args.gap_ms,
+                                                        results, i))
+                   for i in range(args.machines)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        cache_server.shutdown()
+        upstream_server.shutdown()
+    consistent = all(replies == results[0] for replies in results)
+    report = cache.stats()
+    report.update(machines=args.machines, cues=len(texts), standin_calls=standin.calls,
+                  requests_without_cache=args.machines * len(texts), consistent_replies=consistent,
+                  failed_replies=sum(r.count(None) for r in results if r),
+                  wall_seconds=round(time.perf_counter() - started, 2))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared LAN translation cache for the PotPlayer plugin")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run the cache service")
+    serve.add_argument("--upstream", required=True, help="Real API base, e.g. https://api.openai.com/v1")
+    serve.add_argument("--host", default="0.0.0.0", help="Address to listen on (0.0.0.0 = every interface)")
+    serve.add_argument("--port", type=int, default=8768)
+    serve.add_argument("--store", default="", help="JSON Lines file loaded at start and saved on exit")
+    check = sub.add_parser("check", help="Replay an episode from several machines against a stand-in")
+    for p in (serve, check):
+        p.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="Store size before LRU eviction")
+        p.add_argument("--context-lines", type=int, default=DEFAULT_CONTEXT_LINES,
+                       help="Most recent context entries that are part of the key (0 = ignore context)")
+    check.add_argument("subtitles", nargs="*", help="Subtitle files to replay (default: a synthetic episode)")
+    check.add_argument("--machines", type=int, default=4)
+    check.add_argument("--cues", type=int, default=60)
+    check.add_argument("--lang", default="zh-CN")
+    check.add_argument("--service-ms", type=int, default=300, help="Stand-in upstream reply time")
+    check.add_argument("--gap-ms", type=int, default=100, help="Average time between cues on one machine")
+    check.add_argument("--stagger-ms", type=int, default=40, help="Start offset between machines")
+    check.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        cache = LanCache(args.upstream, args.max_bytes, args.context_lines)
+        if args.store:
+            print(f"Loaded {cache.load(args.store)} cached translations from {args.store}")
+        server = ThreadingHTTPServer((args.host, args.port), make_handler(cache))
+        print(f"LAN cache listening on http://{args.host}:{args.port}/v1/chat/completions")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if args.store:
+                print(f"Saved {cache.save(args.store)} cached translations to {args.store}")
+        return 0
+
+    report = run_check(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    return 0 if report["consistent_replies"] and not report["failed_replies"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Deadline-aware proxy that keeps slow translations off the playback path.
+
+Point the plugin's API URL at this helper
+(``http://127.0.0.1:8767/v1/chat/completions``) and set a cue deadline in
+the plugin (``deadline=1500`` in the login token, or the installer's Delay
+page). The plugin sends the remaining budget in ``X-Translate-Deadline-Ms``,
+but only to a loopback or private-LAN API URL, so run the helper on the same
+PC or the LAN. If the provider has not answered in time the proxy replies at
+once with a ``deadline_exceeded`` error, which makes the plugin show the
+source line (or its earlier translation when the same line came up before),
+and keeps the upstream request running. When the same cue is asked for again
+(a subtitle reload, a seek back, the next episode's recap) the late result is
+served from memory.
+
+Example:
+    python tools/latefill_proxy.py --upstream https://api.openai.com/v1 --port 8767
+
+``GET /latefill/stats`` reports met / missed / failed / late-filled counts;
+``met`` counts only successful (HTTP 200) replies that arrived in time.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from proxy_common import (  # noqa: E402
+    JsonHandler, extract_reply_text, forward, parse_plugin_request, synthesize_response, upstream_url,
+)
+
+DEADLINE_HEADER = "X-Translate-Deadline-Ms"
+DEADLINE_EXCEEDED = json.dumps({"error": {"message": "Translation is still running; retry later for the result.",
+                                          "code": "deadline_exceeded"}}).encode("utf-8")
+
+
+def _normalize(text):
+    return " ".join(text.split()).lower()
+
+
+class LateFillCache:
+    """Completed translations plus the upstream requests still in flight."""
+
+    def __init__(self, upstream, max_entries=4096, max_workers=8, upstream_timeout=120.0):
+        self.upstream = upstream
+        self.max_entries = max_entries
+        self.upstream_timeout = upstream_timeout
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self.results = OrderedDict()  # key -> translated text, most recent last
+        self.pending = {}             # key -> Future resolving to (status, body)
+        self.late = set()             # futures that missed a deadline and await their late-fill count
+        self.counters = {"requests": 0, "met": 0, "missed": 0, "late_filled": 0, "cache_hits": 0,
+                         "passthrough": 0, "errors": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data.update(cached=len(self.results), in_flight=len(self.pending))
+        # "failed": upstream answered in time but with an error, so the cue was not translated either
+        judged = data["met"] + data["missed"] + data["failed"]
+        data["met_ratio"] = round(data["met"] / judged, 3) if judged else 0.0
+        return data
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _late_done(self, key, future):
+        # Runs once per future however many callers missed on it; _fetch has stored the result by now
+        with self._lock:
+            self.late.discard(future)
+            if key in self.results:
+                self.counters["late_filled"] += 1
+
+    def _store_locked(self, key, text):
+        self.results[key] = text
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_entries:
+            self.results.popitem(last=False)
+
+    def _fetch(self, key, kind, raw, headers):
+        status, body = forward(upstream_url(self.upstream, kind), raw, headers, self.upstream_timeout)
+        text = ""
+        if status == 200:
+            try:
+                text = extract_reply_text(kind, json.loads(body.decode("utf-8")))
+            except (UnicodeDecodeError, ValueError):
+                text = ""
+        with self._lock:
+            self.pending.pop(key, None)
+            if text:
+                self._store_locked(key, text)
+            else:
+                self.counters["errors"] += 1
+        return status, body
+
+    def handle(self, req, headers, deadline_ms):
+        """Return (status, body) for ``req``, answering by ``deadline_ms`` when one is given."""
+        key = (req.model, req.dst_lang, _normalize(req.user_text))
+        with self._lock:
+            self.counters["requests"] += 1
+            text = self.results.get(key)
+            if text is not None:
+                self.results.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                self.counters["met"] += 1
+                return 200, synthesize_response(req.kind, req.model, text)
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pool.submit(self._fetch, key, req.kind, req.raw, headers)
+                self.pending[key] = future
+        try:
+            status, body = future.result(timeout=deadline_ms / 1000.0 if deadline_ms > 0 else None)
+        except FutureTimeout:
+            with self._lock:
+                self.counters["missed"] += 1
+                first_miss = future not in self.late
+                self.late.add(future)
+            if first_miss:
+                future.add_done_callback(lambda f: self._late_done(key, f))
+            return 504, DEADLINE_EXCEEDED
+        self._count("met" if status == 200 else "failed")
+        return status, body
+
+
+def make_handler(cache):
+    class Handler(JsonHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/latefill/stats":
+                self.send_json(200, cache.stats())
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            raw = self.read_body()
+            req = parse_plugin_request(self.path, raw)
+            if req is None or not req.user_text:
+                cache._count("passthrough")
+                status, body = forward(upstream_url(cache.upstream, req.kind if req else "chat"), raw, self.headers)
+                self.send_bytes(status, body)
+                return
+            try:
+                deadline_ms = int(self.headers.get(DEADLINE_HEADER) or 0)
+            except ValueError:
+                deadline_ms = 0
+            # Copy the headers: the background request can outlive this connection
+            headers = {name: self.headers[name] for name in ("Authorization", "User-Agent") if self.headers.get(name)}
+            status, body = cache.handle(req, headers, deadline_ms)
+            self.send_bytes(status, body)
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deadline-aware late-fill proxy for the PotPlayer plugin")
+    parser.add_argument("--upstream", required=True, help="Real API base, e.g. https://api.openai.com/v1")
+    parser.add_argument("--max-entries", type=int, default=4096, help="Completed translations kept in memory")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent upstream requests")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args(argv)
+
+    cache = LateFillCache(args.upstream, args.max_entries, args.workers)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(cache))
+    print(f"Late-fill proxy listening on http://127.0.0.1:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
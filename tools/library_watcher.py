@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""Background watcher that pre-translates subtitle sidecars in a media library.
+
+New video files with a ``.srt``/``.ass`` sidecar are queued and translated
+with the same prompt and context rules as the installed plugin. Results are
+written next to the source as ``<video>.<lang>.srt`` so PotPlayer picks them
+up directly. Cues the plugin's pre-filter would show as-is (symbols, sound
+tags, lines already in the target language) are copied without a request.
+Progress is checkpointed per file, so a crashed or restarted daemon resumes
+where it stopped.
+
+Example:
+    python tools/library_watcher.py --library "D:\\Media\\Shows" --lang zh-CN \\
+        --provider gpt-5-nano --processes 2 --threads 4 --rate 3 --status-port 8765
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cue_markup import restore_markup, strip_markup  # noqa: E402
+from cue_prefilter import classify, load_language_id  # noqa: E402
+from subtitle_io import Cue, SUBTITLE_EXTS, read_cues, write_srt  # noqa: E402
+from translate_core import (  # noqa: E402
+    DEFAULT_API_BASE, DEFAULT_CONTEXT_BUDGET, DEFAULT_MODEL,
+    Translator, resolve_provider,
+)
+
+VIDEO_EXTS = (".mkv", ".mp4", ".avi", ".mov", ".wmv", ".m4v", ".ts", ".m2ts", ".webm", ".flv")
+HISTORY_WINDOW = 2048          # same upper bound the plugin keeps in subtitleHistory
+CHECKPOINT_EVERY = 10          # cues between checkpoint writes
+FAILED_RETRY_SECONDS = 600
+
+# ========= Global rate limit (shared by every worker process) =========
+
+class RateLimiter:
+    """Spaces requests ``1/rate`` seconds apart across all processes."""
+
+    def __init__(self, rate, lock, next_slot):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = lock
+        self.next_slot = next_slot
+
+    def acquire(self):
+        if self.interval <= 0:
+            return
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# ========= Checkpoints =========
+
+def file_signature(path, settings):
+    st = os.stat(path)
+    return f"{st.st_size}:{int(st.st_mtime)}:{settings['lang']}:{settings['model']}"
+
+
+class Checkpoint:
+    """Per-source JSON file holding the translations finished so far."""
+
+    def __init__(self, state_dir, source, signature):
+        digest = hashlib.sha1(os.path.abspath(source).lower().encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(state_dir, "checkpoints", digest + ".json")
+        self.source = source
+        self.signature = signature
+        self.done = {}
+        self.complete = False
+        self._lock = threading.Lock()
+        self._dirty = 0
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        if data.get("signature") == self.signature:
+            self.done = {int(k): v for k, v in data.get("done", {}).items()}
+            self.complete = bool(data.get("complete"))
+        return self
+
+    def record(self, index, text):
+        with self._lock:
+            self.done[index] = text
+            self._dirty += 1
+            if self._dirty >= CHECKPOINT_EVERY:
+                self._save_locked()
+
+    def save(self, complete=False):
+        with self._lock:
+            self.complete = complete
+            self._save_locked()
+
+    def _save_locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "signature": self.signature, "complete": self.complete,
+                       "done": self.done}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+
+# ========= Worker process =========
+
+_worker_limiter = None
+_worker_counter = None
+
+
+def _init_worker(rate, lock, next_slot, counter):
+    global _worker_limiter, _worker_counter
+    _worker_limiter = RateLimiter(rate, lock, next_slot)
+    _worker_counter = counter
+
+
+def output_path_for(video_path, lang):
+    return os.path.splitext(video_path)[0] + f".{lang}.srt"
+
+
+def translate_file(source, output, settings):
+    """Translate one sidecar, resuming from its checkpoint. Runs in a worker process."""
+    cues = read_cues(source)
+    checkpoint = Checkpoint(settings["state_dir"], source, file_signature(source, settings)).load()
+    translator = Translator(
+        model=settings["model"], api_base=settings["api_base"], api_key=settings["api_key"],
+        context_budget=settings["context_budget"], truncation_mode=settings["truncation_mode"],
+        retries=settings["retries"], rate_limiter=_worker_limiter,
+    )
+    # Styling tags stay out of the prompt and are put back into each translation
+    stripped = [strip_markup(cue.text) for cue in cues]
+    texts = [plain for plain, _ in stripped]
+    table = load_language_id() if settings["prefilter"] else None
+
+    def work(i):
+        if not texts[i].strip() or (table is not None and classify(texts[i], settings["src_lang"], settings["lang"], table)):
+            checkpoint.record(i, cues[i].text)
+        else:
+            history = texts[max(0, i - HISTORY_WINDOW):i]
+            translated = translator.translate(texts[i], settings["src_lang"], settings["lang"], history)
+            checkpoint.record(i, restore_markup(translated, *stripped[i]))
+        if _worker_counter is not None:
+            with _worker_counter.get_lock():
+                _worker_counter.value += 1
+
+    pending = [i for i in range(len(cues)) if i not in checkpoint.done]
+    try:
+        with ThreadPoolExecutor(max_workers=settings["threads"]) as pool:
+            for future in as_completed([pool.submit(work, i) for i in pending]):
+                future.result()
+    finally:
+        checkpoint.save()
+
+    write_srt(output, [Cue(c.index, c.start_ms, c.end_ms, checkpoint.done[c.index]) for c in cues])
+    checkpoint.save(complete=True)
+    return len(pending)
+
+
+# ========= Library scanning =========
+
+def find_sidecar(video_path):
+    stem = os.path.splitext(video_path)[0]
+    for ext in SUBTITLE_EXTS:
+        if os.path.isfile(stem + ext):
+            return stem + ext
+    return None
+
+
+def scan_libraries(libraries, lang, settle_seconds):
+    now = time.time()
+    for library in libraries:
+        for root, _, files in os.walk(library):
+            for name in files:
+                if not name.lower().endswith(VIDEO_EXTS):
+                    continue
+                video = os.path.join(root, name)
+                sidecar = find_sidecar(video)
+                if not sidecar:
+                    continue
+                output = output_path_for(video, lang)
+                if os.path.exists(output):
+                    continue
+                # Skip files that are still being copied into the library
+                if now - os.path.getmtime(sidecar) < settle_seconds:
+                    continue
+                yield sidecar, output
+
+
+# ========= Daemon =========
+
+class LibraryWatcher:
+    def __init__(self, settings):
+        self.settings = settings
+        self.queue = []
+        self.queued = set()
+        self.in_flight = {}
+        self.failed = {}
+        self.files_done = 0
+        self.started = time.time()
+        self.counter = multiprocessing.Value("q", 0)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._samples = []
+
+    def stats(self):
+        with self._lock:
+            cues = self.counter.value
+            now = time.time()
+            self._samples = [s for s in self._samples if now - s[0] <= 300] + [(now, cues)]
+            oldest = self._samples[0]
+            window = now - oldest[0]
+            return {
+                "queue_depth": len(self.queue),
+                "in_flight": len(self.in_flight),
+                "files_done": self.files_done,
+                "files_failed": len(self.failed),
+                "cues_translated": cues,
+                "cues_per_minute": round((cues - oldest[1]) * 60.0 / window, 2) if window > 0 else 0.0,
+                "uptime_seconds": int(now - self.started),
+            }
+
+    def enqueue_new_files(self):
+        now = time.time()
+        for sidecar, output in scan_libraries(self.settings["libraries"], self.settings["lang"],
+                                              self.settings["settle_seconds"]):
+            with self._lock:
+                if sidecar in self.queued or self.failed.get(sidecar, 0) > now:
+                    continue
+                self.queue.append((sidecar, output))
+                self.queued.add(sidecar)
+
+    def write_status(self):
+        path = os.path.join(self.settings["state_dir"], "status.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stats(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def serve_status(self, port):
+        watcher = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(watcher.stats()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def run(self):
+        s = self.settings
+        os.makedirs(s["state_dir"], exist_ok=True)
+        if s["status_port"]:
+            self.serve_status(s["status_port"])
+        lock = multiprocessing.Lock()
+        next_slot = multiprocessing.Value("d", 0.0)
+        with ProcessPoolExecutor(max_workers=s["processes"], initializer=_init_worker,
+                                 initargs=(s["rate"], lock, next_slot, self.counter)) as pool:
+            next_scan = 0.0
+            while not self._stop.is_set():
+                if time.time() >= next_scan:
+                    self.enqueue_new_files()
+                    next_scan = time.time() + s["poll_seconds"]
+                self._dispatch(pool)
+                self._collect()
+                self.write_status()
+                if s["once"] and not self.queue and not self.in_flight:
+                    break
+                time.sleep(0.5)
+
+    def _dispatch(self, pool):
+        with self._lock:
+            while self.queue and len(self.in_flight) < self.settings["processes"]:
+                sidecar, output = self.queue.pop(0)
+                future = pool.submit(translate_file, sidecar, output, self.settings)
+                self.in_flight[future] = sidecar
+
+    def _collect(self):
+        with self._lock:
+            finished = [f for f in self.in_flight if f.done()]
+            for future in finished:
+                sidecar = self.in_flight.pop(future)
+                self.queued.discard(sidecar)
+                try:
+                    future.result()
+                    self.files_done += 1
+                    self.failed.pop(sidecar, None)
+                    print(f"Translated {sidecar}")
+                except Exception as e:  # a worker bug or a broken pool must not take the watcher loop down
+                    self.failed[sidecar] = time.time() + FAILED_RETRY_SECONDS
+                    print(f"Failed {sidecar}: {type(e).__name__}: {e} (will retry, progress kept)")
+
+    def stop(self):
+        self._stop.set()
+
+
+def build_settings(args):
+    model, api_base = DEFAULT_MODEL, DEFAULT_API_BASE
+    if args.provider:
+        model, api_base = resolve_provider(args.provider)
+    return {
+        "libraries": [os.path.abspath(p) for p in args.library],
+        "lang": args.lang,
+        "src_lang": args.src_lang,
+        "model": args.model or model,
+        "api_base": args.api_base or api_base,
+        "api_key": args.api_key or os.environ.get("OPENAI_API_KEY", ""),
+        "context_budget": args.context_budget,
+        "truncation_mode": args.truncation_mode,
+        "retries": args.retries,
+        "prefilter": not args.no_prefilter,
+        "processes": max(1, args.processes),
+        "threads": max(1, args.threads),
+        "rate": args.rate,
+        "poll_seconds": args.poll,
+        "settle_seconds": args.settle,
+        "state_dir": os.path.abspath(args.state_dir),
+        "status_port": args.status_port,
+        "once": args.once,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--library", action="append", required=True, help="Library folder to watch (repeatable)")
+    parser.add_argument("--lang", required=True, help="Target language code, e.g. zh-CN")
+    parser.add_argument("--src-lang", default="", help="Source language code (default: auto detect)")
+    parser.add_argument("--provider", default="", help="API_PROVIDERS preset name, e.g. gpt-5-nano")
+    parser.add_argument("--model", default="")
+    parser.add_argument("--api-base", default="")
+    parser.add_argument("--api-key", default="", help="Defaults to $OPENAI_API_KEY")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET)
+    parser.add_argument("--truncation-mode", choices=("drop_oldest", "smart_trim"), default="drop_oldest")
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--no-prefilter", action="store_true",
+                        help="Also send cues the plugin's pre-filter shows as-is (symbols, sound tags, target language)")
+    parser.add_argument("--processes", type=int, default=2, help="Files translated in parallel")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent requests per file")
+    parser.add_argument("--rate", type=float, default=3.0, help="Global request limit per second (0 = unlimited)")
+    parser.add_argument("--poll", type=float, default=60.0, help="Seconds between library scans")
+    parser.add_argument("--settle", type=float, default=30.0, help="Ignore sidecars modified more recently than this")
+    parser.add_argument("--state-dir", default=os.path.join(os.path.expanduser("~"), ".potplayer_translate_watcher"))
+    parser.add_argument("--status-port", type=int, default=0, help="Serve queue stats as JSON on 127.0.0.1:PORT")
+    parser.add_argument("--once", action="store_true", help="Exit after the current queue is drained")
+    args = parser.parse_args(argv)
+
+    watcher = LibraryWatcher(build_settings(args))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+        print("Stopped; progress is checkpointed.")
+
+
+if __name__ == "__main__":
+    main()
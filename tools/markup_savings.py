@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Measure the prompt tokens saved by keeping styling markup away from the model.
+
+Every cue of the given files (or of every subtitle under the given
+directories) is read with its markup intact, JSON-escaped the way the plugin
+escapes it, and estimated with the plugin's token rule, once as-is and once
+after ``strip_markup``. Files are streamed cue by cue, so a season of
+typeset anime ASS files can be measured in one run. Use ``--track`` to count
+only one ASS style.
+
+Example:
+    python tools/markup_savings.py "D:\\Anime\\Frieren" --out markup_report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cue_markup import strip_markup  # noqa: E402
+from subtitle_io import SUBTITLE_EXTS, iter_cues  # noqa: E402
+from translate_core import estimate_tokens  # noqa: E402
+
+
+def _escaped(text):
+    return json.dumps(text, ensure_ascii=False)[1:-1]
+
+
+def find_subtitles(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(SUBTITLE_EXTS):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def measure_file(path, track=None):
+    stats = {"file": path, "cues": 0, "cues_with_markup": 0, "markup_only": 0,
+             "tokens_raw": 0, "tokens_stripped": 0}
+    for cue in iter_cues(path, track=track, keep_markup=True):
+        plain, marks = strip_markup(cue.text)
+        stats["cues"] += 1
+        if marks:
+            stats["cues_with_markup"] += 1
+        if not plain.strip():
+            # The plugin returns these unchanged without a request
+            stats["markup_only"] += 1
+        else:
+            stats["tokens_stripped"] += estimate_tokens(_escaped(plain))
+        stats["tokens_raw"] += estimate_tokens(_escaped(cue.text))
+    return stats
+
+
+def _saved(stats):
+    saved = stats["tokens_raw"] - stats["tokens_stripped"]
+    stats["tokens_saved"] = saved
+    stats["saved_ratio"] = round(saved / stats["tokens_raw"], 3) if stats["tokens_raw"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Estimate prompt tokens saved by stripping cue markup")
+    parser.add_argument("paths", nargs="+", help="Subtitle files or directories to scan")
+    parser.add_argument("--track", default=None, help="Only count this ASS style")
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    files = []
+    total = {"cues": 0, "cues_with_markup": 0, "markup_only": 0, "tokens_raw": 0, "tokens_stripped": 0}
+    for path in find_subtitles(args.paths):
+        try:
+            stats = _saved(measure_file(path, args.track))
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        files.append(stats)
+        for key in total:
+            total[key] += stats[key]
+    report = {"files": len(files), "total": _saved(total), "per_file": files}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Look-ahead prefetch proxy for live playback.
+
+Point the plugin's API URL at this helper
+(``http://127.0.0.1:8766/v1/chat/completions``) and give it the subtitle
+file being played. Each time the plugin asks for a cue, the proxy finds that
+cue in the file and translates the next ``--lookahead`` cues in the
+background, so later requests are answered from memory instead of waiting
+for a model round trip. A jump in position (seek) discards all speculative
+work. Cues it cannot match are forwarded to the real endpoint unchanged.
+
+With ``--merge-fragments``, a sentence split over consecutive cues is
+prefetched as one request and the reply is split back across its cues (see
+``fragment_merge``), so dialogue with many split lines costs fewer requests.
+
+Example:
+    python tools/prefetch_proxy.py --upstream https://api.openai.com/v1 \\
+        --subtitle "D:\\Media\\ep01.srt" --lookahead 8 --max-inflight 3 --merge-fragments
+
+Switch files while running with
+``POST /prefetch/load {"path": "D:\\Media\\ep02.srt"}``; ``GET /prefetch/stats``
+reports hit ratio and discarded work.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cue_markup import strip_markup  # noqa: E402
+from fragment_merge import DEFAULT_HOLD_MS, merged_text, plan_groups, split_translation  # noqa: E402
+from proxy_common import (  # noqa: E402
+    JsonHandler, bearer_key, forward, parse_plugin_request, synthesize_response, upstream_url,
+)
+from subtitle_io import read_cues  # noqa: E402
+from translate_core import DEFAULT_CONTEXT_BUDGET, TranslationError, Translator  # noqa: E402
+
+HISTORY_WINDOW = 2048
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+class PrefetchEngine:
+    """Tracks the playback position and keeps the next cues translated."""
+
+    def __init__(self, upstream, lookahead=8, max_inflight=3, context_budget=DEFAULT_CONTEXT_BUDGET,
+                 wait_seconds=30.0, merge_hold_ms=0):
+        self.upstream = upstream
+        self.merge_hold_ms = merge_hold_ms
+        self.lookahead = lookahead
+        self.context_budget = context_budget
+        self.wait_seconds = wait_seconds
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_inflight))
+        self.cues = []
+        self.groups = []        # cue index -> indexes translated together (just itself unless merged)
+        self.by_text = {}
+        self.position = -1
+        self.generation = 0
+        self.results = {}       # (generation-independent) cache key -> translation
+        self.pending = {}       # cache key -> Future
+        self.translators = {}
+        self.counters = {"hits": 0, "waited": 0, "misses": 0, "unmatched": 0,
+                         "prefetched": 0, "discarded": 0, "seeks": 0, "errors": 0, "merged_requests_saved": 0}
+        self._lock = threading.Lock()
+
+    def load(self, path):
+        # The plugin sends cues without styling markup, so they are indexed and translated the same way
+        cues = [c._replace(text=strip_markup(c.text)[0]) for c in read_cues(path)]
+        with self._lock:
+            self.cues = [cue.text for cue in cues]
+            self.groups = [[i] for i in range(len(cues))]
+            if self.merge_hold_ms > 0:
+                for group in plan_groups(cues, self.merge_hold_ms):
+                    for i in group:
+                        self.groups[i] = group
+            self.by_text = {}
+            for i, text in enumerate(self.cues):
+                self.by_text.setdefault(_normalize(text), []).append(i)
+            self._discard_locked()
+            self.position = -1
+        return len(cues)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self.counters)
+            data.update(position=self.position, cached=len(self.results), in_flight=len(self.pending),
+                        cues=len(self.cues))
+        served = data["hits"] + data["waited"] + data["misses"]
+        data["hit_ratio"] = round((data["hits"] + data["waited"]) / served, 3) if served else 0.0
+        return data
+
+    def _locate(self, text):
+        matches = self.by_text.get(_normalize(text))
+        if not matches:
+            return -1
+        # Prefer the first occurrence at or after the current position
+        ahead = [i for i in matches if i >= self.position]
+        return ahead[0] if ahead else matches[0]
+
+    def _discard_locked(self):
+        self.generation += 1
+        for future in self.pending.values():
+            if future.cancel():
+                self.counters["discarded"] += 1
+        self.pending.clear()
+        self.counters["discarded"] += len(self.results)
+        self.results.clear()
+
+    def _translator(self, model, api_key):
+        key = (model, api_key)
+        if key not in self.translators:
+            self.translators[key] = Translator(model=model, api_base=self.upstream, api_key=api_key,
+                                               context_budget=self.context_budget, retries=0)
+        return self.translators[key]
+
+    def _schedule_locked(self, index, req, api_key):
+        translator = self._translator(req.model, api_key)
+        generation = self.generation
+        last = min(len(self.cues), index + 1 + self.lookahead)
+        for i in range(index + 1, last):
+            key = (req.model, req.src_lang, req.dst_lang, i)
+            if key in self.results or key in self.pending:
+                continue
+            # A merged sentence is one request; every cue of it waits on the same future
+            group = [g for g in self.groups[i] if g >= i]
+            keys = [(req.model, req.src_lang, req.dst_lang, g) for g in group]
+            future = self.pool.submit(self._prefetch, translator, keys, req.src_lang, req.dst_lang, group, generation)
+            for k in keys:
+                self.pending[k] = future
+
+    def _prefetch(self, translator, keys, src_lang, dst_lang, indexes, generation):
+        """Returns {cue index: translation} for the cues translated by this request."""
+        first = indexes[0]
+        history = self.cues[max(0, first - HISTORY_WINDOW):first]
+        texts = [self.cues[i] for i in indexes]
+        try:
+            text = translator.translate_raw(merged_text(texts), src_lang, dst_lang, history)
+        except TranslationError:
+            with self._lock:
+                self.counters["errors"] += 1
+                for key in keys:
+                    self.pending.pop(key, None)
+            return None
+        parts = split_translation(text, texts) if len(texts) > 1 else [text]
+        with self._lock:
+            if generation != self.generation:
+                self.counters["discarded"] += 1
+                return None
+            for key, part in zip(keys, parts):
+                self.pending.pop(key, None)
+                self.results[key] = part
+            self.counters["prefetched"] += len(keys)
+            self.counters["merged_requests_saved"] += len(keys) - 1
+        return dict(zip(indexes, parts))
+
+    def lookup(self, req, api_key):
+        """Return a prefetched translation for ``req`` or None; schedules look-ahead either way."""
+        with self._lock:
+            index = self._locate(req.user_text) if self.cues else -1
+            if index < 0:
+                self.counters["unmatched"] += 1
+                return None
+            if self.position >= 0 and not (self.position <= index <= self.position + self.lookahead + 1):
+                self.counters["seeks"] += 1
+                self._discard_locked()
+            self.position = index
+            key = (req.model, req.src_lang, req.dst_lang, index)
+            text = self.results.pop(key, None)
+            future = self.pending.get(key)
+            # Drop cached cues that playback has already passed
+            for stale in [k for k in self.results if k[3] < index]:
+                del self.results[stale]
+            self._schedule_locked(index, req, api_key)
+            if text is not None:
+                self.counters["hits"] += 1
+                return text
+        if future is not None:
+            try:
+                text = (future.result(timeout=self.wait_seconds) or {}).get(index)
+            except Exception:
+                text = None
+            if text is not None:
+                with self._lock:
+                    self.results.pop(key, None)
+                    self.counters["waited"] += 1
+                return text
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+
+def make_handler(engine):
+    class Handler(JsonHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/prefetch/stats":
+                self.send_json(200, engine.stats())
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            raw = self.read_body()
+            if self.path.rstrip("/") == "/prefetch/load":
+                try:
+                    path = json.loads(raw.decode("utf-8")).get("path", "")
+                    count = engine.load(path)
+                except (OSError, ValueError, AttributeError) as e:
+                    self.send_json(400, {"error": {"message": str(e)}})
+                    return
+                self.send_json(200, {"loaded": path, "cues": count})
+                return
+            req = parse_plugin_request(self.path, raw)
+            if req is not None and req.user_text:
+                text = engine.lookup(req, bearer_key(self.headers))
+                if text is not None:
+                    self.send_bytes(200, synthesize_response(req.kind, req.model, text))
+                    return
+            kind = req.kind if req else "chat"
+            status, body = forward(upstream_url(engine.upstream, kind), raw, self.headers)
+            self.send_bytes(status, body)
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look-ahead prefetch proxy for the PotPlayer plugin")
+    parser.add_argument("--upstream", required=True, help="Real API base, e.g. https://api.openai.com/v1")
+    parser.add_argument("--subtitle", default="", help="Subtitle file currently being played")
+    parser.add_argument("--lookahead", type=int, default=8, help="Cues translated ahead of playback")
+    parser.add_argument("--max-inflight", type=int, default=3, help="Cap on concurrent prefetch requests")
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET)
+    parser.add_argument("--merge-fragments", action="store_true",
+                        help="Translate sentences split over consecutive cues in one request")
+    parser.add_argument("--merge-hold-ms", type=int, default=DEFAULT_HOLD_MS,
+                        help="Merge only cues starting within this many ms of the first fragment")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args(argv)
+
+    engine = PrefetchEngine(args.upstream, args.lookahead, args.max_inflight, args.context_budget,
+                            merge_hold_ms=args.merge_hold_ms if args.merge_fragments else 0)
+    if args.subtitle:
+        print(f"Loaded {engine.load(args.subtitle)} cues from {args.subtitle}")
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(engine))
+    print(f"Prefetch proxy listening on http://127.0.0.1:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Replay subtitle cues to measure what the per-model request profiles change.
+
+Every model given with ``--model`` is resolved against
+``model_request_profiles.json`` the way the plugin's ``RequestProfileFields``
+does. The dry run (default) reports the fields each model gets and the range
+of output caps over the cues. With ``--live`` every cue is translated twice,
+once with the profile fields and once with a plain body, alternating which
+goes first so warm caches favour neither. The report has median and p90
+latency, completion and reasoning tokens, and empty replies per mode.
+
+Example:
+    python tools/profile_replay.py ep01.srt --model gpt-5-nano --model gpt-4o-mini
+    python tools/profile_replay.py ep01.srt --live --cues 60 --model gpt-5-mini --out profile_report.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from subtitle_io import read_cues  # noqa: E402
+from translate_core import (  # noqa: E402
+    DEFAULT_API_BASE, DEFAULT_CONTEXT_BUDGET, TranslationError, Translator, estimate_tokens,
+    load_request_profiles, request_profile_fields, resolve_request_profile,
+)
+
+HISTORY_WINDOW = 2048
+_SYNTHETIC = ("Where were you last night?", "I told you, I was at the station until midnight.",
+              "The captain wants the report on his desk by morning.", "Fine.",
+              "Listen to me. Nobody leaves this room until we know who took it.")
+
+
+def _p90(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] if ordered else 0.0
+
+
+def dry_run(model, texts, profiles):
+    caps = []
+    for text in texts:
+        fields = request_profile_fields(model, estimate_tokens(text), profiles)
+        cap = next((v for k, v in fields.items() if k in ("max_tokens", "max_completion_tokens")), None)
+        if cap is not None:
+            caps.append(cap)
+    sample = texts[0] if texts else ""
+    return {
+        "resolved_profile": resolve_request_profile(model, profiles),
+        "chat_fields_first_cue": request_profile_fields(model, estimate_tokens(sample), profiles),
+        "responses_fields_first_cue": request_profile_fields(model, estimate_tokens(sample), profiles, responses=True),
+        "output_cap_min": min(caps) if caps else None,
+        "output_cap_median": round(statistics.median(caps)) if caps else None,
+        "output_cap_max": max(caps) if caps else None,
+    }
+
+
+def _summarize(samples):
+    latencies = [s["seconds"] for s in samples if s["ok"]]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not s["ok"]),
+        "empty_replies": sum(1 for s in samples if s["ok"] and not s["text"].strip()),
+        "latency_ms_median": round(statistics.median(latencies) * 1000) if latencies else 0,
+        "latency_ms_p90": round(_p90(latencies) * 1000),
+        "completion_tokens": sum(s["completion_tokens"] for s in samples),
+        "reasoning_tokens": sum(s["reasoning_tokens"] for s in samples),
+    }
+
+
+def live_run(model, texts, profiles, args):
+    translators = {
+        "with_profile": Translator(model=model, api_base=args.api_base, api_key=args.api_key, retries=0,
+                                   context_budget=args.context_budget, request_profiles=profiles),
+        "plain": Translator(model=model, api_base=args.api_base, api_key=args.api_key, retries=0,
+                            context_budget=args.context_budget),
+    }
+    samples = {"with_profile": [], "plain": []}
+    for i, text in enumerate(texts):
+        history = texts[max(0, i - HISTORY_WINDOW):i]
+        for mode in (("with_profile", "plain") if i % 2 == 0 else ("plain", "with_profile")):
+            try:
+                reply, usage, seconds = translators[mode].request(text, args.src_lang, args.lang, history)
+                details = usage.get("completion_tokens_details") or {}
+                samples[mode].append({"ok": True, "text": reply, "seconds": seconds,
+                                      "completion_tokens": int(usage.get("completion_tokens", 0) or 0),
+                                      "reasoning_tokens": int(details.get("reasoning_tokens", 0) or 0)})
+            except TranslationError:
+                samples[mode].append({"ok": False, "text": "", "seconds": 0.0,
+                                      "completion_tokens": 0, "reasoning_tokens": 0})
+    result = {mode: _summarize(runs) for mode, runs in samples.items()}
+    plain_ms = result["plain"]["latency_ms_median"]
+    result["latency_change_ratio"] = (round(result["with_profile"]["latency_ms_median"] / plain_ms - 1, 3)
+                                      if plain_ms else 0.0)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare requests with and without the per-model request profile")
+    parser.add_argument("subtitles", nargs="*", help="Subtitle files to replay (default: a few synthetic lines)")
+    parser.add_argument("--model", action="append", default=[], help="Model to replay; repeat for several")
+    parser.add_argument("--cues", type=int, default=40, help="Cues to replay per model")
+    parser.add_argument("--live", action="store_true", help="Translate every cue with and without the profile")
+    parser.add_argument("--lang", default="zh-CN")
+    parser.add_argument("--src-lang", default="")
+    parser.add_argument("--api-base", default=DEFAULT_API_BASE)
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET)
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    texts = []
+    for path in args.subtitles:
+        texts.extend(cue.text for cue in read_cues(path))
+    texts = (texts or list(_SYNTHETIC))[:args.cues]
+    profiles = load_request_profiles()
+    report = {"cues": len(texts), "live": args.live, "models": {}}
+    for model in args.model or ["gpt-5-nano"]:
+        entry = dry_run(model, texts, profiles)
+        if args.live:
+            entry.update(live_run(model, texts, profiles, args))
+        report["models"][model] = entry
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Helpers for local services that sit at the plugin's ``pre_apiUrl``.
+
+They accept the plugin's chat/completions and Responses bodies, can answer
+them locally, and forward anything else to the real provider unchanged.
+"""
+
+import json
+import re
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler
+
+from translate_core import USER_AGENT, normalize_base_url
+
+_LANG_LINES = re.compile(r"Source language: (.*)\nTarget language: (.*)\n")
+
+
+class PluginRequest:
+    """A parsed chat/completions or Responses request sent by the plugin."""
+
+    def __init__(self, kind, body, raw):
+        self.kind = kind            # "chat" | "responses"
+        self.body = body
+        self.raw = raw
+        self.model = body.get("model", "")
+        self.system_text = ""
+        self.user_text = ""
+        if kind == "chat":
+            for message in body.get("messages", []):
+                if message.get("role") == "system":
+                    self.system_text = _content_text(message.get("content"))
+                elif message.get("role") == "user":
+                    self.user_text = _content_text(message.get("content"))
+        else:
+            for item in body.get("input", []) if isinstance(body.get("input"), list) else []:
+                if item.get("role") == "system":
+                    self.system_text = _content_text(item.get("content"))
+                elif item.get("role") == "user":
+                    self.user_text = _content_text(item.get("content"))
+        m = _LANG_LINES.search(self.system_text)
+        src = m.group(1).strip() if m else ""
+        self.src_lang = "" if src == "Auto Detect" else src
+        self.dst_lang = m.group(2).strip() if m else ""
+
+
+def _content_text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def parse_plugin_request(path, raw):
+    kind = "responses" if path.rstrip("/").endswith("/responses") else "chat"
+    try:
+        body = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(body, dict):
+        return None
+    return PluginRequest(kind, body, raw)
+
+
+def synthesize_response(kind, model, text, usage=None):
+    """Build a provider-shaped reply the plugin's parsers accept."""
+    now = int(time.time())
+    if kind == "responses":
+        data = {"id": f"resp_local_{now}", "object": "response", "model": model,
+                "output": [{"type": "message", "role": "assistant",
+                            "content": [{"type": "output_text", "text": text}]}]}
+    else:
+        data = {"id": f"chatcmpl-local-{now}", "object": "chat.completion", "created": now, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}]}
+    if usage is not None:
+        data["usage"] = usage
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+def extract_reply_text(kind, data):
+    if not isinstance(data, dict):
+        return ""
+    if kind == "responses":
+        for entry in data.get("output", []) or []:
+            for part in (entry.get("content") or []) if isinstance(entry, dict) else []:
+                if isinstance(part, dict) and part.get("type") == "output_text":
+                    return part.get("text", "")
+        return ""
+    choices = data.get("choices") or []
+    if choices and isinstance(choices[0], dict):
+        return (choices[0].get("message") or {}).get("content") or ""
+    return ""
+
+
+def upstream_url(api_base, kind):
+    return normalize_base_url(api_base) + ("/responses" if kind == "responses" else "/chat/completions")
+
+
+def forward(url, raw, headers, timeout=120.0):
+    """POST ``raw`` upstream; returns (status, body bytes). Network errors give status 502."""
+    req = urllib.request.Request(url, data=raw, method="POST")
+    req.add_header("Content-Type", "application/json")
+    req.add_header("User-Agent", headers.get("User-Agent", USER_AGENT))
+    if headers.get("Authorization"):
+        req.add_header("Authorization", headers["Authorization"])
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        return 502, json.dumps({"error": {"message": f"Upstream unreachable: {e}"}}).encode("utf-8")
+
+
+def bearer_key(headers):
+    auth = headers.get("Authorization", "")
+    return auth[7:].strip() if auth.lower().startswith("bearer ") else ""
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    """Base handler with small JSON response helpers and quiet logging."""
+
+    protocol_version = "HTTP/1.1"
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
+    def send_bytes(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_bytes(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""Replay subtitle files to compare per-cue model routing against one model.
+
+The routing rules are a port of ``SelectModelForCue`` /
+``IsLowConfidenceTranslation`` in the context plugin. ``--dry-run`` only
+reports how cues would be split. A live run translates every cue twice,
+once with the strong model alone and once routed, and reports latency,
+tokens and cost for both.
+
+Example:
+    python tools/route_replay.py ep01.srt ep02.srt --lang zh-CN \\
+        --fast gpt-5-nano --strong gpt-5 \\
+        --price gpt-5-nano=0.05,0.40 --price gpt-5=1.25,10 --out route_report.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from subtitle_io import read_cues  # noqa: E402
+from translate_core import (  # noqa: E402
+    DEFAULT_API_BASE, DEFAULT_CONTEXT_BUDGET, TranslationError, Translator, estimate_tokens,
+)
+
+DEFAULT_THRESHOLD = 12
+HISTORY_WINDOW = 2048
+
+# ========= Routing rules (port of the plugin) =========
+
+def score_cue_difficulty(text):
+    clauses = 0
+    entities = 0
+    at_sentence_start = True
+    in_word = False
+    for c in text.encode("utf-8"):
+        is_upper = 65 <= c <= 90
+        if is_upper or 97 <= c <= 122 or c >= 128:
+            if not in_word and is_upper and not at_sentence_start:
+                entities += 1
+            if not in_word:
+                at_sentence_start = False
+            in_word = True
+            continue
+        in_word = False
+        if c in (46, 33, 63):
+            clauses += 1
+            at_sentence_start = True
+        elif c in (44, 59, 58):
+            clauses += 1
+        elif c in (10, 45):
+            at_sentence_start = True
+    return estimate_tokens(text) + clauses * 2 + entities * 3
+
+
+def select_model(text, fast_model, strong_model, threshold=DEFAULT_THRESHOLD):
+    return fast_model if score_cue_difficulty(text) <= threshold else strong_model
+
+
+def is_low_confidence(source, translation):
+    trimmed = translation.strip()
+    if not trimmed:
+        return True
+    if len(source.encode("utf-8")) > 3 and trimmed.lower() == source.strip().lower():
+        return True
+    if "Subtitle context" in trimmed:
+        return True
+    return len(trimmed.encode("utf-8")) > len(source.encode("utf-8")) * 4 + 40
+
+
+# ========= Replay =========
+
+def parse_prices(values):
+    prices = {}
+    for value in values or []:
+        model, _, rates = value.partition("=")
+        inp, _, out = rates.partition(",")
+        prices[model.strip()] = (float(inp), float(out or 0))
+    return prices
+
+
+def cost_of(model, usage, prices):
+    rate_in, rate_out = prices.get(model, (0.0, 0.0))
+    return (usage.get("prompt_tokens", 0) * rate_in + usage.get("completion_tokens", 0) * rate_out) / 1_000_000
+
+
+class RunStats:
+    def __init__(self):
+        self.latencies = []
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.errors = 0
+
+    def add(self, model, usage, prices):
+        self.requests += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+        self.cost += cost_of(model, usage, prices)
+
+    def summary(self):
+        lat = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+            "latency_mean_ms": round(statistics.mean(lat) * 1000, 1) if lat else 0.0,
+            "latency_p95_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000, 1) if lat else 0.0,
+        }
+
+
+def replay(paths, args):
+    prices = parse_prices(args.price)
+    translators = {}
+
+    def translator(model):
+        if model not in translators:
+            translators[model] = Translator(model=model, api_base=args.api_base, api_key=args.api_key,
+                                            context_budget=args.context_budget, retries=0)
+        return translators[model]
+
+    routed_counts = {args.fast: 0, args.strong: 0}
+    baseline, routed = RunStats(), RunStats()
+    escalations = 0
+    for path in paths:
+        texts = [cue.text for cue in read_cues(path)]
+        for i, text in enumerate(texts):
+            model = select_model(text, args.fast, args.strong, args.threshold)
+            routed_counts[model] += 1
+            if args.dry_run:
+                continue
+            history = texts[max(0, i - HISTORY_WINDOW):i]
+            try:
+                _, usage, seconds = translator(args.strong).request(text, args.src_lang, args.lang, history)
+                baseline.add(args.strong, usage, prices)
+                baseline.latencies.append(seconds)
+            except TranslationError:
+                baseline.errors += 1
+            try:
+                result, usage, seconds = translator(model).request(text, args.src_lang, args.lang, history)
+                routed.add(model, usage, prices)
+                if model != args.strong and is_low_confidence(text, result):
+                    escalations += 1
+                    _, usage, extra = translator(args.strong).request(text, args.src_lang, args.lang, history)
+                    routed.add(args.strong, usage, prices)
+                    seconds += extra
+                routed.latencies.append(seconds)
+            except TranslationError:
+                routed.errors += 1
+
+    total_cues = sum(routed_counts.values())
+    report = {
+        "files": paths,
+        "cues": total_cues,
+        "fast_model": args.fast,
+        "strong_model": args.strong,
+        "threshold": args.threshold,
+        "routed_to_fast": routed_counts[args.fast],
+        "routed_to_strong": routed_counts[args.strong],
+        "fast_share": round(routed_counts[args.fast] / total_cues, 3) if total_cues else 0.0,
+    }
+    if not args.dry_run:
+        b, r = baseline.summary(), routed.summary()
+        report.update(baseline=b, routed=r, escalations=escalations,
+                      latency_saved_ms=round(b["latency_mean_ms"] - r["latency_mean_ms"], 1),
+                      cost_saved_usd=round(b["cost_usd"] - r["cost_usd"], 6))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-cue model routing with a single-model run")
+    parser.add_argument("subtitles", nargs="+")
+    parser.add_argument("--lang", required=True)
+    parser.add_argument("--src-lang", default="")
+    parser.add_argument("--fast", default="gpt-5-nano")
+    parser.add_argument("--strong", default="gpt-5")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--api-base", default=DEFAULT_API_BASE)
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--context-budget", type=int, default=DEFAULT_CONTEXT_BUDGET)
+    parser.add_argument("--price", action="append", help="MODEL=INPUT,OUTPUT in USD per 1M tokens")
+    parser.add_argument("--dry-run", action="store_true", help="Only report how cues would be routed")
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    report = replay(args.subtitles, args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""Stand-in servers and a replay check for the plugin's local-first spillover.
+
+``serve`` starts two OpenAI-compatible stand-ins: a "local" server with a
+fixed number of slots, so concurrent viewers make requests queue the way a
+busy LAN box does, and an always-fast "cloud" server. Point the plugin at them
+with ``local=http://127.0.0.1:8781/v1`` in the login token and
+``http://127.0.0.1:8782/v1/chat/completions`` as the API URL. Load on the
+local server can be changed while it runs with
+``POST /standin/config {"service_ms": 400, "load": 6, "fail": false}``.
+
+``check`` runs the same stand-ins in-process, replays cues through
+``LocalFirstPolicy`` (a port of ``LocalProviderSelected`` /
+``RequestLocalTranslation``) while background load comes and goes, and
+reports how much traffic stayed local and every spill/recover transition.
+
+Example:
+    python tools/spillover_check.py serve --local-port 8781 --cloud-port 8782
+    python tools/spillover_check.py check --cues 120 --out spill_report.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from proxy_common import JsonHandler, parse_plugin_request, synthesize_response  # noqa: E402
+
+LOCAL_PROBE_MIN_MS = 15000
+LOCAL_PROBE_MAX_MS = 240000
+
+# ========= Stand-in servers =========
+
+class StandIn:
+    """Answers every cue with a canned reply after ``service_ms`` on one of ``slots`` workers."""
+
+    def __init__(self, name, service_ms=50, slots=1, fail=False):
+        self.name = name
+        self.service_ms = service_ms
+        self.fail = fail
+        self.slots = max(1, slots)
+        self._tickets = 0
+        self._released = 0
+        self._cond = threading.Condition()
+        self.load = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._load_threads = []
+        self._stop_load = threading.Event()
+
+    def configure(self, service_ms=None, load=None, fail=None):
+        if service_ms is not None:
+            self.service_ms = int(service_ms)
+        if fail is not None:
+            self.fail = bool(fail)
+        if load is not None:
+            self.set_load(int(load))
+
+    def set_load(self, viewers):
+        """Simulate ``viewers`` other machines keeping the server busy."""
+        self._stop_load.set()
+        for thread in self._load_threads:
+            thread.join()
+        self._stop_load = threading.Event()
+        self._load_threads = [threading.Thread(target=self._background, args=(self._stop_load,), daemon=True)
+                              for _ in range(max(0, viewers))]
+        for thread in self._load_threads:
+            thread.start()
+        self.load = max(0, viewers)
+
+    def _background(self, stop):
+        while not stop.is_set():
+            self.serve_one()
+
+    def serve_one(self):
+        """Returns (queue ms, service ms) of one request."""
+        queued = time.perf_counter()
+        # First come, first served, like a single-queue inference server
+        with self._cond:
+            ticket = self._tickets
+            self._tickets += 1
+            self._cond.wait_for(lambda: ticket < self._released + self.slots)
+        waited = (time.perf_counter() - queued) * 1000
+        time.sleep(self.service_ms / 1000.0)
+        with self._cond:
+            self._released += 1
+            self._cond.notify_all()
+        with self._lock:
+            self.requests += 1
+        return waited, self.service_ms
+
+    def stats(self):
+        return {"name": self.name, "service_ms": self.service_ms, "load": self.load, "fail": self.fail,
+                "requests": self.requests}
+
+
+def make_handler(standin):
+    class Handler(JsonHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") == "/standin/stats":
+                self.send_json(200, standin.stats())
+            else:
+                self.send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            raw = self.read_body()
+            if self.path.rstrip("/") == "/standin/config":
+                try:
+                    standin.configure(**json.loads(raw.decode("utf-8")))
+                except (TypeError, ValueError) as e:
+                    self.send_json(400, {"error": {"message": str(e)}})
+                    return
+                self.send_json(200, standin.stats())
+                return
+            req = parse_plugin_request(self.path, raw)
+            if req is None:
+                self.send_json(400, {"error": {"message": "Bad request"}})
+                return
+            if standin.fail:
+                self.send_json(503, {"error": {"message": f"{standin.name} stand-in is failing"}})
+                return
+            _, service_ms = standin.serve_one()
+            body = json.loads(synthesize_response(req.kind, req.model, f"[{standin.name}] {req.user_text}"))
+            # llama.cpp-style compute timings, so the plugin can separate queueing from work
+            body["timings"] = {"prompt_ms": service_ms / 4.0, "predicted_ms": service_ms * 3 / 4.0}
+            self.send_json(200, body)
+
+    return Handler
+
+
+def start_standin(standin, port):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(standin))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ========= Policy (port of the plugin) =========
+
+class LocalFirstPolicy:
+    def __init__(self, threshold_ms=2000, probe_min_ms=LOCAL_PROBE_MIN_MS, probe_max_ms=LOCAL_PROBE_MAX_MS,
+                 clock=time.monotonic):
+        self.threshold_ms = threshold_ms
+        self.probe_min_ms = probe_min_ms
+        self.probe_max_ms = probe_max_ms
+        self.clock = clock
+        self.spilled = False
+        self.ewma = -1
+        self.roundtrip_ewma = -1
+        self.spill_at = 0.0
+        self.probe_after_ms = 0
+        self.counters = {"local": 0, "cloud": 0, "errors": 0, "spills": 0}
+        self.transitions = []
+
+    def select_local(self, remaining_ms=0):
+        """``remaining_ms`` is what is left of the cue deadline (0 = no deadline)."""
+        if self.spilled:
+            if (self.clock() - self.spill_at) * 1000 >= self.probe_after_ms:
+                return True
+            self.counters["cloud"] += 1
+            return False
+        if remaining_ms > 0 and self.roundtrip_ewma > 0 and self.roundtrip_ewma * 2 > remaining_ms:
+            self.counters["cloud"] += 1
+            self._spill(f"round trip {round(self.roundtrip_ewma)} ms over half the deadline")
+            return False
+        return True
+
+    def _spill(self, reason):
+        if not self.spilled:
+            self.spilled = True
+            self.counters["spills"] += 1
+            self.probe_after_ms = self.probe_min_ms
+        else:
+            self.probe_after_ms = min(self.probe_after_ms * 2, self.probe_max_ms)
+        self.spill_at = self.clock()
+        self.transitions.append({"event": "spill", "reason": reason, "next_probe_ms": self.probe_after_ms})
+
+    def _record_roundtrip(self, elapsed_ms):
+        self.roundtrip_ewma = elapsed_ms if self.roundtrip_ewma < 0 else (self.roundtrip_ewma * 3 + elapsed_ms) / 4
+
+    def record_failure(self, elapsed_ms=0):
+        self._record_roundtrip(elapsed_ms)
+        self.counters["errors"] += 1
+        self.counters["cloud"] += 1
+        self._spill("error")
+
+    def record_success(self, elapsed_ms, compute_ms=0):
+        probing = self.spilled
+        self._record_roundtrip(elapsed_ms)
+        queue_ms = elapsed_ms - compute_ms if 0 < compute_ms < elapsed_ms else elapsed_ms
+        self.counters["local"] += 1
+        if probing:
+            if queue_ms * 2 <= self.threshold_ms:
+                self.spilled = False
+                self.ewma = queue_ms
+                self.transitions.append({"event": "recover", "queue_ms": round(queue_ms)})
+            else:
+                self._spill(f"still slow ({round(queue_ms)} ms)")
+            return
+        self.ewma = queue_ms if self.ewma < 0 else (self.ewma * 3 + queue_ms) / 4
+        if self.ewma > self.threshold_ms:
+            self._spill(f"queue {round(self.ewma)} ms")
+
+    def report(self):
+        total = self.counters["local"] + self.counters["cloud"]
+        data = dict(self.counters)
+        data["local_share"] = round(self.counters["local"] / total, 3) if total else 0.0
+        data["transitions"] = self.transitions
+        return data
+
+
+# ========= Replay =========
+
+def _post_cue(url, text, timeout=60.0):
+    payload = {"model": "stand-in", "messages": [{"role": "user", "content": text}]}
+    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), method="POST")
+    req.add_header("Content-Type", "application/json")
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = json.loads(resp.read().decode("utf-8"))
+    except (urllib.error.URLError, OSError, ValueError):
+        return None, (time.perf_counter() - started) * 1000, 0
+    timings = body.get("timings") or {}
+    compute = timings.get("prompt_ms", 0) + timings.get("predicted_ms", 0)
+    return body, (time.perf_counter() - started) * 1000, compute
+
+
+def run_check(args):
+    local = StandIn("local", service_ms=args.service_ms, slots=args.slots)
+    cloud = StandIn("cloud", service_ms=args.cloud_ms, slots=64)
+    servers = [start_standin(local, 0), start_standin(cloud, 0)]
+    local_url = f"http://127.0.0.1:{servers[0].server_address[1]}/v1/chat/completions"
+    cloud_url = f"http://127.0.0.1:{servers[1].server_address[1]}/v1/chat/completions"
+    policy = LocalFirstPolicy(args.threshold_ms, args.probe_min_ms, args.probe_max_ms)
+
+    # Idle, then a binge session on other machines, then a failing server, then idle again
+    phases = [("idle", 0, False), ("busy", args.load, False), ("failing", 0, True), ("idle", 0, False)]
+    per_phase = max(1, args.cues // len(phases))
+    timeline = []
+    try:
+        for name, load, fail in phases:
+            local.configure(load=load, fail=fail)
+            start_counts = dict(policy.counters)
+            for i in range(per_phase):
+                text = f"{name} cue {i}"
+                served = "cloud"
+                if policy.select_local(args.deadline_ms):
+                    body, elapsed, compute = _post_cue(local_url, text)
+                    if body is None:
+                        policy.record_failure(elapsed)
+                    else:
+                        policy.record_success(elapsed, compute)
+                        served = "local"
+                if served == "cloud":
+                    _post_cue(cloud_url, text)
+                time.sleep(args.cue_gap_ms / 1000.0)
+            timeline.append({"phase": name, "load": load, "fail": fail,
+                             "local": policy.counters["local"] - start_counts["local"],
+                             "cloud": policy.counters["cloud"] - start_counts["cloud"]})
+    finally:
+        local.configure(load=0)
+        for server in servers:
+            server.shutdown()
+    report = policy.report()
+    report.update(threshold_ms=args.threshold_ms, phases=timeline)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in servers and replay check for local-first spillover")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run a local and a cloud stand-in for manual plugin testing")
+    serve.add_argument("--local-port", type=int, default=8781)
+    serve.add_argument("--cloud-port", type=int, default=8782)
+    serve.add_argument("--service-ms", type=int, default=300, help="Local compute time per cue")
+    serve.add_argument("--slots", type=int, default=1, help="Cues the local server works on at once")
+    check = sub.add_parser("check", help="Replay cues through the spillover policy against in-process stand-ins")
+    check.add_argument("--cues", type=int, default=160)
+    check.add_argument("--service-ms", type=int, default=40)
+    check.add_argument("--cloud-ms", type=int, default=80)
+    check.add_argument("--slots", type=int, default=1)
+    check.add_argument("--load", type=int, default=6, help="Background viewers during the busy phase")
+    check.add_argument("--threshold-ms", type=int, default=150)
+    check.add_argument("--probe-min-ms", type=int, default=500, help="Plugin default is 15000")
+    check.add_argument("--probe-max-ms", type=int, default=2000, help="Plugin default is 240000")
+    check.add_argument("--cue-gap-ms", type=int, default=50)
+    check.add_argument("--deadline-ms", type=int, default=0,
+                       help="Cue deadline; local is skipped when its round trip would use over half of it")
+    check.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        local = StandIn("local", service_ms=args.service_ms, slots=args.slots)
+        start_standin(local, args.local_port)
+        start_standin(StandIn("cloud", service_ms=50, slots=64), args.cloud_port)
+        print(f"Local stand-in on http://127.0.0.1:{args.local_port}/v1 (POST /standin/config to add load)")
+        print(f"Cloud stand-in on http://127.0.0.1:{args.cloud_port}/v1/chat/completions")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    report = run_check(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""Streaming SRT / ASS / VTT reading and SRT writing for the batch tools.
+
+``iter_cues`` reads a file line by line and yields cues as they complete, so
+multi-hour or multi-track files never have to fit in memory. ``read_cues``
+is the list form for tools that need random access.
+"""
+
+import codecs
+import os
+import re
+from collections import namedtuple
+
+# ``track`` is the ASS style name; SRT and VTT cues have a single unnamed track
+Cue = namedtuple("Cue", ["index", "start_ms", "end_ms", "text", "track"], defaults=("",))
+
+SUBTITLE_EXTS = (".srt", ".ass", ".ssa", ".vtt")
+
+_SRT_TIME = re.compile(r"(\d+):(\d{2}):(\d{2})[,.](\d{1,3})")
+_VTT_TIME = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})\.(\d{1,3})")
+_ASS_OVERRIDE = re.compile(r"\{[^}]*\}")
+_VTT_TAG = re.compile(r"</?(?:c|i|b|u|v|lang|ruby|rt)(?:[.\s][^>]*)?>|<\d{2}:[\d:.]+>")
+
+_SNIFF_BYTES = 64 * 1024
+
+
+def _detect_encoding(path):
+    with open(path, "rb") as f:
+        head = f.read(_SNIFF_BYTES)
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the sample is still UTF-8
+        if e.start >= len(head) - 3:
+            return "utf-8"
+    return "cp1252"
+
+
+def _iter_lines(path):
+    with open(path, "r", encoding=_detect_encoding(path), errors="replace", newline=None) as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def parse_srt_time(value):
+    m = _SRT_TIME.search(value)
+    if not m:
+        return 0
+    h, mi, s, ms = m.groups()
+    return ((int(h) * 60 + int(mi)) * 60 + int(s)) * 1000 + int(ms.ljust(3, "0"))
+
+
+def parse_vtt_time(value):
+    m = _VTT_TIME.search(value)
+    if not m:
+        return 0
+    h, mi, s, ms = m.groups()
+    return ((int(h or 0) * 60 + int(mi)) * 60 + int(s)) * 1000 + int(ms.ljust(3, "0"))
+
+
+def format_srt_time(ms):
+    ms = max(int(ms), 0)
+    h, rem = divmod(ms, 3600000)
+    m, rem = divmod(rem, 60000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def parse_ass_time(value):
+    parts = value.strip().split(":")
+    if len(parts) != 3:
+        return 0
+    h, m, rest = parts
+    sec, _, cs = rest.partition(".")
+    return ((int(h) * 60 + int(m)) * 60 + int(sec)) * 1000 + int((cs or "0").ljust(2, "0")[:2]) * 10
+
+
+def _iter_blocks(lines):
+    """Group lines into blank-line separated blocks without reading ahead."""
+    block = []
+    for line in lines:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def iter_srt(path):
+    index = 0
+    for block in _iter_blocks(_iter_lines(path)):
+        time_idx = next((i for i, line in enumerate(block) if "-->" in line), -1)
+        if time_idx < 0:
+            continue
+        start, _, end = block[time_idx].partition("-->")
+        text = "\n".join(block[time_idx + 1:]).strip()
+        if text:
+            yield Cue(index, parse_srt_time(start), parse_srt_time(end), text)
+            index += 1
+
+
+def iter_vtt(path, keep_markup=False):
+    index = 0
+    for block in _iter_blocks(_iter_lines(path)):
+        time_idx = next((i for i, line in enumerate(block) if "-->" in line), -1)
+        # Skips the WEBVTT header, NOTE, STYLE and REGION blocks
+        if time_idx < 0:
+            continue
+        start, _, rest = block[time_idx].partition("-->")
+        end = rest.strip().split(" ", 1)[0]
+        text = "\n".join(block[time_idx + 1:]).strip()
+        if not keep_markup:
+            text = _VTT_TAG.sub("", text).strip()
+        text = text.replace("&lt;", "<").replace("&gt;", ">").replace("&nbsp;", " ").replace("&amp;", "&")
+        if text:
+            yield Cue(index, parse_vtt_time(start), parse_vtt_time(end), text)
+            index += 1
+
+
+def iter_ass(path, keep_markup=False):
+    index = 0
+    fields = None
+    in_events = False
+    for line in _iter_lines(path):
+        stripped = line.strip()
+        if stripped.startswith("["):
+            in_events = stripped.lower() == "[events]"
+            continue
+        if not in_events:
+            continue
+        key, _, value = stripped.partition(":")
+        if key == "Format":
+            fields = [f.strip().lower() for f in value.split(",")]
+        elif key == "Dialogue" and fields:
+            values = [v.strip() for v in value.split(",", len(fields) - 1)]
+            row = dict(zip(fields, values))
+            text = row.get("text", "")
+            if not keep_markup:
+                text = _ASS_OVERRIDE.sub("", text)
+            text = text.replace("\\N", "\n").replace("\\n", "\n").strip()
+            if text:
+                yield Cue(index, parse_ass_time(row.get("start", "")), parse_ass_time(row.get("end", "")), text,
+                          row.get("style", ""))
+                index += 1
+
+
+def iter_cues(path, track=None, keep_markup=False):
+    """Yield the cues of ``path`` one at a time, optionally only one ASS style (track).
+
+    ASS override blocks and VTT tags are removed unless ``keep_markup``; SRT
+    text is always returned as written.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".srt":
+        cues = iter_srt(path)
+    elif ext == ".vtt":
+        cues = iter_vtt(path, keep_markup)
+    elif ext in (".ass", ".ssa"):
+        cues = iter_ass(path, keep_markup)
+    else:
+        raise ValueError(f"Unsupported subtitle format: {ext}")
+    if track is None:
+        return cues
+    return (cue for cue in cues if cue.track == track)
+
+
+def read_cues(path, track=None):
+    return list(iter_cues(path, track))
+
+
+def read_srt(path):
+    return list(iter_srt(path))
+
+
+def read_ass(path):
+    return list(iter_ass(path))
+
+
+def write_srt(path, cues):
+    """Write cues atomically so PotPlayer never loads a half-written file. ``cues`` may be a generator."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="\r\n") as f:
+        for n, cue in enumerate(cues, 1):
+            f.write(f"{n}\n{format_srt_time(cue.start_ms)} --> {format_srt_time(cue.end_ms)}\n{cue.text}\n\n")
+    os.replace(tmp_path, path)
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""Shared translation logic for the offline Python tools.
+
+Mirrors the prompt, context-selection, token-limit and request-profile rules of
+``SubtitleTranslate - ChatGPT.as`` so batch jobs translate exactly like the
+installed plugin. Standard library only.
+"""
+
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUILD_DIR = os.path.join(REPO_ROOT, "releases", "build")
+
+DEFAULT_MODEL = "gpt-5-nano"
+DEFAULT_API_BASE = "https://api.openai.com/v1"
+DEFAULT_CONTEXT_BUDGET = 6000
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+RTL_LANGS = ("fa", "ar", "he")
+
+# ========= Bundled resources (shared with the installer) =========
+
+def load_build_json(filename: str):
+    with open(os.path.join(BUILD_DIR, filename), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_api_providers():
+    return load_build_json("api_providers.json")
+
+
+def load_token_limits():
+    return load_build_json("model_token_limits.json")
+
+
+def load_request_profiles():
+    return load_build_json("model_request_profiles.json")
+
+
+def resolve_provider(name: str):
+    """Return (model, api_base) for an ``API_PROVIDERS`` preset name."""
+    providers = load_api_providers()
+    provider = providers.get(name)
+    if not provider or name == "__CUSTOM__":
+        raise KeyError(f"Unknown provider preset: {name}")
+    return provider["model"], provider["api_base"]
+
+
+# ========= URL helpers (same rules as the installer) =========
+
+def normalize_base_url(api_url: str) -> str:
+    u = (api_url or "").strip().rstrip("/")
+    if not u:
+        return DEFAULT_API_BASE
+    for tail in ("/chat/completions", "/responses"):
+        if u.endswith(tail):
+            return u[: -len(tail)]
+    return u
+
+
+def chat_completions_url(api_url: str) -> str:
+    return normalize_base_url(api_url) + "/chat/completions"
+
+
+def responses_url(api_url: str) -> str:
+    return normalize_base_url(api_url) + "/responses"
+
+
+# ========= Token limits (port of GetModelMaxTokens) =========
+
+def resolve_token_limit(model: str, limits=None) -> int:
+    limits = limits if limits is not None else load_token_limits()
+    default = int(limits.get("default", 4096) or 4096)
+    name = (model or "").strip()
+    if not name:
+        return default
+    for rule in limits.get("rules", []):
+        match_type = rule.get("type", "")
+        value = rule.get("value", "")
+        tokens = int(rule.get("tokens", 0) or 0)
+        if not match_type or not value or tokens <= 0:
+            continue
+        if match_type == "prefix" and name.startswith(value):
+            return tokens
+        if match_type == "contains" and value in name:
+            return tokens
+        if match_type == "equals" and name == value:
+            return tokens
+    return default
+
+
+# ========= Request profiles (port of RequestProfileFields) =========
+
+def _rule_matches(match_type: str, value: str, name: str) -> bool:
+    return ((match_type == "prefix" and name.startswith(value)) or
+            (match_type == "contains" and value in name) or
+            (match_type == "equals" and name == value))
+
+
+def resolve_request_profile(model: str, profiles=None):
+    """The first matching rule, else ``default``; ``None`` when the table has neither."""
+    profiles = profiles if profiles is not None else load_request_profiles()
+    name = (model or "").strip()
+    if not name:
+        return None
+    for rule in profiles.get("rules", []):
+        if rule.get("type") and rule.get("value") and _rule_matches(rule["type"], rule["value"], name):
+            return rule
+    default = profiles.get("default")
+    return default if isinstance(default, dict) else None
+
+
+def request_profile_fields(model: str, cue_tokens: int, profiles=None, responses=False) -> dict:
+    """Body fields the plugin adds for ``model`` when the cue's reply is about ``cue_tokens`` long."""
+    profile = resolve_request_profile(model, profiles)
+    if not profile:
+        return {}
+    fields = {}
+    effort = profile.get("reasoning_effort")
+    verbosity = profile.get("verbosity")
+    if effort:
+        fields.update({"reasoning": {"effort": effort}} if responses else {"reasoning_effort": effort})
+    if verbosity:
+        fields.update({"text": {"verbosity": verbosity}} if responses else {"verbosity": verbosity})
+    if isinstance(profile.get("temperature"), (int, float)):
+        fields["temperature"] = round(profile["temperature"], 2)
+    output_field = "max_output_tokens" if responses else profile.get("output_field")
+    cap = int(profile.get("output_cap", 0) or 0)
+    if output_field and cap > 0:
+        scaled = int(profile.get("output_base", 0) or 0) + int(profile.get("output_per_token", 0) or 0) * cue_tokens
+        fields[output_field] = min(scaled, cap)
+    return fields
+
+
+def estimate_tokens(text: str) -> int:
+    # The plugin measures UTF-8 bytes, not code points
+    return len(text.encode("utf-8")) // 4
+
+
+# ========= Prompt & context (port of Translate) =========
+
+def build_system_prompt(src_lang: str, dst_lang: str, context: str = "") -> str:
+    source_label = src_lang or "Auto Detect"
+    prompt = (
+        "You are an expert subtitle translate tool with a deep understanding of both language and culture. "
+        "Based on contextual clues, you provide translations that capture not only the literal meaning but also the nuanced metaphors, euphemisms, and cultural symbols embedded in the dialogue. "
+        "Your translations reflect the intended tone and cultural context, ensuring that every subtle reference and idiomatic expression is accurately conveyed. "
+        "I will provide you with relevant context when available; never echo that context in the output.\n\n"
+        "Rules:\n"
+        "1. Output the translation only.\n"
+        "2. Do NOT output extra comments or explanations.\n"
+        "3. Do NOT use any special characters or formatting in the translation.\n\n"
+        f"Source language: {source_label}\n"
+        f"Target language: {dst_lang}\n"
+    )
+    if context:
+        prompt += "\nSubtitle context (older to newer):\n" + context + "\n\nDo not translate or repeat any context entries."
+    return prompt
+
+
+def context_budget_for(model: str, configured_budget: int, limits=None) -> int:
+    max_tokens = resolve_token_limit(model, limits)
+    safe_budget = max_tokens - 1000
+    if safe_budget < 0:
+        safe_budget = max(max_tokens, 0)
+    if configured_budget <= 0 or configured_budget > safe_budget:
+        return safe_budget
+    return configured_budget
+
+
+def select_context(history, text: str, safe_budget: int, configured_budget: int,
+                   truncation_mode: str = "drop_oldest") -> str:
+    """Pick the newest history lines that fit, exactly as the plugin does.
+
+    ``history`` holds the previous source lines (oldest first) and must not
+    include ``text`` itself.
+    """
+    available = max(safe_budget - max(estimate_tokens(text), 0), 0)
+    available = min(available, configured_budget)
+    smart_trim = (truncation_mode or "").lower() == "smart_trim"
+
+    segments = []
+    used = 0
+    for subtitle in reversed(history):
+        if used >= available:
+            break
+        tokens = estimate_tokens(subtitle)
+        if tokens <= 0:
+            continue
+        if used + tokens <= available:
+            segments.append(subtitle)
+            used += tokens
+        elif smart_trim:
+            remaining = available - used
+            if remaining > 0:
+                raw = subtitle.encode("utf-8")
+                char_budget = remaining * 4
+                if char_budget < len(raw):
+                    raw = raw[len(raw) - char_budget:]
+                segments.append(raw.decode("utf-8", errors="ignore"))
+            break
+        else:
+            break
+    segments.reverse()
+    return "\n".join(segments)
+
+
+def finalize_translation(text: str, model: str, dst_lang: str) -> str:
+    if "gemini" in model:
+        text = text.rstrip("\n")
+    if dst_lang in RTL_LANGS:
+        text = "\u202b" + text
+    return text.strip()
+
+
+# ========= HTTP client =========
+
+class TranslationError(Exception):
+    pass
+
+
+def post_json(url: str, api_key: str, payload: dict, timeout: float = 60.0) -> dict:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    req = urllib.request.Request(url, data=body, method="POST")
+    req.add_header("Content-Type", "application/json")
+    req.add_header("User-Agent", USER_AGENT)
+    if api_key:
+        req.add_header("Authorization", f"Bearer {api_key}")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            data = json.loads(e.read().decode("utf-8"))
+        except Exception:
+            raise TranslationError(f"HTTP {e.code}") from e
+        return data
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise TranslationError(str(e)) from e
+
+
+def extract_chat_text(data: dict) -> str:
+    choices = data.get("choices") if isinstance(data, dict) else None
+    if choices and isinstance(choices[0], dict):
+        content = (choices[0].get("message") or {}).get("content")
+        if isinstance(content, str):
+            return content
+    error = data.get("error") if isinstance(data, dict) else None
+    if isinstance(error, dict) and isinstance(error.get("message"), str):
+        raise TranslationError("API Error: " + error["message"])
+    raise TranslationError("Translation failed: unexpected response")
+
+
+class Translator:
+    """Translate cues with the plugin's prompt over chat/completions."""
+
+    def __init__(self, model=DEFAULT_MODEL, api_base=DEFAULT_API_BASE, api_key="",
+                 context_budget=DEFAULT_CONTEXT_BUDGET, truncation_mode="drop_oldest",
+                 retries=1, retry_delay=1.0, timeout=60.0, rate_limiter=None, request_profiles=None):
+        self.model = model
+        self.api_base = normalize_base_url(api_base)
+        self.api_key = api_key
+        self.truncation_mode = truncation_mode
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.limits = load_token_limits()
+        self.safe_budget = context_budget_for(model, 0, self.limits)
+        self.context_budget = context_budget_for(model, context_budget, self.limits)
+        # None sends plain bodies; pass load_request_profiles() to add the plugin's per-model fields
+        self.request_profiles = request_profiles
+
+    def build_messages(self, text, src_lang, dst_lang, history=()):
+        context = select_context(history, text, self.safe_budget, self.context_budget, self.truncation_mode)
+        return [
+            {"role": "system", "content": build_system_prompt(src_lang, dst_lang, context)},
+            {"role": "user", "content": text},
+        ]
+
+    def translate(self, text, src_lang, dst_lang, history=()):
+        return finalize_translation(self.translate_raw(text, src_lang, dst_lang, history), self.model, dst_lang)
+
+    def translate_raw(self, text, src_lang, dst_lang, history=()):
+        """Model output as returned by the API, before the plugin's post-processing."""
+        return self.request(text, src_lang, dst_lang, history)[0]
+
+    def request(self, text, src_lang, dst_lang, history=()):
+        """Returns (raw text, usage dict, seconds spent in the final attempt)."""
+        payload = {"model": self.model}
+        if self.request_profiles is not None:
+            payload.update(request_profile_fields(self.model, estimate_tokens(text), self.request_profiles))
+        payload["messages"] = self.build_messages(text, src_lang, dst_lang, history)
+        url = self.api_base + "/chat/completions"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                data = post_json(url, self.api_key, payload, self.timeout)
+                return extract_chat_text(data), data.get("usage") or {}, time.perf_counter() - started
+            except TranslationError as e:
+                last_error = e
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * (attempt + 1))
+        raise last_error
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""Fuzzy translation memory for near-duplicate cues.
+
+Source lines and their translations are kept in a JSON Lines store. ``build``
+compacts the store and writes the index file the context plugin reads with
+``HostFile*`` (login token ``tm=<path>``). Lines are compared by character
+trigrams of the plugin's ``NormalizeCueKey``, so case, spacing and
+punctuation never count. MinHash LSH bands find candidates without
+comparing against every entry. The plugin serves a match above its serve
+threshold from memory. Above its hint threshold it sends the earlier
+translation with the request as a hint.
+
+Index file (UTF-8, tab separated, ``\\t`` / ``\\n`` / ``\\\\`` escaped)::
+
+    #PTM1    perms=16    bands=8
+    E    <lang>    <source>    <translation>      one line per entry, index = order
+    B    <band hash, 8 hex digits>    <entry>    sorted by hash
+
+Example:
+    python tools/translation_memory.py add ep01.srt ep01.zh-CN.srt --lang zh-CN
+    python tools/translation_memory.py build --out "%APPDATA%\\PotPlayerMini64\\translation_memory.ptm"
+    python tools/translation_memory.py query "Thank you, Tom!" --lang zh-CN
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cue_markup import strip_markup  # noqa: E402
+from subtitle_io import read_cues  # noqa: E402
+
+NUM_PERM = 16
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "translation_memory.jsonl")
+DEFAULT_SERVE = 0.9
+DEFAULT_HINT = 0.6
+COMPACT_SIMILARITY = 0.95
+_MASK = 0xFFFFFFFF
+_RLE = "\u202b"
+
+# ========= Signatures (mirrors the plugin's TranslationMemory* functions) =========
+
+def _fnv1a(data, h=2166136261):
+    for b in data:
+        h = ((h ^ b) * 16777619) & _MASK
+    return h
+
+
+def _mix32(x):
+    x &= _MASK
+    x ^= x >> 16
+    x = (x * 0x85EBCA6B) & _MASK
+    x ^= x >> 13
+    x = (x * 0xC2B2AE35) & _MASK
+    x ^= x >> 16
+    return x
+
+
+_SEEDS = [_mix32((i + 1) * 0x9E3779B9) for i in range(NUM_PERM)]
+
+
+def normalize_key(text):
+    """Bytes of ``NormalizeCueKey``: ASCII lowercased, only letters, digits and non-ASCII kept."""
+    out = bytearray()
+    for b in text.encode("utf-8"):
+        if 65 <= b <= 90:
+            b += 32
+        if 97 <= b <= 122 or 48 <= b <= 57 or b >= 128:
+            out.append(b)
+    return bytes(out)
+
+
+def trigrams(key):
+    return {_fnv1a(key[i:i + 3]) for i in range(len(key) - 2)}
+
+
+def minhash(grams):
+    return [min(_mix32(g ^ seed) for g in grams) for seed in _SEEDS]
+
+
+def band_hashes(signature):
+    hashes = []
+    for band in range(BANDS):
+        data = bytearray([band])
+        for value in signature[band * ROWS:(band + 1) * ROWS]:
+            data += value.to_bytes(4, "little")
+        hashes.append(_fnv1a(data))
+    return hashes
+
+
+def similarity(a, b):
+    """Trigram Jaccard similarity of two cue texts; identical keys score 1.0."""
+    ka, kb = normalize_key(a), normalize_key(b)
+    if ka == kb:
+        return 1.0 if ka else 0.0
+    ga, gb = trigrams(ka), trigrams(kb)
+    if not ga or not gb:
+        return 0.0
+    return len(ga & gb) / len(ga | gb)
+
+
+# ========= Store =========
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\r", "").replace("\n", "\\n")
+
+
+class TranslationMemory:
+    def __init__(self, entries=None):
+        self.entries = list(entries or [])
+        self._buckets = None    # (lang, band hash) -> entries, built on the first query
+
+    @classmethod
+    def load(cls, path):
+        entries = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entries.append(json.loads(line))
+        return cls(entries)
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def add(self, source, translation, lang):
+        # The plugin looks up markup-free text and puts the cue's own tags back on what it serves
+        source = " ".join(strip_markup(source)[0].split("\n")).strip()
+        translation = strip_markup(translation.replace(_RLE, ""))[0].strip()
+        if len(normalize_key(source)) < 3 or not translation:
+            return False
+        self.entries.append({"lang": lang, "source": source, "translation": translation,
+                             "count": 1, "updated": int(time.time())})
+        self._buckets = None
+        return True
+
+    def compact(self, max_entries=0):
+        """Merge entries with the same key and near-identical entries that share a translation."""
+        by_key = {}
+        for entry in self.entries:
+            # Stores written before markup was stripped on add() are cleaned up here
+            entry["source"] = strip_markup(entry["source"])[0]
+            entry["translation"] = strip_markup(entry["translation"])[0]
+            key = (entry["lang"], normalize_key(entry["source"]))
+            kept = by_key.get(key)
+            if kept is None:
+                by_key[key] = dict(entry)
+                continue
+            # The most recent translation of a line wins; counts add up
+            count = kept.get("count", 1) + entry.get("count", 1)
+            if entry.get("updated", 0) >= kept.get("updated", 0):
+                kept.update(entry)
+            kept["count"] = count
+        entries = sorted(by_key.values(), key=lambda e: (-e.get("count", 1), -e.get("updated", 0)))
+
+        kept_entries = []
+        buckets = {}
+        for entry in entries:
+            key = normalize_key(entry["source"])
+            bands = band_hashes(minhash(trigrams(key)))
+            duplicate = None
+            for band in bands:
+                for other in buckets.get((entry["lang"], band), ()):
+                    if (other["translation"] == entry["translation"]
+                            and similarity(other["source"], entry["source"]) >= COMPACT_SIMILARITY):
+                        duplicate = other
+                        break
+                if duplicate:
+                    break
+            if duplicate:
+                duplicate["count"] = duplicate.get("count", 1) + entry.get("count", 1)
+                continue
+            kept_entries.append(entry)
+            for band in bands:
+                buckets.setdefault((entry["lang"], band), []).append(entry)
+        if max_entries > 0:
+            kept_entries = kept_entries[:max_entries]
+        removed = len(self.entries) - len(kept_entries)
+        self.entries = kept_entries
+        self._buckets = None
+        return removed
+
+    def query(self, text, lang, threshold=DEFAULT_HINT):
+        """Best ``(similarity, entry)`` at or above ``threshold`` via the LSH bands, or ``(0.0, None)``."""
+        key = normalize_key(text)
+        if len(key) < 3:
+            return 0.0, None
+        if self._buckets is None:
+            self._buckets = {}
+            for entry in self.entries:
+                for band in band_hashes(minhash(trigrams(normalize_key(entry["source"])))):
+                    self._buckets.setdefault((entry["lang"], band), []).append(entry)
+        candidates = {}
+        for band in band_hashes(minhash(trigrams(key))):
+            for entry in self._buckets.get((lang, band), ()):
+                candidates[id(entry)] = entry
+        best = (0.0, None)
+        for entry in candidates.values():
+            score = similarity(text, entry["source"])
+            if score >= threshold and score > best[0]:
+                best = (score, entry)
+        return best
+
+    def write_index(self, path):
+        rows = []
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as f:
+            f.write(f"#PTM1\tperms={NUM_PERM}\tbands={BANDS}\n")
+            for index, entry in enumerate(self.entries):
+                f.write(f"E\t{entry['lang']}\t{_escape(entry['source'])}\t{_escape(entry['translation'])}\n")
+                for band in band_hashes(minhash(trigrams(normalize_key(entry["source"])))):
+                    rows.append((band, index))
+            # Sorted so the plugin can binary-search the bands without building a map
+            for band, index in sorted(rows):
+                f.write(f"B\t{band:08x}\t{index}\n")
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+
+# ========= Sources =========
+
+def aligned_pairs(source_path, translated_path):
+    """Yield ``(source text, translation)`` for cues that overlap in time by at least half."""
+    translated = read_cues(translated_path)
+    j = 0
+    for cue in read_cues(source_path):
+        while j < len(translated) and translated[j].end_ms <= cue.start_ms:
+            j += 1
+        best, best_overlap = None, 0
+        for other in translated[j:j + 4]:
+            overlap = min(cue.end_ms, other.end_ms) - max(cue.start_ms, other.start_ms)
+            if overlap > best_overlap:
+                best, best_overlap = other, overlap
+        if best is not None and best_overlap * 2 >= max(1, cue.end_ms - cue.start_ms):
+            yield cue.text, best.text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and query the plugin's fuzzy translation memory")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="JSON Lines store of translated lines")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Add aligned SOURCE TRANSLATED subtitle pairs")
+    add.add_argument("files", nargs="+", help="SOURCE TRANSLATED [SOURCE TRANSLATED ...]")
+    add.add_argument("--lang", required=True, help="Target language of the translated files")
+    build = sub.add_parser("build", help="Compact the store and write the plugin index")
+    build.add_argument("--out", required=True)
+    build.add_argument("--max-entries", type=int, default=0, help="Keep only the most used entries (0 = all)")
+    query = sub.add_parser("query", help="Look a line up the way the plugin does")
+    query.add_argument("text")
+    query.add_argument("--lang", required=True)
+    query.add_argument("--serve", type=float, default=DEFAULT_SERVE)
+    query.add_argument("--hint", type=float, default=DEFAULT_HINT)
+    args = parser.parse_args(argv)
+
+    memory = TranslationMemory.load(args.store)
+    if args.command == "add":
+        if len(args.files) % 2:
+            parser.error("files must come in SOURCE TRANSLATED pairs")
+        added = 0
+        for source, translated in zip(args.files[::2], args.files[1::2]):
+            added += sum(memory.add(text, translation, args.lang)
+                         for text, translation in aligned_pairs(source, translated))
+        memory.save(args.store)
+        print(json.dumps({"added": added, "entries": len(memory.entries)}))
+    elif args.command == "build":
+        before = len(memory.entries)
+        removed = memory.compact(args.max_entries)
+        memory.save(args.store)
+        size = memory.write_index(args.out)
+        print(json.dumps({"entries_before": before, "entries": len(memory.entries), "removed": removed,
+                          "index": args.out, "index_bytes": size}))
+    else:
+        score, entry = memory.query(args.text, args.lang, args.hint)
+        action = "serve" if score >= args.serve else "hint" if entry else "miss"
+        print(json.dumps({"action": action, "similarity": round(score, 3), "entry": entry}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Measure first-cue latency with and without the plugin's warm-up request.
+
+Each trial opens a fresh connection and times the first translation request
+on it. In a "cold" trial that request pays DNS, TLS and the provider's cold
+path. In a "warm" trial the warm-up request goes first on the same
+connection: a Responses call carrying the instruction prefix, or a
+model-list GET when ``--chat-only``. Then the first cue is timed. The plugin
+sends its warm-up at the first cue it answers without a request
+(pre-filtered or from translation memory), never on load or login.
+
+Example:
+    python tools/warmup_probe.py --api-base https://api.openai.com/v1 \\
+        --model gpt-5-nano --lang zh-CN --trials 5 --out warmup_report.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from translate_core import (  # noqa: E402
+    DEFAULT_API_BASE, DEFAULT_MODEL, USER_AGENT, build_system_prompt, normalize_base_url,
+)
+
+SAMPLE_CUE = "I told you we should have left before the storm hit."
+
+
+def _connect(base_url, timeout):
+    parsed = urllib.parse.urlsplit(base_url)
+    conn_cls = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+    conn = conn_cls(parsed.netloc, timeout=timeout)
+    return conn, parsed.path.rstrip("/")
+
+
+def _send(conn, method, path, api_key, payload=None):
+    headers = {"User-Agent": USER_AGENT}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    body = None
+    if payload is not None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    started = time.perf_counter()
+    if conn.sock is None:
+        conn.connect()
+        # Headers and body go out in separate writes; without this a reused connection waits on delayed ACKs
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    conn.request(method, path, body=body, headers=headers)
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status, time.perf_counter() - started
+
+
+def warmup_payload(model, src_lang, dst_lang):
+    """Same shape as the plugin's RunPendingWarmup() probe: the prefix goes first, byte for byte."""
+    prefix = build_system_prompt(src_lang, dst_lang)
+    return {"model": model, "input": [
+        {"role": "system", "content": [{"type": "input_text", "text": prefix, "cache_control": {"type": "ephemeral"}}]},
+        {"role": "user", "content": [{"type": "input_text", "text": "OK"}]},
+    ]}
+
+
+def first_cue_payload(model, src_lang, dst_lang):
+    return {"model": model, "messages": [
+        {"role": "system", "content": build_system_prompt(src_lang, dst_lang)},
+        {"role": "user", "content": SAMPLE_CUE},
+    ]}
+
+
+def run_trial(args, warm):
+    conn, base_path = _connect(normalize_base_url(args.api_base), args.timeout)
+    try:
+        warmup_status = None
+        if warm:
+            if args.chat_only:
+                warmup_status, _ = _send(conn, "GET", base_path + "/models", args.api_key)
+            else:
+                warmup_status, _ = _send(conn, "POST", base_path + "/responses", args.api_key,
+                                         warmup_payload(args.model, args.src_lang, args.lang))
+        status, seconds = _send(conn, "POST", base_path + "/chat/completions", args.api_key,
+                                first_cue_payload(args.model, args.src_lang, args.lang))
+        return {"status": status, "warmup_status": warmup_status, "first_cue_ms": round(seconds * 1000, 1)}
+    finally:
+        conn.close()
+
+
+def summarize(trials):
+    values = [t["first_cue_ms"] for t in trials if t["status"] == 200]
+    if not values:
+        return {"ok": 0}
+    return {"ok": len(values), "mean_ms": round(statistics.mean(values), 1),
+            "median_ms": round(statistics.median(values), 1), "min_ms": min(values), "max_ms": max(values)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare first-cue latency with and without warm-up")
+    parser.add_argument("--api-base", default=DEFAULT_API_BASE)
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""))
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--lang", default="zh-CN")
+    parser.add_argument("--src-lang", default="")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--chat-only", action="store_true", help="Warm up with a model-list GET (cache=off)")
+    parser.add_argument("--out", default="", help="Write the JSON report here as well")
+    args = parser.parse_args(argv)
+
+    cold, warm = [], []
+    for _ in range(args.trials):
+        # Interleave so provider-side drift affects both series equally
+        cold.append(run_trial(args, warm=False))
+        warm.append(run_trial(args, warm=True))
+    report = {"model": args.model, "api_base": normalize_base_url(args.api_base), "trials": args.trials,
+              "cold": summarize(cold), "warm": summarize(warm), "cold_trials": cold, "warm_trials": warm}
+    if report["cold"].get("ok") and report["warm"].get("ok"):
+        report["median_saved_ms"] = round(report["cold"]["median_ms"] - report["warm"]["median_ms"], 1)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()